@@ -1,7 +1,10 @@
 import pandas as pd
 import numpy as np
-import pulp as pl
 import logging
+import time
+
+from src import solver
+from src.ativos import CadastroAtivos, mascara_inteiro
 
 logger = logging.getLogger(__name__)
 
@@ -40,8 +43,8 @@ def aporte_inicial(df, valor_carteira, valor_aporte):
     df_grp['Qtd_nec'] = 0.0
     df_grp['Custo_real'] = 0.0
 
-    rf_assets = (df_grp['Classe']=='RF') & (df_grp['Ticker']!='IMAB11')
-    rv_assets = (df_grp['Classe']!='RF') | (df_grp['Ticker']=='IMAB11')
+    rv_assets = mascara_inteiro(df_grp['Classe'], df_grp['Ticker'])
+    rf_assets = ~rv_assets
     
     logger.debug(f'Fixed income assets (RF): {rf_assets.sum()}')
     logger.debug(f'Variable income assets (RV): {rv_assets.sum()}')
@@ -161,6 +164,140 @@ def otimiza_aporte(df, valor_carteira=None, valor_aporte=2500):
 
     return base, vlr_sobra
 
+def otimiza_aporte_lote(qtd, precos, pesos, aportes, inteiro, elegivel=None, valores_carteira=None):
+    '''
+    Versão em lote de `otimiza_aporte` para muitas carteiras/cenários de uma vez.
+
+    Arrays empilhados (lote × ativos), um ativo por coluna; `precos`, `pesos`,
+    `inteiro` e `elegivel` também aceitam (ativos,) quando comuns a todo o lote,
+    e `aportes`/`valores_carteira` aceitam escalar.
+    - inteiro: ativos comprados em cotas inteiras (RV e IMAB11);
+    - elegivel: ativos que recebem a sobra, uma cota por vez (padrão: `inteiro`;
+      `otimiza_aporte` usa Classe != 'RF');
+    - valores_carteira: base do valor ideal (None = soma de qtd × preço).
+
+    Retorna dict com `deficit`, `qtd_comprar`, `custo_real` (lote × ativos) e `sobra` (lote,).
+    '''
+    qtd = np.atleast_2d(np.asarray(qtd, dtype=float))
+    B, N = qtd.shape
+    precos = np.broadcast_to(np.asarray(precos, dtype=float), (B, N))
+    pesos = np.broadcast_to(np.asarray(pesos, dtype=float), (B, N))
+    aportes = np.broadcast_to(np.asarray(aportes, dtype=float), (B,))
+    inteiro = np.broadcast_to(np.asarray(inteiro, dtype=bool), (B, N))
+    elegivel = inteiro if elegivel is None else np.broadcast_to(np.asarray(elegivel, dtype=bool), (B, N))
+
+    logger.info(f'Batch allocation for {B} portfolios x {N} assets')
+
+    total = qtd * precos
+    if valores_carteira is None:
+        valores_carteira = total.sum(axis=1)
+    valores_carteira = np.broadcast_to(np.asarray(valores_carteira, dtype=float), (B,))
+
+    deficit = np.clip(pesos * (valores_carteira + aportes)[:, None] - total, 0, None)
+    total_deficit = deficit.sum(axis=1, keepdims=True)
+    logger.debug(f'Total deficit (mean per portfolio): R$ {total_deficit.mean():,.2f}')
+
+    # rateio proporcional ao déficit; RV só em cotas inteiras
+    with np.errstate(divide='ignore', invalid='ignore'):
+        aporte = np.where(total_deficit > 0, deficit / total_deficit * aportes[:, None], 0.0)
+        compra = aporte / precos
+    compra = np.where(inteiro, np.floor(compra), compra)
+    compra = np.where(np.isfinite(compra) & (precos > 0), compra, 0.0)
+    custo = compra * precos
+    sobra = np.maximum(aportes - custo.sum(axis=1), 0.0)
+
+    # sobra: 1 cota por vez do elegível de maior déficit, enquanto ele couber
+    # (empates de déficit vão para o primeiro ativo na ordem das colunas)
+    restante = deficit.copy()
+    linhas = np.arange(B)
+    passos = 0
+    while True:
+        cand = elegivel & (restante > 0) & (precos > 0)
+        menor = np.where(cand, precos, np.inf).min(axis=1)
+        alvo = np.argmax(np.where(cand, restante, -np.inf), axis=1)
+        preco_alvo = precos[linhas, alvo]
+        ativo = cand.any(axis=1) & (sobra >= menor - 1e-6) & (sobra >= preco_alvo)
+        if not ativo.any():
+            break
+        b, j = linhas[ativo], alvo[ativo]
+        compra[b, j] += 1
+        custo[b, j] += precos[b, j]
+        sobra[b] -= precos[b, j]
+        restante[b, j] = np.maximum(restante[b, j] - precos[b, j], 0.0)
+        passos += 1
+
+    logger.debug(f'Leftover redistributed in {passos} vectorized steps')
+    logger.info(f'Batch allocation completed: R$ {custo.sum():,.2f} invested, R$ {sobra.sum():,.2f} leftover')
+
+    return {'deficit': deficit, 'qtd_comprar': compra, 'custo_real': custo, 'sobra': sobra}
+
+def projetar_convergencia(df, aportes, tolerancia_pp=1.0, meses=360, retornos=0.0,
+                          coluna_retornos='Classe', nivel='Classe'):
+    '''
+    Projeção do déficit proporcional: em quantos meses de aporte a carteira
+    fica a até `tolerancia_pp` p.p. dos pesos-alvo, para vários aportes de uma vez.
+
+    Recorrência mensal vetorizada (aportes × ativos), sem cotações nem solver:
+    os valores rendem `retornos` e o aporte é rateado pelo déficit de cada
+    ativo, como em `otimiza_aporte_lote`, porém fracionado (sem lote de RV).
+    - aportes: escalar ou lista de valores mensais (R$);
+    - tolerancia_pp: escalar ou lista de tolerâncias de drift (p.p.);
+    - retornos: taxa a.a. (fração) escalar, array por linha de `df` ou dict
+      {valor de `coluna_retornos`: taxa};
+    - nivel: coluna em que o drift é medido (ex.: 'Classe', 'Subclasses'); None = por ativo.
+
+    Retorna dict com `convergencia` (uma linha por aporte: drift inicial/final
+    e `meses_<tol>pp`, NaN se não converge no horizonte) e `drift` (drift
+    máximo em p.p., meses × aportes; mês 0 = carteira atual).
+    '''
+    t0 = time.perf_counter()
+    pesos = df['% Ideal - Ref.'].to_numpy(dtype=float)
+    if pesos.max() > 1:
+        pesos = pesos / 100.0
+    total = df['Total'].to_numpy(dtype=float)
+    aportes = np.atleast_1d(np.asarray(aportes, dtype=float))
+    tolerancias = np.atleast_1d(np.asarray(tolerancia_pp, dtype=float))
+    if (aportes < 0).any():
+        raise ValueError('Aportes devem ser não negativos')
+
+    if isinstance(retornos, dict):
+        chaves = df[coluna_retornos].astype(str)
+        faltando = sorted(set(chaves) - set(map(str, retornos)))
+        if faltando:
+            raise ValueError(f'Sem retorno para {coluna_retornos} = {faltando}')
+        retornos = chaves.map({str(k): v for k, v in retornos.items()}).to_numpy(dtype=float)
+    fator = (1 + np.broadcast_to(np.asarray(retornos, dtype=float), total.shape)) ** (1 / 12)
+
+    # ativo × grupo p/ medir o drift no nível pedido
+    codigo = pd.factorize(df[nivel])[0] if nivel else np.arange(len(df))
+    grupos = np.eye(codigo.max() + 1)[codigo]
+    alvo = pesos @ grupos
+
+    def drift_max(valores):
+        return np.abs((valores @ grupos) / valores.sum(axis=1, keepdims=True) - alvo).max(axis=1) * 100
+
+    valores = np.tile(total, (len(aportes), 1))
+    drift = np.empty((meses + 1, len(aportes)))
+    drift[0] = drift_max(valores)
+    for mes in range(1, meses + 1):
+        valores *= fator
+        deficit = np.clip(pesos * (valores.sum(axis=1) + aportes)[:, None] - valores, 0, None)
+        total_deficit = deficit.sum(axis=1, keepdims=True)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            valores += np.where(total_deficit > 0, deficit / total_deficit, 0.0) * aportes[:, None]
+        drift[mes] = drift_max(valores)
+
+    convergencia = pd.DataFrame({'aporte': aportes, 'drift_inicial_pp': drift[0], 'drift_final_pp': drift[-1]})
+    for tol in tolerancias:
+        dentro = drift <= tol
+        convergencia[f'meses_{tol:g}pp'] = np.where(dentro.any(axis=0), dentro.argmax(axis=0), np.nan)
+
+    logger.info(f'Convergence projection: {len(aportes)} contribution levels x {len(df)} assets x '
+                f'{meses} months in {time.perf_counter() - t0:.3f}s')
+    return {'convergencia': convergencia,
+            'drift': pd.DataFrame(drift, index=pd.RangeIndex(meses + 1, name='mes'),
+                                  columns=pd.Index(aportes, name='aporte'))}
+
 def exibir_resultado_formatado(df_resultado, sobra, valor_aporte):
     """Exibe resultado de forma padronizada e formatada."""
 
@@ -200,122 +337,10 @@ def exibir_resultado_formatado(df_resultado, sobra, valor_aporte):
 
     logger.info('Rebalancing results displayed successfully')
 
-def criar_variaveis_lp(df):
-    '''
-    Cria as variáveis de decisão para RF, RV e gaps.
-    '''
-    df = df.copy()
-
-    logger.info('Creating variables for Linear Programming Operation')
-    logger.debug(f'Processing {len(df)} assets for LP variables')
-
-    qt_rf = {} # Dicionario para armazenar as variaveis de RF (continua) {id: 'nome_var_ativo'}
-    qt_rv = {} # Dicionario para armazenar as variaveis de RV (inteiro) {id: 'nome_var_ativo'}
-    gap = {} # Gaps residuais, ou seja, o que sobrou apos a compra (deficit - aporte)
-    sel = {}
-
-    rf_count = 0
-    rv_count = 0
-
-    for idx, row in df.iterrows():
-        ativo_i = row['Ativo'].replace(' ','_')
-        sel[idx] = pl.LpVariable(f'SEL_{ativo_i}', cat='Binary')
-        preco_i = row['Cotação']
-        deficit_i = row['deficit']
-        
-        logger.debug(f'Creating variables for asset: {row["Ativo"]} (Class: {row["Classe"]}, Price: R$ {preco_i:,.2f}, Deficit: R$ {deficit_i:,.2f})')
-
-        if row['Classe']=='RF' and row['Ticker'] != 'IMAB11':
-            qt_rf[idx] = pl.LpVariable(f'RF_{ativo_i}', lowBound=0) # Atribui variaveis RF
-            rf_count += 1
-        else:
-            qt_rv[idx] = pl.LpVariable(f'RV_{ativo_i}', lowBound=0, cat='Integer') # Atribui variaveis RV
-            rv_count += 1
-        
-        gap[idx] = pl.LpVariable(f'GAP_{ativo_i}', lowBound=0)
-
-    logger.debug(f'Created {rf_count} RF variables, {rv_count} RV variables, {len(gap)} gap variables, {len(sel)} selection variables')
-    logger.info('LP variables created successfully')
-
-    return qt_rf, qt_rv, gap, sel
-
-def adicionar_restricoes_lp(prob, df, qt_rf, qt_rv, gap, sel,
-                            valor_aporte, k_min):
-    '''
-    Adiciona todas as restrições ao problema de otimização.
-    '''
-
-    logger.info('Adding restraints for problem optimization...')
-    logger.debug(f'Budget constraint: R$ {valor_aporte:,.2f}')
-    logger.debug(f'Minimum cardinality (k_min): {k_min}')
-
-    df = df.copy()
-    # Calculo de gastos da cotação x qtd (xi)
-    gasto_rf = pl.lpSum(df.loc[i,'Cotação']*qt_rf[i] for i in qt_rf)
-    gasto_rv = pl.lpSum(df.loc[i,'Cotação']*qt_rv[i] for i in qt_rv)
-
-    # Adiciona Restrição
-    prob += (gasto_rf + gasto_rv) <= valor_aporte
-    logger.debug('Budget constraint added')
-
-    # -------- cardinalidade (se solicitada) -----------
-    if k_min is not None:
-        prob += pl.lpSum(sel.values()) >= k_min
-        logger.debug(f'Cardinality constraint added: minimum {k_min} assets')
-
-        constraints_added = 0
-        for idx, row in df.iterrows():
-            preco_i = row['Cotação']
-            deficit_i = row['deficit']
-            max_qtd = valor_aporte / preco_i      # Big-M natural
-            min_qtd = 1 if idx in qt_rv else (1/preco_i)
-
-            if idx in qt_rf:
-                prob += qt_rf[idx] >= min_qtd * sel[idx]
-                prob += qt_rf[idx] <= max_qtd * sel[idx]
-            else:
-                prob += qt_rv[idx] >= min_qtd * sel[idx]
-                prob += qt_rv[idx] <= max_qtd * sel[idx]
-            
-            constraints_added += 2
-        
-        logger.debug(f'Added {constraints_added} cardinality-related constraints')
-
-    gap_constraints = 0
-    for idx, row in df.iterrows():
-        preco_i = row['Cotação']
-        deficit_i = row['deficit']        
-
-        if idx in qt_rf:            
-            compra_valor = preco_i * qt_rf[idx]
-        else:
-            compra_valor = preco_i * qt_rv[idx]
-
-        # Restrição do gap
-        prob += gap[idx] >= deficit_i - compra_valor
-        gap_constraints += 1
-    
-    logger.debug(f'Added {gap_constraints} gap constraints')
-    logger.info('All constraints added successfully')
-
-def definir_objetivo_lp(prob, gap):
-    '''
-    Define a função objetivo: minimizar soma dos gaps.
-    '''
-    logger.info('Defining objective problem optimization...')
-    logger.debug(f'Objective: minimize sum of {len(gap)} gap variables')
-    
-    prob += pl.lpSum(gap.values())
-    logger.debug('Objective function set to minimize total gaps')
-
-def extrair_resultados_lp(df, qt_rf, qt_rv, valor_aporte, show=True):
+def montar_resultado_lp(df, qtd, valor_aporte, show=True, nivel=None, gap=None, objetivo=None, limite=None):
     '''
-    Extrai os resultados da otimização e calcula custo total.
+    Monta a tabela de compras a partir do vetor de quantidades (uma posição por linha de df).
     '''
-
-    logger.info('Extracting optimized values...')
-    logger.debug(f'Processing {len(qt_rf)} RF variables and {len(qt_rv)} RV variables')
-
     df = df.copy()
 
     resultados = []
@@ -323,13 +348,20 @@ def extrair_resultados_lp(df, qt_rf, qt_rv, valor_aporte, show=True):
     rf_purchases = 0
     rv_purchases = 0
 
-    # Processar resultados RF
-    for idx in qt_rf:
-        qtd_comprada = qt_rf[idx].varValue
+    rf_assets = ~mascara_inteiro(df['Classe'], df['Ticker'])
+
+    for pos, idx in enumerate(df.index):
+        qtd_comprada = qtd[pos]
         if qtd_comprada > 0:
             valor_compra = qtd_comprada * df.loc[idx, 'Cotação']
-            logger.debug(f'RF Purchase: {df.loc[idx, "Ativo"]} - Qty: {qtd_comprada:.4f}, Value: R$ {valor_compra:,.2f}')
-            
+            if rf_assets[pos]:
+                logger.debug(f'RF Purchase: {df.loc[idx, "Ativo"]} - Qty: {qtd_comprada:.4f}, Value: R$ {valor_compra:,.2f}')
+                rf_purchases += 1
+            else:
+                qtd_comprada = int(qtd_comprada)  # Inteiro para RV
+                logger.debug(f'RV Purchase: {df.loc[idx, "Ativo"]} - Qty: {qtd_comprada}, Value: R$ {valor_compra:,.2f}')
+                rv_purchases += 1
+
             resultado = {
                 'Geo.': df.loc[idx, 'Geo.'],
                 'Ticker': df.loc[idx, 'Ticker'],
@@ -342,29 +374,6 @@ def extrair_resultados_lp(df, qt_rf, qt_rv, valor_aporte, show=True):
             }
             resultados.append(resultado)
             custo_total += resultado['Valor_Compra']
-            rf_purchases += 1
-    
-    # Processar resultados RV
-    for idx in qt_rv:
-        qtd_comprada = qt_rv[idx].varValue
-        if qtd_comprada > 0:
-            valor_compra = qtd_comprada * df.loc[idx, 'Cotação']
-            logger.debug(f'RV Purchase: {df.loc[idx, "Ativo"]} - Qty: {int(qtd_comprada)}, Value: R$ {valor_compra:,.2f}')
-            
-            resultado = {
-                'Geo.': df.loc[idx, 'Geo.'],
-                'Ticker': df.loc[idx, 'Ticker'],
-                'Ativo': df.loc[idx, 'Ativo'],
-                'Classe': df.loc[idx, 'Classe'],
-                'Sublasses': df.loc[idx, 'Subclasses'],
-                'Cotação': df.loc[idx, 'Cotação'],
-                'Qtd_Comprada': int(qtd_comprada),  # Inteiro para RV
-                'Valor_Compra': valor_compra
-            }
-            
-            resultados.append(resultado)
-            custo_total += resultado['Valor_Compra']
-            rv_purchases += 1
 
     sobra = valor_aporte - custo_total
     utilizacao = (custo_total/valor_aporte)*100
@@ -392,6 +401,10 @@ def extrair_resultados_lp(df, qt_rf, qt_rv, valor_aporte, show=True):
             print(f'Custo Total:        R$ {custo_total:,.2f}')
             print(f'Sobra:              R$ {sobra:,.2f}')
             print(f'Utilização:         {utilizacao:.1f}%')
+            if nivel is not None:
+                print(f'Nível do solver:    {nivel} (gap {gap:.2%})')
+            if objetivo is not None and limite is not None:
+                print(f'Gap residual:       R$ {objetivo:,.2f} (limite LP R$ {limite:,.2f})')
             
             if sobra > 0:
                 print(f'\nSobra de R$ {sobra:,.2f} vai para SELIC')
@@ -403,7 +416,19 @@ def extrair_resultados_lp(df, qt_rf, qt_rv, valor_aporte, show=True):
         logger.warning('No purchases made - optimization resulted in empty solution')
         return None
     
-def otimizar_aporte_lp(df, valor_aporte, valor_carteira=None, k_min=None):
+def otimizar_aporte_lp(df, valor_aporte, valor_carteira=None, k_min=None,
+                       tempo_limite=None, gap_rel=None, cache=solver.CACHE_PADRAO, decompor=None,
+                       aproximado=False, corrida=None):
+    '''
+    Aporte via MILP. `tempo_limite` (s) e `gap_rel` limitam o solve; se o CBC
+    não entregar solução, cai para LP arredondado e depois rateio por déficit.
+    Problemas já resolvidos são servidos pelo `cache` (None desliga).
+    `decompor` (ex.: 'Classe', 'Subclasses') resolve um subproblema por grupo em paralelo.
+    `aproximado=True` pula o MILP (relaxação LP + arredondamento + reparo guloso)
+    e reporta o objetivo junto do limite inferior da relaxação.
+    `corrida` (src.corrida.CorridaSolvers) dispara várias configurações de solver
+    em paralelo e fica com a primeira a provar o ótimo.
+    '''
     logger.info('Starting Linear Programming optimization...')
     logger.debug(f'Contribution: R$ {valor_aporte:,.2f}, Portfolio value: {valor_carteira}, Min cardinality: {k_min}')
     
@@ -422,27 +447,61 @@ def otimizar_aporte_lp(df, valor_aporte, valor_carteira=None, k_min=None):
     assets_with_deficit = (df['deficit'] > 0).sum()
     logger.debug(f'Total deficit: R$ {total_deficit:,.2f} across {assets_with_deficit} assets')
 
-    logger.info('Creating LP problem...')
-    prob = pl.LpProblem('Otimizacao_Aporte', pl.LpMinimize)
-    
-    qt_rf, qt_rv, gap, sel = criar_variaveis_lp(df)
-    adicionar_restricoes_lp(prob, df, qt_rf, qt_rv, gap, sel, valor_aporte, k_min)
-    definir_objetivo_lp(prob, gap)
-    
     logger.info('Solving LP problem...')
-    prob.solve(pl.PULP_CBC_CMD(msg=0))
-    
-    status = pl.LpStatus[prob.status]
-    logger.info(f'LP solver status: {status}')
-    
-    if status == "Optimal":
-        logger.info('Optimal solution found')
-        objective_value = prob.objective.value()
-        logger.debug(f'Objective value (total gaps): {objective_value:.2f}')
-        
-        df_out = extrair_resultados_lp(df, qt_rf, qt_rv, valor_aporte, show=True)
-        logger.info('LP optimization completed successfully')
-        return df_out
+    inteiro = CadastroAtivos(df).inteiro
+    if corrida is not None and not aproximado:
+        res = corrida.resolver(
+            df['Cotação'].to_numpy(dtype=float), df['deficit'].to_numpy(dtype=float),
+            inteiro, valor_aporte, k_min=k_min, tempo_limite=tempo_limite, gap_rel=gap_rel,
+            grupos=df[decompor].to_numpy() if decompor else None, cache=cache,
+        )
+        logger.info(f"Solver race winner: {res['vencedor']}")
+    elif decompor:
+        res = solver.resolver_decomposto(
+            df['Cotação'].to_numpy(dtype=float), df['deficit'].to_numpy(dtype=float),
+            inteiro, valor_aporte, df[decompor].to_numpy(), k_min=k_min,
+            tempo_limite=tempo_limite, gap_rel=gap_rel, cache=cache,
+        )
     else:
-        logger.error(f'LP optimization failed with status: {status}')
-        return None
\ No newline at end of file
+        res = solver.resolver(
+            df['Cotação'].to_numpy(dtype=float), df['deficit'].to_numpy(dtype=float),
+            inteiro, valor_aporte, k_min=k_min, tempo_limite=tempo_limite, gap_rel=gap_rel,
+            cache=cache, aproximado=aproximado,
+        )
+    logger.info(f"LP solver tier: {res['nivel']}{' (cached)' if res['cache'] else ''}")
+    logger.debug(f"Objective value (total gaps): {res['objetivo']:.2f}, gap: {res['gap']:.2%}")
+    if aproximado:
+        logger.info(f"Approximate solve: objective R$ {res['objetivo']:,.2f}, LP lower bound "
+                    f"R$ {res['limite_inferior']:,.2f} (loss <= R$ {res['objetivo'] - res['limite_inferior']:,.2f})")
+
+    df_out = montar_resultado_lp(df, res['qtd'], valor_aporte, show=True, nivel=res['nivel'], gap=res['gap'],
+                                 objetivo=res['objetivo'] if aproximado else None,
+                                 limite=res['limite_inferior'] if aproximado else None)
+    logger.info('LP optimization completed successfully')
+    return df_out
+
+def fronteira_diversificacao(df, valor_aporte, k_max=15, valor_carteira=None, k_inicial=1,
+                             tempo_limite=None, gap_rel=None):
+    '''
+    Curva gap residual × k_min (diversificação mínima) do aporte via MILP,
+    com cada k aquecido pela solução do anterior (ver solver.fronteira_k_min).
+    Retorna DataFrame com uma linha por k_min.
+    '''
+    logger.info(f'Computing diversification frontier for k_min = {k_inicial}..{k_max}')
+    df = df.copy()
+    if valor_carteira is None:
+        valor_carteira = df['Total'].sum()
+    df['Valor Ideal'] = df['% Ideal - Ref.'] * (valor_carteira + valor_aporte)
+    df['deficit'] = (df['Valor Ideal'] - df['Total']).clip(lower=0)
+
+    curva = solver.fronteira_k_min(
+        df['Cotação'].to_numpy(dtype=float), df['deficit'].to_numpy(dtype=float),
+        CadastroAtivos(df).inteiro, valor_aporte, k_max, k_inicial=k_inicial,
+        tempo_limite=tempo_limite, gap_rel=gap_rel,
+    )
+    total_deficit = df['deficit'].sum()
+    out = pd.DataFrame([{k: v for k, v in p.items() if k != 'qtd'} for p in curva])
+    out['gap_pct_deficit'] = out['objetivo'] / total_deficit * 100 if total_deficit > 0 else 0.0
+    out['custo'] = [float(df['Cotação'].to_numpy(dtype=float) @ p['qtd']) for p in curva]
+    logger.info(f'Frontier computed: {len(out)} points')
+    return out
@@ -0,0 +1,293 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Colunas do resumo por (cenário, estratégia)
+METRICAS = ("cagr", "volatilidade", "max_drawdown", "erro_rastreio_medio", "erro_rastreio_final",
+            "eficiencia_global", "pct_periodos_eficientes", "rent_final", "valor_final", "periodos")
+
+# Períodos por ano para anualizar, pelo espaçamento mediano das datas (em dias)
+_PERIODOS_ANO = ((3, 252), (10, 52), (45, 12), (120, 4))
+
+
+def estrategias(df):
+    """Sufixos das estratégias presentes no resultado do backtest (ex.: ["def", "po"])."""
+    return [c[len("valor_"):] for c in df.columns if c.startswith("valor_")]
+
+
+def classes_drift(df, estrategia):
+    """Classes com coluna de drift para a estratégia (ex.: ["RF", "RV"])."""
+    ini, fim = "drift_", f"_{estrategia}"
+    return [c[len(ini):-len(fim)] for c in df.columns if c.startswith(ini) and c.endswith(fim)]
+
+
+def periodos_por_ano(datas):
+    """Infere a frequência (252, 52, 12, 4 ou 1 períodos/ano) pelas datas do backtest."""
+    datas = pd.to_datetime(pd.Series(datas)).sort_values()
+    if len(datas) < 2:
+        return 12
+    passo = datas.diff().dt.days.median()
+    return next((n for limite, n in _PERIODOS_ANO if passo <= limite), 1)
+
+
+def _tabela(resultados):
+    """DataFrame empilhado com coluna `cenario` (aceita DataFrame único, dict ou já empilhado)."""
+    if isinstance(resultados, dict):
+        return pd.concat(resultados, names=["cenario"]).reset_index(level=0)
+    if "cenario" in resultados.columns:
+        return resultados
+    return resultados.assign(cenario="base")
+
+
+def _empilhar(resultados, aporte=None):
+    """
+    Arrays (cenários × períodos × estratégias) alinhados pelo início; cenários
+    mais curtos recebem NaN no fim. O drift ganha um eixo de classes.
+    """
+    df = _tabela(resultados)
+    codigo, nomes = pd.factorize(df["cenario"])
+    ordem = np.lexsort((df["mes"].to_numpy(), codigo))
+    df, codigo = df.iloc[ordem], codigo[ordem]
+    pos = pd.Series(codigo).groupby(codigo).cumcount().to_numpy()     # período dentro do cenário
+
+    estr = estrategias(df)
+    classes = classes_drift(df, estr[0]) if estr else []
+    C, P, S, K = len(nomes), int(pos.max()) + 1, len(estr), len(classes)
+
+    def matriz(colunas):
+        m = np.full((C, P, len(colunas)), np.nan)
+        m[codigo, pos] = df[colunas].to_numpy(dtype=float)
+        return m
+
+    valor = matriz([f"valor_{s}" for s in estr])
+    deficit = matriz([f"deficit_{s}" for s in estr])
+    rent = matriz([f"rent_{s}_corr" for s in estr])
+    investido = matriz(["investido"])[:, :, 0]
+    drift = matriz([f"drift_{cls}_{s}" for s in estr for cls in classes]).reshape(C, P, S, K)
+
+    # aporte de cada período: passo do capital investido (o 1º repete o 2º)
+    if aporte is None:
+        fluxo = np.diff(investido, axis=1, prepend=np.nan)
+        fluxo[:, 0] = fluxo[:, 1] if P > 1 else 0.0
+    else:
+        fluxo = np.where(np.isfinite(investido), np.broadcast_to(np.asarray(aporte, dtype=float), (C, P)), np.nan)
+
+    datas = pd.to_datetime(df.loc[codigo == 0, "data"]) if "data" in df else pd.Series(dtype="datetime64[ns]")
+    return {"nomes": list(nomes), "estrategias": estr, "classes": classes, "valor": valor,
+            "deficit": deficit, "rent": rent, "drift": drift, "investido": investido,
+            "aporte": fluxo, "datas": datas}
+
+
+def _retornos(valor, aporte):
+    """Retorno por período descontado o aporte (time-weighted): (V_t - A_t) / V_{t-1} - 1.
+
+    O 1º período não tem valor anterior: fica NaN (fora de contagens, médias e desvios).
+    """
+    anterior = np.concatenate([np.full_like(valor[:, :1], np.nan), valor[:, :-1]], axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (valor - aporte[:, :, None]) / anterior - 1
+
+
+def series(resultados, aporte=None):
+    """
+    Séries por período, em formato longo (cenario, estrategia, mes): retorno
+    descontado o aporte, índice acumulado, drawdown, erro de rastreio (RMS do
+    drift das classes, em p.p.) e eficiência do aporte (Δ déficit / aporte).
+    """
+    d = _empilhar(resultados, aporte)
+    r = _retornos(d["valor"], d["aporte"])
+    indice = np.cumprod(1 + np.nan_to_num(r), axis=1)
+    drawdown = indice / np.maximum.accumulate(indice, axis=1) - 1
+    erro = np.sqrt(np.mean(d["drift"] ** 2, axis=3)) if d["classes"] else np.full_like(r, np.nan)
+    delta = np.diff(d["deficit"], axis=1, prepend=d["deficit"][:, :1]) * -1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        eficiencia = delta / d["aporte"][:, :, None]
+
+    C, P, S = r.shape
+    valido = np.isfinite(d["valor"])
+    out = pd.DataFrame({
+        "cenario": np.repeat(d["nomes"], P * S),
+        "estrategia": np.tile(d["estrategias"], C * P),
+        "mes": np.tile(np.repeat(np.arange(1, P + 1), S), C),
+        "retorno": r.ravel(), "indice": indice.ravel(), "drawdown": drawdown.ravel(),
+        "erro_rastreio": erro.ravel(), "eficiencia": eficiencia.ravel(),
+    })
+    return out[valido.ravel()].reset_index(drop=True)
+
+
+def resumo(resultados, periodos_ano=None, aporte=None):
+    """
+    Estatísticas por (cenário, estratégia) de um ou vários backtests:
+    CAGR e volatilidade anualizados (retornos descontados os aportes, a
+    partir do 2º período),
+    drawdown máximo, erro de rastreio médio/final frente aos pesos-alvo (p.p.),
+    eficiência global ((déficit inicial - final) / total aportado) e % de
+    períodos com redução de déficit.
+
+    `resultados`: DataFrame de `PortfolioSimulator.simular`, dict {cenário: DataFrame}
+    ou DataFrame empilhado com coluna `cenario`.
+    """
+    d = _empilhar(resultados, aporte)
+    ppa = periodos_ano or periodos_por_ano(d["datas"])
+    valor, deficit = d["valor"], d["deficit"]
+    C, P, S = valor.shape
+    logger.debug(f"Computing analytics: {C} scenarios x {P} periods x {S} strategies ({ppa} periods/year)")
+
+    r = _retornos(valor, d["aporte"])
+    n = np.isfinite(r).sum(axis=1)                               # retornos: períodos - 1
+    indice = np.cumprod(1 + np.nan_to_num(r), axis=1)
+    ultimo = np.isfinite(valor).sum(axis=1) - 1                  # último período válido (C, S)
+    pegar = lambda x: np.take_along_axis(x, ultimo[:, None, :], axis=1)[:, 0, :]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cagr = indice[:, -1, :] ** (ppa / n) - 1
+        vol = np.nanstd(r, axis=1, ddof=1) * np.sqrt(ppa)
+        max_dd = (indice / np.maximum.accumulate(indice, axis=1) - 1).min(axis=1)
+
+        erro = np.sqrt(np.mean(d["drift"] ** 2, axis=3)) if d["classes"] else np.full_like(r, np.nan)
+        aportado = np.nansum(d["aporte"], axis=1)[:, None]
+        efic = (deficit[:, 0, :] - pegar(deficit)) / aportado
+        delta = -np.diff(deficit, axis=1)
+        pct_efic = (delta > 0).sum(axis=1) / n * 100
+
+    tabela = {
+        "cagr": cagr, "volatilidade": vol, "max_drawdown": max_dd,
+        "erro_rastreio_medio": np.nanmean(erro, axis=1), "erro_rastreio_final": pegar(erro),
+        "eficiencia_global": efic, "pct_periodos_eficientes": pct_efic,
+        "rent_final": pegar(d["rent"]), "valor_final": pegar(valor), "periodos": ultimo + 1,
+    }
+    idx = pd.MultiIndex.from_product([d["nomes"], d["estrategias"]], names=["cenario", "estrategia"])
+    return pd.DataFrame({k: np.asarray(v, dtype=float).ravel() for k, v in tabela.items()}, index=idx)
+
+
+def janelas_moveis(resultados, janela=12, periodos_ano=None, aporte=None):
+    """
+    CAGR, volatilidade e drawdown máximo em janelas móveis de `janela` períodos,
+    em formato longo (cenario, estrategia, mes = último período da janela).
+    """
+    d = _empilhar(resultados, aporte)
+    ppa = periodos_ano or periodos_por_ano(d["datas"])
+    r = _retornos(d["valor"], d["aporte"])
+    C, P, S = r.shape
+    if P < janela:
+        return pd.DataFrame(columns=["cenario", "estrategia", "mes", "cagr", "volatilidade", "max_drawdown"])
+
+    jan = np.lib.stride_tricks.sliding_window_view(r, janela, axis=1)      # (C, P-j+1, S, j)
+    indice = np.cumprod(1 + jan, axis=3)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cagr = indice[..., -1] ** (ppa / janela) - 1
+        vol = jan.std(axis=3, ddof=1) * np.sqrt(ppa)
+        pico = np.maximum.accumulate(np.concatenate([np.ones_like(indice[..., :1]), indice], axis=3), axis=3)
+        max_dd = (indice / pico[..., 1:] - 1).min(axis=3)
+
+    W = P - janela + 1
+    out = pd.DataFrame({
+        "cenario": np.repeat(d["nomes"], W * S),
+        "estrategia": np.tile(d["estrategias"], C * W),
+        "mes": np.tile(np.repeat(np.arange(janela, P + 1), S), C),
+        "cagr": cagr.ravel(), "volatilidade": vol.ravel(), "max_drawdown": max_dd.ravel(),
+    })
+    return out.dropna(subset=["cagr"]).reset_index(drop=True)
+
+
+class DesempenhoIncremental:
+    """
+    Mesmas estatísticas de `resumo` para um cenário, atualizadas período a
+    período (ex.: consumindo `PortfolioSimulator.iterar_simulacao`) sem
+    reprocessar o histórico. Sem `aporte`, o aporte do 1º período é inferido
+    do 2º, como em `resumo`.
+    """
+
+    def __init__(self, estrategias=("def", "po"), classes=None, periodos_ano=12, aporte=None):
+        self.estrategias = list(estrategias)
+        self.classes = list(classes) if classes is not None else None
+        self.periodos_ano = periodos_ano
+        self.aporte = aporte
+        S = len(self.estrategias)
+        self.n = 0                                 # retornos (o 1º período não tem)
+        self.periodos = 0
+        self._pendente = None                      # 1ª linha, enquanto o aporte não é conhecido
+        self._media, self._m2 = np.zeros(S), np.zeros(S)
+        self._indice, self._pico, self._max_dd = np.ones(S), np.ones(S), np.zeros(S)
+        self._erro_soma, self._erro = np.zeros(S), np.full(S, np.nan)
+        self._positivos = np.zeros(S)
+        self._valor = self._deficit = self._deficit0 = self._rent = None
+        self._aportado = 0.0
+        self._investido = None
+
+    def atualizar(self, linhas):
+        """Acrescenta um ou mais períodos (dict, lista de dicts ou DataFrame)."""
+        if isinstance(linhas, dict):
+            linhas = [linhas]
+        elif isinstance(linhas, pd.DataFrame):
+            linhas = linhas.sort_values("mes").to_dict("records")
+        for linha in linhas:
+            self._atualizar(linha)
+        return self
+
+    def _atualizar(self, linha):
+        if self.classes is None:
+            self.classes = classes_drift(pd.DataFrame(columns=list(linha)), self.estrategias[0])
+        if self.aporte is None and self._investido is None and self._pendente is None:
+            self._pendente = linha
+            return
+        if self._pendente is not None:
+            primeira, self._pendente = self._pendente, None
+            self.aporte = linha["investido"] - primeira["investido"]
+            self._passo(primeira, self.aporte)
+            self.aporte = None
+        fluxo = self.aporte if self.aporte is not None else linha["investido"] - self._investido
+        self._passo(linha, fluxo)
+
+    def _passo(self, linha, fluxo):
+        valor = np.array([linha[f"valor_{s}"] for s in self.estrategias], dtype=float)
+        deficit = np.array([linha[f"deficit_{s}"] for s in self.estrategias], dtype=float)
+        self.periodos += 1
+        if self._valor is not None:
+            r = (valor - fluxo) / self._valor - 1
+
+            # média/variância online (Welford)
+            self.n += 1
+            delta = r - self._media
+            self._media += delta / self.n
+            self._m2 += delta * (r - self._media)
+
+            self._indice *= 1 + r
+            self._pico = np.maximum(self._pico, self._indice)
+            self._max_dd = np.minimum(self._max_dd, self._indice / self._pico - 1)
+
+        if self.classes:
+            drift = np.array([[linha[f"drift_{c}_{s}"] for c in self.classes] for s in self.estrategias])
+            self._erro = np.sqrt(np.mean(drift ** 2, axis=1))
+            self._erro_soma += self._erro
+
+        if self._deficit is None:
+            self._deficit0 = deficit
+        else:
+            self._positivos += (self._deficit - deficit) > 0
+        self._aportado += fluxo
+        self._valor, self._deficit, self._investido = valor, deficit, linha["investido"]
+        self._rent = np.array([linha[f"rent_{s}_corr"] for s in self.estrategias], dtype=float)
+
+    def resumo(self, cenario="base"):
+        """DataFrame no formato de `resumo` (uma linha por estratégia)."""
+        idx = pd.MultiIndex.from_product([[cenario], self.estrategias], names=["cenario", "estrategia"])
+        if self.periodos == 0:
+            return pd.DataFrame(np.nan, index=idx, columns=list(METRICAS))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            tabela = {
+                "cagr": self._indice ** (self.periodos_ano / self.n) - 1,
+                "volatilidade": np.sqrt(self._m2 / (self.n - 1)) * np.sqrt(self.periodos_ano) if self.n > 1
+                                else np.full(len(self.estrategias), np.nan),
+                "max_drawdown": self._max_dd,
+                "erro_rastreio_medio": self._erro_soma / self.periodos if self.classes else self._erro,
+                "erro_rastreio_final": self._erro,
+                "eficiencia_global": (self._deficit0 - self._deficit) / self._aportado,
+                "pct_periodos_eficientes": self._positivos / self.n * 100,
+                "rent_final": self._rent, "valor_final": self._valor,
+                "periodos": np.full(len(self.estrategias), self.periodos),
+            }
+        return pd.DataFrame({k: np.asarray(v, dtype=float) for k, v in tabela.items()}, index=idx)
@@ -0,0 +1,111 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from src import renda_fixa
+
+logger = logging.getLogger(__name__)
+
+# Fonte das séries de renda fixa por ticker; os demais vêm do Yahoo Finance.
+# Tickers fora desta lista com a coluna "Indexador" preenchida usam a fonte do indexador.
+FONTES_RF = {
+    "SELIC": "selic", "FDI": "selic", "FRFH": "selic", "LC": "selic", "CDB": "selic",
+    "IPCA": "ipca", "CDBI": "ipca",
+    "PRE": "pre",
+    "PGBL": "pgbl",
+}
+FONTES = ("selic", "cdi", "ipca", "pre", "pgbl", "yahoo", "nenhuma")
+
+# RF negociada em cotas inteiras (ETF de renda fixa)
+RF_COTAS_INTEIRAS = {"IMAB11"}
+
+# Ativo que recebe as sobras do aporte ("caixa")
+TICKER_CAIXA = "SELIC"
+
+# Moeda de cotação por região (coluna "Geo."); ativos fora do BR são convertidos p/ BRL
+MOEDAS_GEO = {"US": "USD"}
+
+
+def mascara_inteiro(classe, ticker):
+    """True para ativos comprados em cotas inteiras (RV e RF listada, ex.: IMAB11)."""
+    classe, ticker = np.asarray(classe), np.asarray(ticker)
+    return ~((classe == "RF") & ~np.isin(ticker, list(RF_COTAS_INTEIRAS)))
+
+
+class CadastroAtivos:
+    """
+    Cadastro indexado dos ativos de uma carteira, montado uma vez por carga.
+
+    - linhas: ids inteiros 0..n-1 na ordem do DataFrame;
+    - `geo`, `classe`, `subclasse`, `ticker`: pd.Categorical (códigos inteiros em `.codes`);
+    - máscaras por linha: `inteiro` (lote inteiro), `caixa` (destino das sobras);
+    - por ticker único (`tickers`): `fonte` (ver FONTES), `simbolo` (Yahoo) e `moeda`;
+    - `rf`: parâmetros de remuneração das linhas de RF (ver src.renda_fixa.parametros)
+      e `serie`: chave da série de preços/fatores de cada linha (o ticker, em geral).
+    """
+
+    def __init__(self, df):
+        self.n = len(df)
+        self.ids = np.arange(self.n)
+        self.geo = pd.Categorical(df["Geo."])
+        self.classe = pd.Categorical(df["Classe"])
+        self.subclasse = pd.Categorical(df["Subclasses"])
+        self.ticker = pd.Categorical(df["Ticker"])
+
+        self.inteiro = mascara_inteiro(df["Classe"], df["Ticker"])
+        self.caixa = df["Ticker"].to_numpy() == TICKER_CAIXA
+
+        # ---- por ticker único ----------------------------------------
+        self.tickers = self.ticker.categories
+        self._id_ticker = {tk: i for i, tk in enumerate(self.tickers)}
+        codigos = self.ticker.codes
+        ordem = np.argsort(codigos, kind="stable")
+        inicio = np.searchsorted(codigos[ordem], np.arange(len(self.tickers)))
+        self._linhas = np.split(ordem, inicio[1:])
+        geo_tk = np.asarray(self.geo)[ordem[inicio]]
+
+        fonte = pd.Series(self.tickers.map(FONTES_RF), index=self.tickers)
+        indexador = renda_fixa.indexador_informado(df).groupby(codigos).first().reindex(range(len(self.tickers)))
+        fonte = fonte.where(fonte.notna(), indexador.map(renda_fixa.FONTE_INDEXADOR).to_numpy())
+        fonte = fonte.where(fonte.notna(), np.where((geo_tk == "BR") | np.isin(geo_tk, list(MOEDAS_GEO)),
+                                                    "yahoo", "nenhuma"))
+        self.fonte = pd.Categorical(fonte.to_numpy(), categories=FONTES)
+        self.moeda = pd.Series(geo_tk, index=self.tickers).map(MOEDAS_GEO)
+        self.simbolo = pd.Series(
+            np.where(geo_tk == "BR", self.tickers + ".SA", self.tickers), index=self.tickers
+        ).where(self.fonte == "yahoo")
+
+        # ---- renda fixa calculada (src.renda_fixa) ---------------------
+        self.rf = renda_fixa.parametros(df, np.asarray(self.fonte)[codigos])
+        self.serie = self.ticker.astype(str).to_numpy(dtype=object)
+        self.serie[self.rf.index] = self.rf["serie"].to_numpy()
+
+        logger.debug(f"Asset master built: {self.n} rows, {len(self.tickers)} tickers, "
+                     f"{len(self.classe.categories)} classes, {int(self.inteiro.sum())} integer-lot")
+
+    # ------------- consultas -----------------------------
+    def id_ticker(self, ticker):
+        """Código inteiro do ticker (posição em `tickers`)."""
+        return self._id_ticker[ticker]
+
+    def linhas(self, ticker):
+        """Ids das linhas da carteira com esse ticker."""
+        return self._linhas[self._id_ticker[ticker]]
+
+    def mascara_fonte(self, fonte):
+        """Máscara sobre `tickers` dos que vêm da fonte indicada."""
+        return np.asarray(self.fonte == fonte)
+
+    def codigos(self, campo):
+        """Códigos inteiros por linha de "Geo.", "Classe", "Subclasses" ou "Ticker"."""
+        return self._categoria(campo).codes
+
+    def matriz(self, campo):
+        """Matriz one-hot linha × categoria do campo (ex.: pesos por classe)."""
+        cat = self._categoria(campo)
+        return np.eye(len(cat.categories))[cat.codes]
+
+    def _categoria(self, campo):
+        return {"Geo.": self.geo, "Classe": self.classe,
+                "Subclasses": self.subclasse, "Ticker": self.ticker}[campo]
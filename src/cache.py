@@ -0,0 +1,213 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _quantizar(valores, decimais):
+    """Inteiros na escala de `decimais` casas (evita ruído de ponto flutuante e -0.0)."""
+    return np.rint(np.asarray(valores, dtype=float) * 10**decimais).astype(np.int64)
+
+
+def chave_problema(precos, deficits, inteiro, orcamento, k_min=None,
+                   decimais_preco=4, decimais_valor=2, **params):
+    """Hash canônico dos dados quantizados de um problema de aporte."""
+    h = hashlib.sha1()
+    h.update(_quantizar(precos, decimais_preco).tobytes())
+    h.update(_quantizar(deficits, decimais_valor).tobytes())
+    h.update(np.asarray(inteiro, dtype=bool).tobytes())
+    h.update(_quantizar([orcamento], decimais_valor).tobytes())
+    h.update(repr((k_min or 0, sorted(params.items()))).encode())
+    return h.hexdigest()
+
+
+class CacheSolve:
+    """
+    Cache de soluções de aporte: LRU em memória + camada opcional em disco.
+
+    - max_itens: capacidade da camada em memória;
+    - diretorio: pasta da camada em disco (None = só memória);
+    - max_bytes_disco: tamanho máximo da pasta; os arquivos menos usados saem primeiro.
+
+    `obter_ou_calcular` serializa misses da mesma chave: quem chega enquanto
+    outra thread resolve o problema espera e recebe o resultado dela.
+    """
+
+    def __init__(self, max_itens=1024, diretorio=None, max_bytes_disco=256 * 2**20,
+                 decimais_preco=4, decimais_valor=2):
+        self.max_itens = max_itens
+        self.diretorio = Path(diretorio) if diretorio else None
+        self.max_bytes_disco = max_bytes_disco
+        self.decimais_preco = decimais_preco
+        self.decimais_valor = decimais_valor
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()          # subproblemas podem rodar em threads
+        self._em_andamento = {}                # chave → threading.Event do solve em curso
+        self._lock_disco = threading.Lock()    # uma limpeza da pasta por vez; não bloqueia a memória
+        self.hits_memoria = 0
+        self.hits_disco = 0
+        self.misses = 0
+        self.esperas = 0                       # misses que esperaram o solve de outra thread
+
+        if self.diretorio:
+            self.diretorio.mkdir(parents=True, exist_ok=True)
+        logger.debug(f"Solve cache created (memory={max_itens}, disk={self.diretorio})")
+
+    def chave(self, precos, deficits, inteiro, orcamento, k_min=None, **params):
+        return chave_problema(precos, deficits, inteiro, orcamento, k_min,
+                              self.decimais_preco, self.decimais_valor, **params)
+
+    # ------------- leitura / escrita -----------------
+    def obter(self, chave):
+        """Resultado armazenado para a chave (cópia) ou None."""
+        res, camada = self._buscar(chave)
+        with self._lock:
+            self._contar(chave, camada)
+        return res
+
+    def obter_ou_calcular(self, chave, calcular):
+        """
+        (resultado, True) se a chave está no cache; senão chama `calcular()`,
+        guarda e retorna (resultado, False). Misses concorrentes da mesma chave
+        esperam o primeiro cálculo e contam como acerto (e em `esperas`); se ele
+        falhar, o próximo calcula.
+        """
+        esperou = False
+        while True:
+            res, camada = self._buscar(chave)
+            with self._lock:
+                if res is None and chave in self._memoria:     # gravado entre a busca e aqui
+                    res, camada = self._copiar(self._memoria[chave]), "memoria"
+                if res is not None:
+                    self._contar(chave, camada)
+                    self.esperas += esperou
+                    return res, True
+                evento = self._em_andamento.get(chave)
+                if evento is None:
+                    evento = self._em_andamento[chave] = threading.Event()
+                    self.misses += 1
+                    break
+            logger.debug(f"Solve cache: waiting for in-flight solve {chave[:12]}")
+            esperou = True
+            evento.wait()
+        try:
+            res = calcular()
+            self.guardar(chave, res)
+            return res, False
+        finally:
+            with self._lock:
+                del self._em_andamento[chave]
+            evento.set()
+
+    def guardar(self, chave, res):
+        with self._lock:
+            self._guardar_memoria(chave, self._copiar(res))
+        if self.diretorio:
+            self._gravar_disco(chave, res)
+
+    def limpar(self):
+        with self._lock:
+            self._memoria.clear()
+        if self.diretorio:
+            for arq in self.diretorio.glob("*.npz"):
+                arq.unlink(missing_ok=True)
+
+    def estatisticas(self):
+        total = self.hits_memoria + self.hits_disco + self.misses
+        return {
+            "hits_memoria": self.hits_memoria,
+            "hits_disco": self.hits_disco,
+            "misses": self.misses,
+            "esperas": self.esperas,
+            "taxa_acerto": (self.hits_memoria + self.hits_disco) / total if total else 0.0,
+            "itens_memoria": len(self._memoria),
+        }
+
+    # ------------- camadas ---------------------------
+    def _buscar(self, chave):
+        """(cópia do resultado, camada) sem contar acerto/miss; a leitura do disco fica fora do lock."""
+        with self._lock:
+            if chave in self._memoria:
+                self._memoria.move_to_end(chave)
+                return self._copiar(self._memoria[chave]), "memoria"
+        res = self._ler_disco(chave)
+        if res is None:
+            return None, None
+        with self._lock:
+            self._guardar_memoria(chave, res)
+        return self._copiar(res), "disco"
+
+    def _contar(self, chave, camada):
+        """Atualiza os contadores (chamar com `_lock`)."""
+        if camada == "memoria":
+            self.hits_memoria += 1
+        elif camada == "disco":
+            self.hits_disco += 1
+        else:
+            self.misses += 1
+            return
+        logger.debug(f"Solve cache hit ({'memory' if camada == 'memoria' else 'disk'}): {chave[:12]}")
+
+    @staticmethod
+    def _copiar(res):
+        return {**res, "qtd": np.array(res["qtd"], dtype=float, copy=True)}
+
+    def _guardar_memoria(self, chave, res):
+        self._memoria[chave] = res
+        self._memoria.move_to_end(chave)
+        while len(self._memoria) > self.max_itens:
+            self._memoria.popitem(last=False)
+
+    def _arquivo(self, chave):
+        return self.diretorio / f"{chave}.npz"
+
+    def _ler_disco(self, chave):
+        if not self.diretorio:
+            return None
+        arq = self._arquivo(chave)
+        if not arq.exists():
+            return None
+        try:
+            with np.load(arq, allow_pickle=False) as z:
+                res = {k: z[k] for k in z.files}
+            res = {k: (v if k == "qtd" else v.item()) for k, v in res.items()}
+            os.utime(arq)                              # marca uso recente (LRU)
+            return res
+        except Exception as e:
+            logger.warning(f"Discarding unreadable cache entry {arq.name}: {str(e)}")
+            arq.unlink(missing_ok=True)
+            return None
+
+    def _gravar_disco(self, chave, res):
+        arq = self._arquivo(chave)
+        # temporário por thread: gravações concorrentes da mesma chave não se atropelam
+        tmp = arq.with_name(f".{chave}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez_compressed(f, **{k: np.asarray(v) for k, v in res.items() if v is not None})
+        os.replace(tmp, arq)
+        with self._lock_disco:
+            self._despejar_disco()
+
+    def _despejar_disco(self):
+        arquivos = []
+        for arq in self.diretorio.glob("*.npz"):
+            try:
+                arquivos.append((arq.stat().st_mtime, arq.stat().st_size, arq))
+            except FileNotFoundError:                  # removido por outro processo
+                continue
+        arquivos.sort(key=lambda a: a[0])
+        total = sum(tam for _, tam, _ in arquivos)
+        removidos = 0
+        while arquivos and total > self.max_bytes_disco:
+            _, tam, arq = arquivos.pop(0)
+            total -= tam
+            arq.unlink(missing_ok=True)
+            removidos += 1
+        if removidos:
+            logger.debug(f"Solve cache evicted {removidos} disk entries")
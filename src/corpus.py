@@ -0,0 +1,190 @@
+import logging
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pulp as pl
+
+from src import solver
+from src.cache import chave_problema
+
+logger = logging.getLogger(__name__)
+
+
+class CorpusProblemas:
+    """
+    Corpus em disco das instâncias de aporte resolvidas (captura opcional).
+
+    Cada instância vira um .npz comprimido (`000001_<hash>.npz`, em ordem de
+    captura) com os dados do problema (`precos`, `deficits`, `inteiro`,
+    `orcamento`, `k_min`, `tempo_limite`, `gap_rel`), o resultado (`qtd`,
+    `nivel`, `objetivo`, `gap`, `tempo`, `cache`), os `grupos` da decomposição
+    (quando houve) e metadados livres (ex.: `mes`, `data`, `decompor`).
+    """
+
+    def __init__(self, diretorio):
+        self.diretorio = Path(diretorio)
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._seq = len(self.arquivos())
+        logger.debug(f"Problem corpus at {self.diretorio} ({self._seq} instances)")
+
+    def arquivos(self):
+        return sorted(self.diretorio.glob("*.npz"))
+
+    def __len__(self):
+        return len(self.arquivos())
+
+    def __iter__(self):
+        for arq in self.arquivos():
+            yield carregar_instancia(arq)
+
+    def registrar(self, precos, deficits, inteiro, orcamento, k_min, res,
+                  tempo_limite=None, gap_rel=None, grupos=None, **meta):
+        """Grava a instância e o resultado do solve; retorna o caminho do arquivo.
+
+        `grupos`: rótulo de grupo por ativo, se o solve foi decomposto (o replay
+        usa `solver.resolver_decomposto` com eles).
+        """
+        chave = chave_problema(precos, deficits, inteiro, orcamento, k_min)
+        dados = {
+            "precos": np.asarray(precos, dtype=float),
+            "deficits": np.asarray(deficits, dtype=float),
+            "inteiro": np.asarray(inteiro, dtype=bool),
+            "orcamento": float(orcamento),
+            "k_min": int(k_min or 0),
+            "tempo_limite": np.nan if tempo_limite is None else float(tempo_limite),
+            "gap_rel": np.nan if gap_rel is None else float(gap_rel),
+            "qtd": np.asarray(res["qtd"], dtype=float),
+            "nivel": str(res["nivel"]),
+            "objetivo": float(res["objetivo"]),
+            "gap": float(res["gap"]),
+            "tempo": float(res["tempo"]),
+            "cache": bool(res.get("cache", False)),
+            "chave": chave,
+        }
+        if grupos is not None:
+            dados["grupos"] = np.asarray(grupos).astype(str)
+        dados.update({f"meta_{k}": str(v) for k, v in meta.items() if v is not None})
+
+        with self._lock:
+            self._seq += 1
+            arq = self.diretorio / f"{self._seq:06d}_{chave[:12]}.npz"
+        np.savez_compressed(arq, **dados)
+        logger.debug(f"Captured problem {arq.name}: {len(dados['precos'])} assets, "
+                     f"tier {dados['nivel']}, {dados['tempo']:.3f}s")
+        return arq
+
+
+def carregar_instancia(arq):
+    """Lê uma instância do corpus como dict (escalares como tipos Python, None restaurado)."""
+    with np.load(arq, allow_pickle=False) as z:
+        inst = {k: (z[k] if z[k].ndim else z[k].item()) for k in z.files}
+    inst["k_min"] = inst["k_min"] or None
+    for campo in ("tempo_limite", "gap_rel"):
+        inst[campo] = None if np.isnan(inst[campo]) else inst[campo]
+    inst["arquivo"] = Path(arq).name
+    return inst
+
+
+def algoritmo(inst):
+    """Algoritmo que produziu a instância: "decomposto", "aproximado" ou "plano".
+
+    None se foi decomposta mas a captura não tem os `grupos` (não dá p/ repetir).
+    """
+    if inst.get("meta_decompor") and inst.get("meta_vencedor", "decomposto") == "decomposto":
+        return "decomposto" if "grupos" in inst else None
+    return "aproximado" if inst.get("meta_aproximado") == "True" else "plano"
+
+
+def reexecutar(corpus, backend=None, usar_presolve=True, tempo_limite=None, gap_rel=None, repeticoes=1):
+    """
+    Resolve de novo cada instância do corpus (sem cache) com o mesmo algoritmo
+    da captura (ver `algoritmo`) e compara com o capturado.
+
+    - corpus: CorpusProblemas ou diretório;
+    - backend / usar_presolve: repassados a `solver.resolver` (instâncias
+      decompostas usam o padrão de `solver.resolver_decomposto`);
+    - tempo_limite / gap_rel: None = os valores gravados na captura;
+    - repeticoes: solves por instância; o tempo reportado é o mínimo.
+
+    Retorna DataFrame com uma linha por instância: `algoritmo`, `tempo_orig`,
+    `tempo`, `razao_tempo`, `objetivo_orig`, `objetivo`, `dif_objetivo`
+    (positivo = pior) e os níveis da cascata antes/depois. Instâncias
+    decompostas capturadas sem `grupos` saem com `pulado=True` e sem replay.
+    """
+    if backend and backend not in pl.listSolvers(onlyAvailable=True):
+        raise ValueError(f"Backend indisponível: {backend!r} (disponíveis: {pl.listSolvers(onlyAvailable=True)})")
+    if not isinstance(corpus, CorpusProblemas):
+        corpus = CorpusProblemas(corpus)
+
+    linhas = []
+    for inst in corpus:
+        alg = algoritmo(inst)
+        linha = {
+            "arquivo": inst["arquivo"], "mes": inst.get("meta_mes"), "data": inst.get("meta_data"),
+            "n_ativos": len(inst["precos"]), "k_min": inst["k_min"], "cache_orig": inst["cache"],
+            "algoritmo": alg or "decomposto", "pulado": alg is None,
+            "nivel_orig": inst["nivel"], "tempo_orig": inst["tempo"], "objetivo_orig": inst["objetivo"],
+        }
+        if alg is None:
+            logger.warning(f"Skipping {inst['arquivo']}: decomposed solve captured without groups")
+            linhas.append({**linha, "nivel": None, "tempo": np.nan, "objetivo": np.nan})
+            continue
+
+        tl = inst["tempo_limite"] if tempo_limite is None else tempo_limite
+        gr = inst["gap_rel"] if gap_rel is None else gap_rel
+        tempos = []
+        for _ in range(max(repeticoes, 1)):
+            t0 = time.perf_counter()
+            if alg == "decomposto":
+                res = solver.resolver_decomposto(inst["precos"], inst["deficits"], inst["inteiro"],
+                                                 inst["orcamento"], inst["grupos"], k_min=inst["k_min"],
+                                                 tempo_limite=tl, gap_rel=gr, cache=None)
+            else:
+                res = solver.resolver(inst["precos"], inst["deficits"], inst["inteiro"], inst["orcamento"],
+                                      k_min=inst["k_min"], tempo_limite=tl, gap_rel=gr, cache=None,
+                                      backend=backend, usar_presolve=usar_presolve,
+                                      aproximado=alg == "aproximado")
+            tempos.append(time.perf_counter() - t0)
+
+        linhas.append({**linha, "nivel": res["nivel"], "tempo": min(tempos), "objetivo": res["objetivo"]})
+
+    df = pd.DataFrame(linhas)
+    if df.empty:
+        logger.warning(f"Problem corpus at {corpus.diretorio} is empty, nothing to replay")
+        return df
+    df["razao_tempo"] = df["tempo"] / df["tempo_orig"].where(df["tempo_orig"] > 0)
+    df["dif_objetivo"] = df["objetivo"] - df["objetivo_orig"]
+
+    piores = int((df["dif_objetivo"] > solver.GAP_ABS).sum())
+    melhores = int((df["dif_objetivo"] < -solver.GAP_ABS).sum())
+    logger.info(f"Replayed {len(df)} problems (backend={backend or solver.BACKEND_PADRAO}, "
+                f"presolve={usar_presolve}): {df['tempo'].sum():.3f}s vs {df['tempo_orig'].sum():.3f}s captured, "
+                f"{piores} worse / {melhores} better objectives")
+    return df
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from src.logger import setup_logger
+
+    parser = argparse.ArgumentParser(description="Reexecuta um corpus de problemas de aporte.")
+    parser.add_argument("diretorio")
+    parser.add_argument("--backend", default=None, help="solver do PuLP (padrão: PULP_CBC_CMD)")
+    parser.add_argument("--sem-presolve", action="store_true")
+    parser.add_argument("--tempo-limite", type=float, default=None)
+    parser.add_argument("--gap-rel", type=float, default=None)
+    parser.add_argument("--repeticoes", type=int, default=1)
+    parser.add_argument("--saida", default=None, help="CSV com o comparativo por instância")
+    args = parser.parse_args()
+
+    setup_logger(log_level=logging.INFO)
+    df = reexecutar(args.diretorio, backend=args.backend, usar_presolve=not args.sem_presolve,
+                    tempo_limite=args.tempo_limite, gap_rel=args.gap_rel, repeticoes=args.repeticoes)
+    if args.saida:
+        df.to_csv(args.saida, index=False, encoding="utf-8")
+    print(df.to_string(index=False))
@@ -0,0 +1,248 @@
+import json
+import logging
+import multiprocessing as mp
+import os
+import queue
+import signal
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pulp as pl
+
+from src import solver
+from src.logger import emit_event
+
+logger = logging.getLogger(__name__)
+
+# Configurações que disputam cada solve: opções de solver.resolver, ou
+# decompor=True p/ solver.resolver_decomposto (só entra quando há `grupos`)
+CONFIGURACOES_PADRAO = {
+    "cbc_presolve": {"backend": "PULP_CBC_CMD", "usar_presolve": True},
+    "cbc_completo": {"backend": "PULP_CBC_CMD", "usar_presolve": False},
+    "highs_presolve": {"backend": "HiGHS_CMD", "usar_presolve": True},
+    "highs": {"backend": "HiGHS", "usar_presolve": True},
+    "decomposto": {"decompor": True},
+}
+
+# Espera além do tempo_limite antes de desistir dos competidores (importação, processo do solver)
+FOLGA_S = 5.0
+
+# Prazo da corrida quando o solve não tem tempo_limite (competidor travado não bloqueia para sempre)
+PRAZO_PADRAO_S = 600.0
+
+# Intervalo de checagem dos competidores enquanto nenhum responde
+ESPERA_FILA_S = 0.2
+
+# Folga relativa no teste de orçamento (tolerância de viabilidade dos solvers)
+TOL_ORCAMENTO = 1e-6
+
+
+def provado(res):
+    """True se o MILP provou o ótimo (objetivo no limite inferior do próprio resultado).
+
+    Só o nível "milp" conta: o limite da decomposição e os das heurísticas não provam nada.
+    """
+    return res["nivel"] == "milp" and res["objetivo"] - res["limite_inferior"] <= solver.GAP_ABS + 1e-9
+
+
+def viavel(res, precos, orcamento, k_min=None):
+    """True se o resultado cabe no orçamento e compra pelo menos `k_min` ativos."""
+    qtd = np.asarray(res["qtd"], dtype=float)
+    cabe = float(precos @ qtd) <= orcamento + TOL_ORCAMENTO * max(orcamento, 1.0)
+    return cabe and (not k_min or int((qtd > 0).sum()) >= k_min)
+
+
+def _competidor(nome, config, problema, fila):
+    """Processo de um competidor: resolve sem cache e devolve (nome, res, erro) na fila."""
+    if hasattr(os, "setsid"):
+        os.setsid()                 # grupo próprio: cancelar derruba também o processo do solver
+    try:
+        if config.get("decompor"):
+            res = solver.resolver_decomposto(
+                problema["precos"], problema["deficits"], problema["inteiro"], problema["orcamento"],
+                problema["grupos"], k_min=problema["k_min"], tempo_limite=problema["tempo_limite"],
+                gap_rel=problema["gap_rel"], cache=None)
+        else:
+            res = solver.resolver(
+                problema["precos"], problema["deficits"], problema["inteiro"], problema["orcamento"],
+                k_min=problema["k_min"], tempo_limite=problema["tempo_limite"], gap_rel=problema["gap_rel"],
+                cache=None, backend=config.get("backend"), usar_presolve=config.get("usar_presolve", True))
+        fila.put((nome, res, None))
+    except Exception as e:
+        fila.put((nome, None, repr(e)))
+
+
+def _cancelar(proc):
+    if not proc.is_alive():
+        proc.join()
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (AttributeError, ProcessLookupError, PermissionError):
+        proc.kill()                 # sem grupo próprio (Windows, ou ainda não chamou setsid)
+    proc.join()
+
+
+class CorridaSolvers:
+    """
+    Corrida de configurações de solver em processos separados.
+
+    Cada solve dispara as configurações ao mesmo tempo; o primeiro resultado
+    com ótimo provado vence e os demais processos são cancelados. Sem ótimo
+    provado (tempo_limite, gap_rel ou decomposição), espera todos terminarem
+    ou o prazo (tempo_limite, ou `prazo_padrao` sem ele, + `folga`) e fica com
+    o menor objetivo. Resultados que estouram o orçamento ou compram menos de
+    `k_min` ativos saem da disputa.
+
+    - configuracoes: {nome: opções} (padrão CONFIGURACOES_PADRAO; backends
+      indisponíveis no PuLP são descartados);
+    - max_concorrentes: quantas disputam cada solve; as de maior taxa de vitória
+      vão primeiro, e as nunca testadas têm prioridade;
+    - arquivo: JSON onde as estatísticas de vitória persistem entre execuções;
+    - prazo_padrao: prazo (s) dos solves sem tempo_limite, além da `folga`.
+    """
+
+    def __init__(self, configuracoes=None, max_concorrentes=None, arquivo=None, folga=FOLGA_S,
+                 prazo_padrao=PRAZO_PADRAO_S):
+        configuracoes = dict(CONFIGURACOES_PADRAO if configuracoes is None else configuracoes)
+        disponiveis = pl.listSolvers(onlyAvailable=True)
+        indisponiveis = [n for n, c in configuracoes.items() if c.get("backend") and c["backend"] not in disponiveis]
+        if indisponiveis:
+            logger.info(f"Solver race: skipping unavailable configurations {indisponiveis}")
+        self.configuracoes = {n: c for n, c in configuracoes.items() if n not in indisponiveis}
+        if not self.configuracoes:
+            raise ValueError(f"Nenhuma configuração disponível (backends instalados: {disponiveis})")
+        self.max_concorrentes = max_concorrentes
+        self.folga = folga
+        self.prazo_padrao = prazo_padrao
+        self.arquivo = Path(arquivo) if arquivo else None
+        self._stats = {n: {"corridas": 0, "vitorias": 0, "tempo_vitorias": 0.0} for n in self.configuracoes}
+        if self.arquivo is not None and self.arquivo.exists():
+            for nome, s in json.loads(self.arquivo.read_text(encoding="utf-8")).items():
+                if nome in self._stats:
+                    self._stats[nome].update(s)
+
+    # ------------- estatísticas ---------------------
+    def ordem(self):
+        """Configurações em ordem de prioridade (nunca testadas, depois maior taxa de vitória)."""
+        def taxa(nome):
+            s = self._stats[nome]
+            return np.inf if s["corridas"] == 0 else s["vitorias"] / s["corridas"]
+        return sorted(self.configuracoes, key=taxa, reverse=True)
+
+    def preferida(self):
+        """Configuração com mais vitórias (candidata a padrão fora do modo corrida)."""
+        return max(self.ordem(), key=lambda n: self._stats[n]["vitorias"])
+
+    def estatisticas(self):
+        """DataFrame por configuração: corridas, vitórias, taxa e tempo médio das vitórias."""
+        df = pd.DataFrame.from_dict(self._stats, orient="index")
+        df["taxa_vitoria"] = df["vitorias"] / df["corridas"].where(df["corridas"] > 0)
+        df["tempo_medio_vitoria"] = df["tempo_vitorias"] / df["vitorias"].where(df["vitorias"] > 0)
+        return df.drop(columns="tempo_vitorias").sort_values("vitorias", ascending=False)
+
+    def _registrar(self, participantes, vencedor, tempo):
+        for nome in participantes:
+            self._stats[nome]["corridas"] += 1
+        if vencedor is not None:
+            self._stats[vencedor]["vitorias"] += 1
+            self._stats[vencedor]["tempo_vitorias"] += tempo
+        if self.arquivo is not None:
+            self.arquivo.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.arquivo.with_name(f".{self.arquivo.name}.{os.getpid()}")
+            tmp.write_text(json.dumps(self._stats, indent=2), encoding="utf-8")
+            os.replace(tmp, self.arquivo)
+
+    # ------------- corrida --------------------------
+    def resolver(self, precos, deficits, inteiro, orcamento, k_min=None, tempo_limite=None, gap_rel=None,
+                 grupos=None, cache=solver.CACHE_PADRAO):
+        """
+        Mesmo contrato de `solver.resolver`, com a chave `vencedor` (nome da
+        configuração) no dict retornado. `grupos` habilita a configuração decomposta.
+        """
+        precos = np.asarray(precos, dtype=float)
+        deficits = np.asarray(deficits, dtype=float)
+        inteiro = np.asarray(inteiro, dtype=bool)
+
+        emit_event("solve_start", n_assets=len(precos), budget=float(orcamento), k_min=k_min, race=True)
+        if cache is None:
+            res = self._disputar(precos, deficits, inteiro, orcamento, k_min, tempo_limite, gap_rel, grupos)
+        else:
+            chave = cache.chave(precos, deficits, inteiro, orcamento, k_min,
+                                tempo_limite=tempo_limite, gap_rel=gap_rel, corrida=True)
+            # o cache guarda só os valores escalares e `qtd` (ver CacheSolve._gravar_disco)
+            res, do_cache = cache.obter_ou_calcular(chave, lambda: {
+                k: v for k, v in self._disputar(precos, deficits, inteiro, orcamento, k_min,
+                                                tempo_limite, gap_rel, grupos).items()
+                if not isinstance(v, dict)})
+            res["cache"] = do_cache
+        solver.emitir_fim_solve(res, winner=res.get("vencedor"))
+        return res
+
+    def _disputar(self, precos, deficits, inteiro, orcamento, k_min, tempo_limite, gap_rel, grupos):
+        nomes = [n for n in self.ordem() if grupos is not None or not self.configuracoes[n].get("decompor")]
+        nomes = nomes[:self.max_concorrentes]
+        problema = {"precos": precos, "deficits": deficits, "inteiro": inteiro, "orcamento": orcamento,
+                    "k_min": k_min, "tempo_limite": tempo_limite, "gap_rel": gap_rel,
+                    "grupos": None if grupos is None else np.asarray(grupos)}
+
+        t0 = time.perf_counter()
+        fila = mp.Queue()
+        procs = {n: mp.Process(target=_competidor, args=(n, self.configuracoes[n], problema, fila), daemon=True)
+                 for n in nomes}
+        for p in procs.values():
+            p.start()
+
+        prazo = t0 + (self.prazo_padrao if tempo_limite is None else tempo_limite) + self.folga
+        resultados, pendentes, vencedor = {}, set(nomes), None
+        try:
+            while pendentes:
+                if time.perf_counter() >= prazo:
+                    logger.warning(f"Solver race deadline reached, cancelling {sorted(pendentes)}")
+                    break
+                try:
+                    nome, res, erro = fila.get(timeout=ESPERA_FILA_S)
+                except queue.Empty:
+                    # competidor que morreu sem responder (ex.: OOM) sai da disputa
+                    for nome in [n for n in pendentes if procs[n].exitcode not in (None, 0)]:
+                        logger.warning(f"Solver race: {nome} exited with code {procs[nome].exitcode}")
+                        pendentes.discard(nome)
+                    continue
+                pendentes.discard(nome)
+                if erro is not None:
+                    logger.warning(f"Solver race: {nome} failed: {erro}")
+                    continue
+                if not viavel(res, precos, orcamento, k_min):
+                    logger.warning(f"Solver race: dropping {nome}, result breaks the budget or k_min={k_min}")
+                    continue
+                resultados[nome] = res
+                logger.debug(f"Solver race: {nome} finished in {time.perf_counter() - t0:.3f}s "
+                             f"(tier {res['nivel']}, objective {res['objetivo']:,.2f})")
+                if provado(res):
+                    vencedor = nome
+                    break
+        finally:
+            for p in procs.values():
+                _cancelar(p)
+            fila.close()
+
+        if vencedor is None and resultados:
+            vencedor = min(resultados, key=lambda n: resultados[n]["objetivo"])
+        tempo = time.perf_counter() - t0
+        self._registrar(nomes, vencedor, tempo)
+
+        if vencedor is None:
+            logger.warning("Solver race produced no result, falling back to deficit strategy")
+            qtd = solver.alocar_deficit(precos, deficits, inteiro, orcamento)
+            objetivo = solver.gap_residual(precos, deficits, qtd)
+            res = {"qtd": qtd, "nivel": "deficit", "objetivo": objetivo, "limite_inferior": np.nan,
+                   "gap": np.nan, "tempo": tempo, "cache": False}
+        else:
+            res = {**resultados[vencedor], "tempo": tempo, "cache": False}
+            logger.info(f"Solver race won by {vencedor} in {tempo:.3f}s "
+                        f"({'proven' if provado(res) else 'best of ' + str(len(resultados))}, "
+                        f"{len(nomes)} configurations)")
+        res["vencedor"] = vencedor
+        return res
@@ -0,0 +1,318 @@
+import contextlib
+import hashlib
+import itertools
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+import traceback
+from pathlib import Path
+
+import pandas as pd
+
+from src.resultados import hash_mercado, hash_posicao
+
+logger = logging.getLogger(__name__)
+
+# Status de um job na fila
+PENDENTE, EXECUTANDO, CONCLUIDO, FALHOU = "pendente", "executando", "concluido", "falhou"
+
+# Parâmetros de PortfolioSimulator aceitos num job (precisam ser serializáveis em JSON)
+PARAMS_SIMULADOR = ("valor_aporte_mensal", "k_min_po", "freq", "tempo_limite_po", "gap_rel_po",
+                    "reutilizar_po", "decompor_po", "aproximado_po")
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    params TEXT NOT NULL,
+    snapshot TEXT NOT NULL,
+    status TEXT NOT NULL,
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    max_tentativas INTEGER NOT NULL,
+    worker TEXT,
+    criado REAL NOT NULL,
+    iniciado REAL,
+    finalizado REAL,
+    erro TEXT,
+    resultado TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, criado);
+"""
+
+
+def _normalizar(valor):
+    """numpy → Python e números inteiros como int (5000.0 e 5000 geram o mesmo job)."""
+    if hasattr(valor, "item"):
+        valor = valor.item()
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
+
+
+def id_job(params, snapshot):
+    """Hash canônico de parâmetros + snapshot: jobs idênticos têm o mesmo id."""
+    canonico = json.dumps({"params": params, "snapshot": snapshot}, sort_keys=True, default=str)
+    return hashlib.sha1(canonico.encode()).hexdigest()
+
+
+# ------------- snapshots de dados de mercado ----------------
+def criar_snapshot(diretorio, df_posicao, meses, data_fim_str=None, dados=None):
+    """
+    Congela posição + séries de mercado de uma janela num arquivo do cache
+    compartilhado (`diretorio`); os workers simulam a partir dele, sem rede.
+
+    Se `dados` for None, baixa as séries uma vez (PortfolioSimulator.obter_dados_historicos).
+    Retorna o id do snapshot (hash do conteúdo).
+    """
+    from src.simulator import PortfolioSimulator
+
+    if dados is None:
+        dados = PortfolioSimulator(df_posicao).obter_dados_historicos(meses, data_fim_str)
+    snap = {"posicao": df_posicao, "dados": dados, "meses": meses, "data_fim_str": data_fim_str}
+
+    h = hashlib.sha1()
+    h.update(hash_posicao(df_posicao).encode())
+    h.update(hash_mercado(dados).encode())
+    h.update(repr((meses, data_fim_str)).encode())
+    snapshot = h.hexdigest()[:16]
+
+    arq = Path(diretorio) / f"{snapshot}.pkl.gz"
+    if not arq.exists():
+        arq.parent.mkdir(parents=True, exist_ok=True)
+        tmp = arq.with_name(f".{arq.name}.{os.getpid()}")
+        pd.to_pickle(snap, tmp, compression="gzip")
+        os.replace(tmp, arq)
+    logger.info(f"Market data snapshot {snapshot}: {len(dados)} series, {meses} months to {data_fim_str or 'today'}")
+    return snapshot
+
+
+def carregar_snapshot(diretorio, snapshot):
+    return pd.read_pickle(Path(diretorio) / f"{snapshot}.pkl.gz")
+
+
+# ------------- fila ------------------------------------------
+class FilaJobs:
+    """
+    Fila de jobs de backtest em SQLite, sem broker: qualquer processo (ou nó,
+    com o arquivo em disco compartilhado) enfileira e consome.
+
+    - job = parâmetros do simulador (ver PARAMS_SIMULADOR) + id de snapshot;
+      jobs idênticos são deduplicados pelo hash (`id_job`);
+    - `reservar` entrega o job pendente mais antigo de forma atômica; um job
+      em execução há mais de `lease` segundos (worker morto) volta a ser elegível,
+      e conta como tentativa;
+    - falhas voltam para a fila até `max_tentativas`, depois ficam como "falhou";
+    - `concluir`/`falhar` só valem para o worker que detém a reserva.
+    """
+
+    def __init__(self, caminho, lease=3600.0):
+        self.caminho = Path(caminho)
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        self.lease = lease
+        with self._conectar() as con:
+            con.executescript(_ESQUEMA)
+
+    @contextlib.contextmanager
+    def _conectar(self):
+        con = sqlite3.connect(self.caminho, timeout=60, isolation_level=None)
+        try:
+            yield con
+        finally:
+            con.close()
+
+    def enfileirar(self, params, snapshot, max_tentativas=3):
+        """Adiciona o job (se ainda não existir). Retorna (id, novo)."""
+        desconhecidos = set(params) - set(PARAMS_SIMULADOR)
+        if desconhecidos:
+            raise ValueError(f"Parâmetros não suportados no job: {sorted(desconhecidos)}")
+        params = {k: _normalizar(v) for k, v in params.items()}
+        jid = id_job(params, snapshot)
+        with self._conectar() as con:
+            cur = con.execute(
+                "INSERT OR IGNORE INTO jobs (id, params, snapshot, status, max_tentativas, criado) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (jid, json.dumps(params, sort_keys=True), snapshot, PENDENTE, max_tentativas, time.time()))
+            novo = cur.rowcount == 1
+        logger.debug(f"Job {jid[:12]} {'queued' if novo else 'already in queue (deduplicated)'}")
+        return jid, novo
+
+    def enfileirar_grade(self, grade, snapshot, max_tentativas=3):
+        """Enfileira o produto cartesiano de `grade` ({parâmetro: [valores]}). Retorna os ids."""
+        chaves = sorted(grade)
+        ids, novos = [], 0
+        for valores in itertools.product(*(grade[k] for k in chaves)):
+            jid, novo = self.enfileirar(dict(zip(chaves, valores)), snapshot, max_tentativas)
+            ids.append(jid)
+            novos += novo
+        logger.info(f"Queued {novos} new jobs ({len(ids) - novos} deduplicated) on snapshot {snapshot}")
+        return ids
+
+    def reservar(self, worker):
+        """Reserva o próximo job elegível para `worker`; None se não houver."""
+        agora = time.time()
+        with self._conectar() as con:
+            con.execute("BEGIN IMMEDIATE")             # trava de escrita: um job, um worker
+            try:
+                # lease vencido sem tentativas restantes (ex.: job que derruba o worker): desiste
+                perdidos = con.execute(
+                    "UPDATE jobs SET status = ?, finalizado = ?, erro = ? "
+                    "WHERE status = ? AND iniciado < ? AND tentativas >= max_tentativas",
+                    (FALHOU, agora, "lease expirado em todas as tentativas", EXECUTANDO, agora - self.lease)).rowcount
+                if perdidos:
+                    logger.warning(f"{perdidos} jobs exhausted their attempts on expired leases, marked as failed")
+                linha = con.execute(
+                    "SELECT id, params, snapshot, tentativas FROM jobs "
+                    "WHERE status = ? OR (status = ? AND iniciado < ? AND tentativas < max_tentativas) "
+                    "ORDER BY criado LIMIT 1",
+                    (PENDENTE, EXECUTANDO, agora - self.lease)).fetchone()
+                if linha is not None:
+                    con.execute("UPDATE jobs SET status = ?, worker = ?, iniciado = ?, tentativas = tentativas + 1 "
+                                "WHERE id = ?", (EXECUTANDO, worker, agora, linha[0]))
+                con.execute("COMMIT")
+            except Exception:
+                con.execute("ROLLBACK")
+                raise
+        if linha is None:
+            return None
+        return {"id": linha[0], "params": json.loads(linha[1]), "snapshot": linha[2],
+                "tentativa": linha[3] + 1, "worker": worker}
+
+    def concluir(self, jid, resultado, worker):
+        """Marca o job como concluído se `worker` ainda detém a reserva; retorna True se gravou."""
+        with self._conectar() as con:
+            ok = con.execute("UPDATE jobs SET status = ?, finalizado = ?, resultado = ?, erro = NULL "
+                             "WHERE id = ? AND worker = ? AND status = ?",
+                             (CONCLUIDO, time.time(), str(resultado), jid, worker, EXECUTANDO)).rowcount == 1
+        if not ok:
+            logger.warning(f"Job {jid[:12]} no longer leased by {worker}, discarding its result")
+        return ok
+
+    def falhar(self, jid, erro, worker):
+        """Registra a falha (se `worker` ainda detém a reserva); o job volta a pendente
+        enquanto houver tentativas. Retorna o novo status, ou None se a reserva foi perdida."""
+        with self._conectar() as con:
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                linha = con.execute(
+                    "SELECT tentativas, max_tentativas FROM jobs WHERE id = ? AND worker = ? AND status = ?",
+                    (jid, worker, EXECUTANDO)).fetchone()
+                if linha is not None:
+                    tentativas, maximo = linha
+                    status = PENDENTE if tentativas < maximo else FALHOU
+                    con.execute("UPDATE jobs SET status = ?, finalizado = ?, erro = ? WHERE id = ?",
+                                (status, time.time(), erro, jid))
+                con.execute("COMMIT")
+            except Exception:
+                con.execute("ROLLBACK")
+                raise
+        if linha is None:
+            logger.warning(f"Job {jid[:12]} no longer leased by {worker}, ignoring its failure")
+            return None
+        logger.warning(f"Job {jid[:12]} failed (attempt {tentativas}/{maximo}), "
+                       f"{'will retry' if status == PENDENTE else 'giving up'}")
+        return status
+
+    def reenfileirar_falhas(self):
+        """Devolve à fila os jobs que esgotaram as tentativas (zera o contador)."""
+        with self._conectar() as con:
+            n = con.execute("UPDATE jobs SET status = ?, tentativas = 0 WHERE status = ?",
+                            (PENDENTE, FALHOU)).rowcount
+        logger.info(f"Requeued {n} failed jobs")
+        return n
+
+    def estatisticas(self):
+        with self._conectar() as con:
+            contagem = dict(con.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {s: contagem.get(s, 0) for s in (PENDENTE, EXECUTANDO, CONCLUIDO, FALHOU)}
+
+    def jobs(self):
+        """Todos os jobs como DataFrame (parâmetros expandidos em colunas)."""
+        with self._conectar() as con:
+            df = pd.read_sql_query("SELECT * FROM jobs ORDER BY criado", con)
+        if df.empty:
+            return df
+        params = pd.DataFrame([json.loads(p) for p in df.pop("params")], index=df.index)
+        return pd.concat([df, params], axis=1)
+
+
+# ------------- worker ----------------------------------------
+def executar_job(job, dir_snapshots, dir_resultados):
+    """Roda `simular` para um job e grava resultados e aportes em `dir_resultados/<id>.pkl.gz`."""
+    from src.simulator import PortfolioSimulator
+
+    snap = carregar_snapshot(dir_snapshots, job["snapshot"])
+    t0 = time.perf_counter()
+    sim = PortfolioSimulator(snap["posicao"], dados_mercado=snap["dados"], **job["params"])
+    resultados = sim.simular(snap["meses"], snap["data_fim_str"])
+    saida = {
+        "id": job["id"], "params": job["params"], "snapshot": job["snapshot"],
+        "resultados": resultados, "aportes": sim.obter_df_aportes(),
+        "tempo": time.perf_counter() - t0,
+    }
+    arq = Path(dir_resultados) / f"{job['id']}.pkl.gz"
+    arq.parent.mkdir(parents=True, exist_ok=True)
+    tmp = arq.with_name(f".{arq.name}.{os.getpid()}")
+    pd.to_pickle(saida, tmp, compression="gzip")
+    os.replace(tmp, arq)
+    return arq
+
+
+def executar_worker(fila, dir_snapshots, dir_resultados, worker=None, max_jobs=None,
+                    espera=5.0, parar_quando_vazia=True):
+    """
+    Loop de um worker: reserva, executa e conclui jobs até a fila esvaziar
+    (ou indefinidamente, aguardando `espera` s, se parar_quando_vazia=False).
+    Retorna o número de jobs concluídos.
+    """
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    feitos = 0
+    logger.info(f"Worker {worker} started on {fila.caminho}")
+    while max_jobs is None or feitos < max_jobs:
+        job = fila.reservar(worker)
+        if job is None:
+            if parar_quando_vazia:
+                break
+            time.sleep(espera)
+            continue
+        logger.info(f"Worker {worker} running job {job['id'][:12]} (attempt {job['tentativa']}): {job['params']}")
+        try:
+            arq = executar_job(job, dir_snapshots, dir_resultados)
+        except Exception as e:
+            logger.error(f"Job {job['id'][:12]} raised {type(e).__name__}: {str(e)}")
+            fila.falhar(job["id"], traceback.format_exc(), worker)
+            continue
+        feitos += fila.concluir(job["id"], arq, worker)
+    logger.info(f"Worker {worker} finished: {feitos} jobs done, queue {fila.estatisticas()}")
+    return feitos
+
+
+def carregar_resultados(fila):
+    """Concatena os resultados dos jobs concluídos, com os parâmetros de cada job em colunas."""
+    partes = []
+    jobs = fila.jobs()
+    if jobs.empty:
+        return pd.DataFrame()
+    for _, job in jobs[jobs["status"] == CONCLUIDO].iterrows():
+        saida = pd.read_pickle(job["resultado"])
+        partes.append(saida["resultados"].assign(job=job["id"], **saida["params"]))
+    return pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from src.logger import setup_logger
+
+    parser = argparse.ArgumentParser(description="Worker da fila de backtests.")
+    parser.add_argument("fila", help="arquivo SQLite da fila")
+    parser.add_argument("--snapshots", required=True, help="pasta compartilhada de snapshots de mercado")
+    parser.add_argument("--resultados", required=True, help="pasta compartilhada de resultados")
+    parser.add_argument("--max-jobs", type=int, default=None)
+    parser.add_argument("--aguardar", action="store_true", help="não sai quando a fila esvazia")
+    args = parser.parse_args()
+
+    setup_logger(log_level=logging.INFO)
+    executar_worker(FilaJobs(args.fila), args.snapshots, args.resultados,
+                    max_jobs=args.max_jobs, parar_quando_vazia=not args.aguardar)
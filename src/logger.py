@@ -1,10 +1,29 @@
+import atexit
+import json
 import logging
 import logging.config
 import os
-from datetime import datetime
+import threading
+import uuid
+from datetime import date, datetime
 from pathlib import Path
 
-def setup_logger(log_level=logging.INFO, log_file=None):
+import numpy as np
+import pandas as pd
+
+# tipos de evento do stream estruturado e seus campos obrigatórios
+EVENT_TYPES = {
+    "run_start": (),
+    "run_end": (),
+    "month_start": ("month", "date", "contribution"),
+    "price_update": ("month", "updated", "missing"),
+    "solve_start": ("n_assets", "budget", "k_min"),
+    "solve_end": ("tier", "objective", "gap", "seconds", "cached"),
+    "trade": ("month", "strategy", "ticker", "qty", "value", "price"),
+    "leftover_sweep": ("month", "strategy", "ticker", "value"),
+}
+
+def setup_logger(log_level=logging.INFO, log_file=None, events_file=None, run_id=None):
     """
     Set up logging configuration for the entire application.
     
@@ -12,6 +31,9 @@ def setup_logger(log_level=logging.INFO, log_file=None):
         log_level: Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
         log_file: Optional log file name. If None, logs to console only.
                  The file will be created in the 'logs' folder at project root.
+        events_file: Optional JSON-lines file name for the structured event
+                 stream (see start_events), also created in the 'logs' folder.
+        run_id: Run identifier stamped on every event (random if None).
     """
     
     # diretorio raiz
@@ -82,6 +104,8 @@ def setup_logger(log_level=logging.INFO, log_file=None):
     logger.info(f"Logging system initialized. Log directory: {logs_dir}")
     if log_file_path:
         logger.info(f"Log file: {log_file_path}")
+    if events_file:
+        start_events(logs_dir / events_file, run_id=run_id)
     
     return logger
 
@@ -90,6 +114,128 @@ def get_log_filename():
     now = datetime.now().strftime("%Y%m%d_%H%M%S")
     return f"aportes_otimizacao_{now}.log"
 
+def get_events_filename():
+    """Generate a structured event stream filename"""
+    now = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"eventos_{now}.jsonl"
+
+# ------------- stream estruturado de eventos ----------------
+class EventSink:
+    """
+    Append-only JSON-lines sink for typed run events.
+
+    Every line carries `ts`, `run` and `event` plus the event fields and the
+    current context (see set_event_context). Only the process that opened the
+    sink writes: forked solver workers inherit it but stay silent.
+    """
+
+    def __init__(self, path, run_id=None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.context = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def emit(self, event, **fields):
+        if event not in EVENT_TYPES:
+            raise ValueError(f"Tipo de evento desconhecido: {event!r} (use um de {sorted(EVENT_TYPES)})")
+        missing = [f for f in EVENT_TYPES[event] if f not in fields and f not in self.context]
+        if missing:
+            raise ValueError(f"Evento {event!r} sem os campos {missing}")
+        if os.getpid() != self._pid:
+            return
+        record = {"ts": datetime.now().isoformat(timespec="microseconds"), "run": self.run_id,
+                  "event": event, **self.context, **fields}
+        line = json.dumps(record, separators=(",", ":"), ensure_ascii=False, default=_json_default)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Timestamp, datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+_events = None
+
+
+def start_events(path, run_id=None, **metadata):
+    """
+    Open the structured event sink and emit `run_start` (with `metadata`).
+
+    Args:
+        path: JSON-lines file; appended to if it already exists.
+        run_id: Run identifier stamped on every event (random if None).
+    Returns:
+        The EventSink (its `run_id` identifies the run).
+    """
+    global _events
+    stop_events()
+    _events = EventSink(path, run_id)
+    atexit.register(stop_events)
+    _events.emit("run_start", pid=os.getpid(), **metadata)
+    logging.getLogger(__name__).info(f"Event stream: {_events.path} (run {_events.run_id})")
+    return _events
+
+
+def stop_events():
+    """Emit `run_end` and close the event sink, if open."""
+    global _events
+    if _events is not None:
+        _events.emit("run_end")
+        _events.close()
+        _events = None
+
+
+def events_enabled():
+    """True if a sink is open (lets callers skip building costly payloads)."""
+    return _events is not None
+
+
+def emit_event(event, **fields):
+    """Write a typed event to the open sink; no-op when events are disabled."""
+    if _events is not None:
+        _events.emit(event, **fields)
+
+
+def set_event_context(**fields):
+    """Fields merged into every following event (None removes a field)."""
+    if _events is not None:
+        _events.context.update(fields)
+        _events.context = {k: v for k, v in _events.context.items() if v is not None}
+
+
+def read_events(paths=None, event=None):
+    """
+    Load event streams into one DataFrame for cross-run queries.
+
+    Args:
+        paths: JSONL file, directory (all eventos_*.jsonl) or list of files;
+               None reads the 'logs' folder at project root.
+        event: Optional event type (or list of types) to keep.
+    """
+    if paths is None:
+        paths = get_project_root() / "logs"
+    if isinstance(paths, (str, Path)):
+        paths = sorted(Path(paths).glob("eventos_*.jsonl")) if Path(paths).is_dir() else [Path(paths)]
+    frames = [pd.read_json(p, lines=True, convert_dates=["ts"]) for p in paths if Path(p).stat().st_size]
+    if not frames:
+        return pd.DataFrame(columns=["ts", "run", "event"])
+    df = pd.concat(frames, ignore_index=True)
+    if event is not None:
+        df = df[df["event"].isin([event] if isinstance(event, str) else event)].reset_index(drop=True)
+    return df
+
 def get_project_root():
     """Get the project root directory"""
     return Path(__file__).parent.parent
\ No newline at end of file
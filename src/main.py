@@ -3,14 +3,20 @@ import logging
 import pandas as pd
 import pulp as pl 
 
-from src.logger import setup_logger, get_log_filename
+from src.logger import setup_logger, get_log_filename, get_events_filename
 from src.simulator import PortfolioSimulator
 from src.utils import create_output_directory, load_position, save_dataframe_to_csv 
-from src import allocate
+from src import allocate, analytics
 
 BACKTEST = True
 VALOR_APORTE = 5000
 K_MIN = 4
+TEMPO_LIMITE_PO = 30  # segundos por solve do MILP (None = sem limite)
+FREQ = "M"          # frequência do backtest: "M" mensal, "W" semanal, "D" diário
+CORPUS_PO = None    # pasta p/ capturar as instâncias do PO (replay: python -m src.corpus <pasta>)
+MONITORAR_MEMORIA = False   # pico/consumo por fase do backtest (tracemalloc; deixa a simulação mais lenta)
+ARMAZEM_RESULTADOS = None   # pasta p/ reaproveitar backtests idênticos (ex.: output/resultados)
+EVENTOS = False     # stream estruturado de eventos em logs/eventos_*.jsonl (consulta: src.logger.read_events)
 
 third_party_loggers = ['yfinance', 'requests', 'urllib3', 'peewee', 'pulp']
 
@@ -21,7 +27,8 @@ if __name__ == '__main__':
 
     setup_logger(
         log_level=logging.INFO, 
-        log_file=get_log_filename() 
+        log_file=get_log_filename(),
+        events_file=get_events_filename() if EVENTOS else None
     )
     logger = logging.getLogger(__name__)
 
@@ -34,15 +41,22 @@ if __name__ == '__main__':
     # save_dataframe_to_csv(df_aporte, 'asset_rebalancing', out_dir)
     allocate.exibir_resultado_formatado(df_aporte, sobra_final, valor_aporte=VALOR_APORTE)
 
-    optimize = allocate.otimizar_aporte_lp(df_port, valor_aporte=VALOR_APORTE, valor_carteira=VALOR_CARTEIRA, k_min=K_MIN)
+    optimize = allocate.otimizar_aporte_lp(df_port, valor_aporte=VALOR_APORTE, valor_carteira=VALOR_CARTEIRA, k_min=K_MIN,
+                                          tempo_limite=TEMPO_LIMITE_PO)
     # save_dataframe_to_csv(optimize, 'asset_linear_programming', out_dir)
 
     if BACKTEST:
-        sim     = PortfolioSimulator(df_port, valor_aporte_mensal=VALOR_APORTE, k_min_po=K_MIN)        
+        # o armazém é endereçado pelo hash das séries: coleta antes p/ compor a chave
+        dados = PortfolioSimulator(df_port).obter_dados_historicos(24, '2025-04-01') if ARMAZEM_RESULTADOS else None
+        sim     = PortfolioSimulator(df_port, valor_aporte_mensal=VALOR_APORTE, k_min_po=K_MIN, freq=FREQ,
+                                     tempo_limite_po=TEMPO_LIMITE_PO, corpus_po=CORPUS_PO, dados_mercado=dados,
+                                     monitorar_memoria=MONITORAR_MEMORIA, armazem_resultados=ARMAZEM_RESULTADOS)        
         df_out  = sim.simular(meses=24, data_fim_str='2025-04-01')
         save_dataframe_to_csv(df_out, 'backtest_results', out_dir)
+        save_dataframe_to_csv(analytics.resumo(df_out).reset_index(), 'backtest_analytics', out_dir)
         df_aportes = sim.obter_df_aportes()
         save_dataframe_to_csv(df_aportes, 'allocation_history', out_dir)
+        save_dataframe_to_csv(sim.relatorio_memoria(), 'backtest_memory', out_dir)
 
 
 
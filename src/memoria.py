@@ -0,0 +1,225 @@
+import contextlib
+import logging
+import shutil
+import tempfile
+import time
+import tracemalloc
+import weakref
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+MB = 2**20
+
+
+def compactar(df, float32=()):
+    """Cópia de `df` com colunas de texto como categoria e as colunas `float32` rebaixadas."""
+    df = df.copy()
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            continue
+        if pd.api.types.is_string_dtype(df[col]) or df[col].dtype == object:
+            try:
+                df[col] = df[col].astype("category")
+            except TypeError:                       # valores não hasheáveis: fica como está
+                pass
+    for col in float32:
+        if col in df.columns:
+            df[col] = df[col].astype(np.float32)
+    return df
+
+
+class MonitorMemoria:
+    """
+    Pico e consumo por fase via tracemalloc.
+
+    - fase(nome): context manager; acumula chamadas, tempo, variação de memória
+      retida (`delta`) e o maior pico acima do início da fase;
+    - limite_bytes: orçamento de memória rastreada; `excedeu()` indica quando
+      o chamador deve despejar dados em disco;
+    - ao parar, guarda as linhas de código que mais alocam (`top`).
+    """
+
+    def __init__(self, limite_bytes=None, n_top=10):
+        self.limite_bytes = limite_bytes
+        self.n_top = n_top
+        self.fases = {}
+        self.pico = 0
+        self.top = []
+        self._iniciou = False
+
+    def iniciar(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._iniciou = True
+        self.fases, self.pico, self.top = {}, 0, []
+        tracemalloc.reset_peak()
+        logger.debug(f"Memory monitor started (budget={self._mb(self.limite_bytes)})")
+
+    def parar(self):
+        if not tracemalloc.is_tracing():
+            return
+        self.pico = max(self.pico, tracemalloc.get_traced_memory()[1])
+        filtro = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        self.top = tracemalloc.take_snapshot().filter_traces(filtro).statistics("lineno")[:self.n_top]
+        if self._iniciou:
+            tracemalloc.stop()
+            self._iniciou = False
+
+    @contextlib.contextmanager
+    def fase(self, nome):
+        antes, pico = tracemalloc.get_traced_memory()
+        self.pico = max(self.pico, pico)
+        tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            atual, pico = tracemalloc.get_traced_memory()
+            f = self.fases.setdefault(nome, {"chamadas": 0, "tempo": 0.0, "delta": 0, "pico_fase": 0})
+            f["chamadas"] += 1
+            f["tempo"] += time.perf_counter() - t0
+            f["delta"] += atual - antes
+            f["pico_fase"] = max(f["pico_fase"], pico - antes)
+            self.pico = max(self.pico, pico)
+
+    def atual(self):
+        return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+    def excedeu(self):
+        return self.limite_bytes is not None and self.atual() > self.limite_bytes
+
+    def relatorio(self):
+        """DataFrame por fase: chamadas, tempo (s), variação retida e pico da fase (MB)."""
+        linhas = [{"fase": nome, "chamadas": f["chamadas"], "tempo_s": f["tempo"],
+                   "delta_mb": f["delta"] / MB, "pico_fase_mb": f["pico_fase"] / MB}
+                  for nome, f in self.fases.items()]
+        return pd.DataFrame(linhas, columns=["fase", "chamadas", "tempo_s", "delta_mb", "pico_fase_mb"])
+
+    def resumir(self):
+        """Loga o pico, as fases e as maiores alocações (nível INFO/DEBUG)."""
+        logger.info(f"Memory peak: {self.pico / MB:,.1f} MB (budget {self._mb(self.limite_bytes)})")
+        for _, f in self.relatorio().iterrows():
+            logger.info(f"Memory phase {f['fase']}: {f['chamadas']} calls, {f['tempo_s']:.3f}s, "
+                        f"retained {f['delta_mb']:+,.2f} MB, phase peak {f['pico_fase_mb']:,.2f} MB")
+        for est in self.top:
+            logger.debug(f"Top allocation: {est}")
+
+    @staticmethod
+    def _mb(n):
+        return "none" if n is None else f"{n / MB:,.1f} MB"
+
+
+class LivroAportes:
+    """
+    Histórico de aportes em blocos de colunas, com compactação e despejo opcionais.
+
+    `anexar(colunas)` recebe um lote de registros como dict coluna → array
+    (escalares valem para todas as linhas); os lotes ficam pendentes e, a cada
+    `tamanho_bloco` registros, viram um DataFrame (compactado, ver `compactar`,
+    se `compacto`). DataFrames só são montados em `fatia`/`para_frame`.
+    `despejar()` grava os blocos em memória como pickles em `diretorio`
+    (pasta temporária, removida com o livro, se None).
+    """
+
+    def __init__(self, tamanho_bloco=5000, diretorio=None, float32=(), compacto=True):
+        self.tamanho_bloco = tamanho_bloco
+        self.float32 = tuple(float32)
+        self.compacto = compacto
+        self.diretorio = Path(diretorio) if diretorio else None
+        self.blocos_em_disco = 0
+        self._blocos, self._tamanhos = [], []
+        self._pendentes, self._n_pendentes = [], 0
+
+    def anexar(self, colunas):
+        """Acrescenta um lote de registros (dict coluna → array ou escalar)."""
+        n = max((len(v) for v in colunas.values() if np.ndim(v)), default=1)
+        if n == 0:
+            return
+        self._pendentes.append({c: np.asarray(v) if np.ndim(v) else self._repetir(v, n)
+                                for c, v in colunas.items()})
+        self._n_pendentes += n
+        self._fechar_bloco()
+
+    def __len__(self):
+        return sum(self._tamanhos) + self._n_pendentes
+
+    def fatia(self, inicio, fim=None):
+        """Registros `inicio:fim` (posições no livro) como DataFrame."""
+        fim = len(self) if fim is None else fim
+        partes, offset = [], 0
+        for bloco, n in zip(self._blocos, self._tamanhos):
+            if offset + n > inicio and offset < fim:
+                partes.append(self._ler(bloco).iloc[max(inicio - offset, 0):fim - offset])
+            offset += n
+        lotes = []
+        for lote in self._pendentes:
+            n = len(next(iter(lote.values())))
+            if offset + n > inicio and offset < fim:
+                lotes.append({c: v[max(inicio - offset, 0):fim - offset] for c, v in lote.items()})
+            offset += n
+        if lotes:
+            partes.append(self._frame(lotes))
+        return self._juntar(partes)
+
+    # ------------- blocos ----------------------------
+    def para_frame(self):
+        """Todos os registros num único DataFrame (lê os blocos em disco)."""
+        partes = [self._ler(b) for b in self._blocos]
+        if self._pendentes:
+            partes.append(self._frame(self._pendentes))
+        return self._juntar(partes)
+
+    def despejar(self):
+        """Grava em disco os blocos (e registros pendentes) ainda em memória; retorna quantos."""
+        self._fechar_bloco(forcar=True)
+        if self.diretorio is None:
+            self.diretorio = Path(tempfile.mkdtemp(prefix="aportes_"))
+            weakref.finalize(self, shutil.rmtree, self.diretorio, True)
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+
+        gravados = 0
+        for i, bloco in enumerate(self._blocos):
+            if isinstance(bloco, Path):
+                continue
+            arq = self.diretorio / f"aportes_{self.blocos_em_disco:05d}.pkl"
+            pd.to_pickle(bloco, arq)
+            self._blocos[i] = arq
+            self.blocos_em_disco += 1
+            gravados += 1
+        if gravados:
+            logger.debug(f"Spilled {gravados} ledger blocks to {self.diretorio}")
+        return gravados
+
+    def _frame(self, lotes):
+        colunas = {c: np.concatenate([lote[c] for lote in lotes]) for c in lotes[0]}
+        df = pd.DataFrame(colunas).infer_objects()
+        return compactar(df, self.float32) if self.compacto else df
+
+    def _fechar_bloco(self, forcar=False):
+        if not self._pendentes or (self._n_pendentes < self.tamanho_bloco and not forcar):
+            return
+        self._blocos.append(self._frame(self._pendentes))
+        self._tamanhos.append(self._n_pendentes)
+        self._pendentes, self._n_pendentes = [], 0
+
+    def _juntar(self, partes):
+        if not partes:
+            return pd.DataFrame()
+        df = pd.concat(partes, ignore_index=True).infer_objects() if len(partes) > 1 else partes[0].reset_index(drop=True)
+        return compactar(df, self.float32) if self.compacto else df
+
+    @staticmethod
+    def _repetir(valor, n):
+        arr = np.empty(n, dtype=object) if valor is None or isinstance(valor, str) else None
+        if arr is None:
+            return np.full(n, valor)
+        arr[:] = valor
+        return arr
+
+    @staticmethod
+    def _ler(bloco):
+        return pd.read_pickle(bloco) if isinstance(bloco, Path) else bloco
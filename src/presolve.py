@@ -0,0 +1,100 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def contar_modelo(n_ativos, k_min=None):
+    '''(variáveis, restrições) do MILP de `solver.montar_problema` para n ativos.'''
+    if k_min:
+        return 3 * n_ativos, 2 + 3 * n_ativos
+    return 2 * n_ativos, 1 + n_ativos
+
+
+def reduzir(precos, deficits, inteiro, orcamento, k_min=None):
+    '''
+    Presolve do problema de aporte, antes de montar o MILP:
+
+    - ativos sem déficit não reduzem gap: saem do modelo (com k_min, ficam
+      só os k_min de compra mínima mais barata, únicos úteis p/ cardinalidade);
+    - ativos de RV cuja cota custa mais que o aporte ficam fixos em zero;
+    - o teto de cada ativo (big-M) cai de aporte/preço para o déficit
+      arredondado para cima (ao menos a compra mínima);
+    - sem k_min, as linhas de RF com déficit são equivalentes em valor e
+      viram uma única linha agregada (preço 1, déficit = soma dos déficits).
+
+    Retorna dict com o problema reduzido (`precos`, `deficits`, `inteiro`,
+    `teto` em quantidades), `mantidos` (índices originais das linhas mantidas),
+    `rf_agregada` (índices originais das linhas de RF agregadas na última linha)
+    e `constante` (gap fixo dos ativos removidos, a somar ao objetivo reduzido).
+    '''
+    precos = np.asarray(precos, dtype=float)
+    deficits = np.asarray(deficits, dtype=float)
+    inteiro = np.asarray(inteiro, dtype=bool)
+    n = len(precos)
+
+    custo_min = np.where(inteiro, precos, 1.0)          # 1 cota de RV ou R$ 1 de RF
+    acessivel = ~inteiro | (precos <= orcamento + 1e-9)
+    com_deficit = deficits > 0
+
+    manter = acessivel & com_deficit
+    sem_deficit = np.flatnonzero(acessivel & ~com_deficit)
+    if k_min:
+        manter[sem_deficit[np.argsort(custo_min[sem_deficit], kind="stable")][:k_min]] = True
+    n_sem_deficit = int((~manter[sem_deficit]).sum())
+    constante = float(deficits[~acessivel & com_deficit].sum())
+
+    rf_agregada = np.flatnonzero(manter & ~inteiro) if not k_min else np.array([], dtype=int)
+    if len(rf_agregada) < 2:
+        rf_agregada = np.array([], dtype=int)
+    manter[rf_agregada] = False
+    mantidos = np.flatnonzero(manter)
+
+    p, d, intr = precos[mantidos], np.clip(deficits[mantidos], 0, None), inteiro[mantidos]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        teto_rv = np.minimum(np.floor(orcamento / p + 1e-9), np.maximum(np.ceil(d / p - 1e-9), 1))
+        teto_rf = np.minimum(orcamento, np.maximum(d, 1.0)) / p
+    teto = np.where(intr, teto_rv, teto_rf)
+
+    if len(rf_agregada):
+        soma = float(deficits[rf_agregada].sum())
+        p = np.append(p, 1.0)
+        d = np.append(d, soma)
+        intr = np.append(intr, False)
+        teto = np.append(teto, min(orcamento, soma))
+
+    red = {"precos": p, "deficits": d, "inteiro": intr, "teto": teto, "n_original": n,
+           "mantidos": mantidos, "rf_agregada": rf_agregada, "constante": constante,
+           "deficits_rf": deficits[rf_agregada], "precos_rf": precos[rf_agregada]}
+
+    vars_ant, rest_ant = contar_modelo(n, k_min)
+    vars_red, rest_red = contar_modelo(len(p), k_min)
+    logger.debug(f"Presolve: {n} -> {len(p)} assets "
+                 f"({n_sem_deficit} zero-deficit, {int((~acessivel).sum())} unaffordable, "
+                 f"{len(rf_agregada)} RF lines merged), variables {vars_ant} -> {vars_red}, "
+                 f"constraints {rest_ant} -> {rest_red}")
+    return red
+
+
+def identidade(precos, deficits, inteiro):
+    '''Problema sem redução, no formato de `reduzir` (para comparar com o presolve desligado).'''
+    n = len(precos)
+    return {"precos": np.asarray(precos, dtype=float), "deficits": np.asarray(deficits, dtype=float),
+            "inteiro": np.asarray(inteiro, dtype=bool), "teto": None, "n_original": n,
+            "mantidos": np.arange(n), "rf_agregada": np.array([], dtype=int), "constante": 0.0,
+            "deficits_rf": np.array([]), "precos_rf": np.array([])}
+
+
+def expandir(red, qtd_red):
+    '''Leva a solução do problema reduzido de volta às linhas originais.'''
+    qtd_red = np.asarray(qtd_red, dtype=float)
+    qtd = np.zeros(red["n_original"])
+    qtd[red["mantidos"]] = qtd_red[:len(red["mantidos"])]
+
+    if len(red["rf_agregada"]):
+        # valor da linha agregada volta às linhas de RF proporcional ao déficit
+        d = red["deficits_rf"]
+        valor = min(float(qtd_red[-1]), float(d.sum()))
+        qtd[red["rf_agregada"]] = d * (valor / d.sum()) / red["precos_rf"]
+    return qtd
@@ -0,0 +1,124 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Indexadores suportados: pós-fixados (% do índice), inflação (IPCA + spread) e prefixado
+INDEXADORES = ("SELIC", "CDI", "IPCA", "PRE")
+POS_FIXADOS = ("SELIC", "CDI")
+
+# Colunas opcionais da posição com os parâmetros de cada título
+COL_INDEXADOR = "Indexador"           # SELIC, CDI, IPCA ou PRE
+COL_PERCENTUAL = "% Indexador"        # % do índice p/ pós-fixados (ex.: 110 = 110% do CDI)
+COL_TAXA = "Taxa a.a."                # % a.a.: spread sobre o IPCA ou taxa do prefixado
+
+# Sem as colunas acima, cada fonte de RF (ver src.ativos.FONTES_RF) assume estes parâmetros
+INDEXADOR_FONTE = {"selic": "SELIC", "cdi": "CDI", "ipca": "IPCA", "pre": "PRE", "pgbl": "PRE"}
+FONTE_INDEXADOR = {"SELIC": "selic", "CDI": "cdi", "IPCA": "ipca", "PRE": "pre"}
+TAXA_PADRAO = {"pre": 9.0, "pgbl": 7.0}
+
+DIAS_UTEIS_ANO = 252
+
+
+def indexador_informado(df):
+    """Indexador da coluna `Indexador` (maiúsculo, None se vazio/ausente), por linha."""
+    if COL_INDEXADOR not in df:
+        return pd.Series(None, index=df.index, dtype=object)
+    ind = df[COL_INDEXADOR].map(lambda v: None if pd.isna(v) or not str(v).strip() else str(v).strip().upper())
+    invalidos = ind.notna() & ~ind.isin(INDEXADORES)
+    if invalidos.any():
+        raise ValueError(f"Indexador inválido: {sorted(ind[invalidos].unique())} (use um de {INDEXADORES})")
+    return ind
+
+
+def parametros(df, fonte_linha):
+    """
+    Parâmetros de remuneração das linhas de RF calculadas pelo motor.
+
+    `fonte_linha` é a fonte de dados de cada linha (ver src.ativos.FONTES);
+    entram as linhas de fonte selic/cdi/ipca/pre/pgbl. Retorna DataFrame
+    indexado pelo id da linha com `indexador`, `percentual` (fração do índice,
+    só pós-fixados), `taxa` (fração a.a.) e `serie`: chave da série de fatores
+    (o ticker, ou "ticker@ativo" se linhas do mesmo ticker têm parâmetros diferentes).
+    """
+    fonte_linha = np.asarray(fonte_linha, dtype=object)
+    ids = np.flatnonzero(np.isin(fonte_linha, list(INDEXADOR_FONTE)))
+    sel = df.iloc[ids]
+    fonte = fonte_linha[ids]
+
+    informado = indexador_informado(sel).to_numpy()
+    indexador = np.where(pd.isna(informado), [INDEXADOR_FONTE[f] for f in fonte], informado)
+
+    def numerica(col, padrao):
+        valores = pd.to_numeric(sel[col], errors="coerce").to_numpy(dtype=float) if col in sel else np.full(len(sel), np.nan)
+        return np.where(np.isnan(valores), padrao, valores) / 100
+
+    pos = np.isin(indexador, POS_FIXADOS)
+    percentual = np.where(pos, numerica(COL_PERCENTUAL, 100.0), 0.0)
+    taxa = np.where(pos, 0.0, numerica(COL_TAXA, np.array([TAXA_PADRAO.get(f, 0.0) for f in fonte])))
+
+    rf = pd.DataFrame({"ticker": sel["Ticker"].astype(str).to_numpy(), "ativo": sel["Ativo"].astype(str).to_numpy(),
+                       "indexador": indexador.astype(str), "percentual": percentual, "taxa": taxa}, index=ids)
+    distintos = rf.groupby("ticker")[["indexador", "percentual", "taxa"]].nunique().max(axis=1) > 1
+    rf["serie"] = np.where(rf["ticker"].map(distintos), rf["ticker"] + "@" + rf["ativo"], rf["ticker"])
+    return rf.drop(columns="ativo")
+
+
+def fatores(rf, indices, start, end):
+    """
+    Fatores acumulados (base 1) de todos os títulos de uma vez.
+
+    - rf: saída de `parametros` (uma série por `serie` distinta);
+    - indices: fator acumulado de cada índice usado (SELIC/CDI diários, IPCA mensal),
+      como pd.Series por nome do indexador;
+    - start, end: janela; a taxa prefixada/spread acumula por dia útil (base 252).
+
+    Calendário comum = dias úteis da janela ∪ datas dos índices. Para cada título:
+    fator = Π(1 + percentual·r_índice) · IPCA(t) · (1 + taxa)^(du/252).
+    Retorna dict {serie: pd.Series}; datas anteriores ao início do índice ficam de fora.
+    """
+    unicos = rf.drop_duplicates("serie").set_index("serie")
+    faltando = set(unicos["indexador"]) - set(indices) - {"PRE"}
+    if faltando:
+        logger.warning(f"No index data for {sorted(faltando)}, skipping those fixed income series")
+        unicos = unicos[~unicos["indexador"].isin(faltando)]
+    if unicos.empty:
+        return {}
+
+    uteis = pd.bdate_range(start, end)
+    datas = uteis
+    for serie in indices.values():
+        datas = datas.union(serie.index)
+    du = np.cumsum(datas.isin(uteis))                                  # dias úteis decorridos
+
+    # índices no calendário comum: taxa por passo (pós) e nível acumulado (IPCA)
+    nomes = sorted(indices)
+    niveis = pd.DataFrame({n: indices[n] for n in nomes}, columns=nomes).reindex(datas).ffill()
+    inicio = niveis.notna().to_numpy()                                  # índice já publicado
+    niveis = niveis.to_numpy(dtype=float)
+    anterior = np.vstack([np.ones((1, len(nomes))), niveis[:-1]])
+    passo = np.where(inicio, niveis / np.where(np.isnan(anterior), 1.0, anterior) - 1, 0.0)
+
+    col = {n: j for j, n in enumerate(nomes)}
+    indexador = unicos["indexador"].to_numpy()
+    j_idx = np.array([col.get(i, len(nomes)) for i in indexador], dtype=int)     # prefixado: sem índice
+    pos = np.isin(indexador, POS_FIXADOS)
+    ipca = indexador == "IPCA"
+
+    fator = np.ones((len(datas), len(unicos)))
+    if pos.any():
+        fator[:, pos] = np.cumprod(1 + passo[:, j_idx[pos]] * unicos["percentual"].to_numpy()[pos], axis=0)
+    if ipca.any():
+        fator[:, ipca] = niveis[:, j_idx[ipca]]
+    fator *= (1 + unicos["taxa"].to_numpy())[None, :] ** (du[:, None] / DIAS_UTEIS_ANO)
+
+    # antes da 1ª publicação do índice (ou do 1º dia útil, p/ prefixados) não há cotação
+    publicado = np.column_stack([inicio, du > 0])[:, j_idx]
+    fator = np.where(publicado, fator, np.nan)
+
+    logger.info(f"Fixed income engine: {len(unicos)} series over {len(datas)} dates "
+                f"({int(pos.sum())} floating, {int(ipca.sum())} inflation, {int((~pos & ~ipca).sum())} prefixed)")
+    return {s: pd.Series(fator[ok, j], index=datas[ok])
+            for j, (s, ok) in enumerate(zip(unicos.index, ~np.isnan(fator.T)))}
@@ -0,0 +1,111 @@
+import functools
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DIR_CODIGO = Path(__file__).parent
+
+
+@functools.lru_cache(maxsize=1)
+def versao_codigo():
+    """Hash do código-fonte de src/ (muda a cada edição, commitada ou não)."""
+    h = hashlib.sha1()
+    for arq in sorted(DIR_CODIGO.glob("*.py")):
+        h.update(arq.name.encode())
+        h.update(arq.read_bytes())
+    return h.hexdigest()[:16]
+
+
+def hash_posicao(df):
+    """Hash do conteúdo da posição (valores e índice, independente de dtypes)."""
+    return hashlib.sha1(pd.util.hash_pandas_object(df.astype(str), index=True).to_numpy().tobytes()).hexdigest()
+
+
+def hash_mercado(dados):
+    """Hash das séries de mercado ({chave: pd.Series}), em ordem de chave."""
+    h = hashlib.sha1()
+    for tk in sorted(dados):
+        h.update(str(tk).encode())
+        h.update(pd.util.hash_pandas_object(dados[tk], index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+class ArmazemResultados:
+    """
+    Resultados de backtest endereçados por conteúdo, em disco.
+
+    A chave é o hash de posição + parâmetros + identificador das séries de
+    mercado + versão do código, calculável antes de qualquer coleta; cada entrada é um checkpoint do simulador (`<chave>.pkl.gz`, ver
+    PortfolioSimulator.salvar_checkpoint), então um acerto restaura o estado
+    completo. Passando de `max_bytes`, as entradas menos usadas saem primeiro.
+    """
+
+    def __init__(self, diretorio, max_bytes=1024 * 2**20):
+        self.diretorio = Path(diretorio)
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def chave(self, df_posicao, params, id_mercado):
+        """`id_mercado`: hash_mercado das séries (snapshot já carregado)."""
+        h = hashlib.sha1()
+        h.update(hash_posicao(df_posicao).encode())
+        h.update(json.dumps(params, sort_keys=True, default=str).encode())
+        h.update(str(id_mercado).encode())
+        h.update(versao_codigo().encode())
+        return h.hexdigest()
+
+    def _arquivo(self, chave):
+        return self.diretorio / f"{chave}.pkl.gz"
+
+    def obter(self, chave):
+        """Caminho da entrada armazenada (marcada como usada) ou None."""
+        arq = self._arquivo(chave)
+        if not arq.exists():
+            self.misses += 1
+            return None
+        os.utime(arq)                                   # marca uso recente (LRU)
+        self.hits += 1
+        logger.debug(f"Result store hit: {chave[:12]}")
+        return arq
+
+    def guardar(self, chave, gravar):
+        """Grava a entrada chamando `gravar(caminho)` num arquivo temporário."""
+        arq = self._arquivo(chave)
+        tmp = arq.with_name(f".{chave}.{os.getpid()}.pkl.gz")
+        gravar(tmp)
+        os.replace(tmp, arq)
+        self._despejar()
+
+    def descartar(self, chave):
+        self._arquivo(chave).unlink(missing_ok=True)
+
+    def limpar(self):
+        for arq in self.diretorio.glob("*.pkl.gz"):
+            arq.unlink(missing_ok=True)
+
+    def estatisticas(self):
+        arquivos = list(self.diretorio.glob("*.pkl.gz"))
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "taxa_acerto": self.hits / total if total else 0.0,
+                "entradas": len(arquivos), "bytes": sum(a.stat().st_size for a in arquivos)}
+
+    def _despejar(self):
+        arquivos = sorted(self.diretorio.glob("[!.]*.pkl.gz"), key=lambda a: a.stat().st_mtime)
+        total = sum(a.stat().st_size for a in arquivos)
+        removidos = 0
+        while len(arquivos) > 1 and total > self.max_bytes:    # a entrada recém-gravada fica
+            arq = arquivos.pop(0)
+            total -= arq.stat().st_size
+            arq.unlink(missing_ok=True)
+            removidos += 1
+        if removidos:
+            logger.debug(f"Result store evicted {removidos} entries")
@@ -4,14 +4,66 @@ import numpy as np
 import pandas as pd
 import yfinance as yf
 import requests
-import pulp as pl
 import logging
+from collections.abc import Mapping
+from contextlib import nullcontext
+from pathlib import Path
 from src.utils import _download_with_retry
+from src import renda_fixa, solver
+from src.corpus import CorpusProblemas
+from src.corrida import CorridaSolvers
+from src.memoria import LivroAportes, MonitorMemoria, compactar
+from src.resultados import ArmazemResultados, hash_mercado
+from src.ativos import CadastroAtivos, MOEDAS_GEO
+from src.logger import emit_event, events_enabled, set_event_context
 
 logger = logging.getLogger(__name__)
 
+# Frequências aceitas pelo motor de backtest → alias de calendário do pandas
+FREQUENCIAS = {"D": "B", "W": "W-FRI", "M": "ME"}
+
+# Formato do checkpoint e cauda das séries de preço guardada nele
+VERSAO_CHECKPOINT = 2
+JANELA_CHECKPOINT_DIAS = 45
+
+# Colunas do histórico de aportes rebaixadas p/ float32 no modo de memória reduzida
+# (percentuais e gap do solver; preços, quantidades e valores em R$ seguem em float64,
+# pois alimentam as decisões de compra)
+APORTES_FLOAT32 = ("Pct_Atual", "Pct_Ideal", "Variacao", "Gap_Solver")
+
+# Colunas descritivas do histórico de aportes → coluna da posição
+APORTES_META = {"Geo": "Geo.", "Classe": "Classe", "Subclasses": "Subclasses", "Setor": "Setor",
+                "Ativo": "Ativo", "Ticker": "Ticker"}
+
+
+class PassoSimulacao(Mapping):
+    """
+    Um período de `iterar_simulacao`: dict somente leitura cujos valores caros
+    (carteiras, compras e aportes em DataFrame) só são montados no primeiro acesso.
+    """
+
+    def __init__(self, valores, **tardios):
+        self._valores = dict(valores)
+        self._tardios = tardios
+
+    def __getitem__(self, chave):
+        if chave in self._tardios:
+            self._valores[chave] = self._tardios.pop(chave)()
+        return self._valores[chave]
+
+    def __iter__(self):
+        return iter([*self._valores, *self._tardios])
+
+    def __len__(self):
+        return len(self._valores) + len(self._tardios)
+
+
 class PortfolioSimulator:
-    def __init__(self, df_portfolio, valor_aporte_mensal=2500, k_min_po=None):
+    def __init__(self, df_portfolio, valor_aporte_mensal=2500, k_min_po=None, freq="M",
+                 tempo_limite_po=None, gap_rel_po=None, cache_solve=solver.CACHE_PADRAO,
+                 reutilizar_po=False, decompor_po=None, corpus_po=None, aproximado_po=False, dados_mercado=None,
+                 memoria_reduzida=False, limite_memoria=None, monitorar_memoria=False, dir_spill=None,
+                 armazem_resultados=None, corrida_po=None):
         logger.info("Initializing PortfolioSimulator")
         logger.debug(f"Portfolio shape: {df_portfolio.shape}")
         logger.debug(f"Portfolio columns: {df_portfolio.columns.tolist()}")
@@ -21,47 +73,100 @@ class PortfolioSimulator:
             logger.debug("Converting percentage values from 0-100 to 0-1 format")
             self.df_original["% Ideal - Ref."] /= 100.0
         
+        if freq not in FREQUENCIAS:
+            raise ValueError(f"Frequência inválida: {freq!r} (use uma de {sorted(FREQUENCIAS)})")
+
+        # aporte aplicado a cada período de `freq`, sem rateio: em "W"/"D" o valor é
+        # aportado toda semana/dia útil (para manter o total mensal, divida pelo nº de períodos)
         self.aporte_mensal = valor_aporte_mensal
         self.k_min_po = k_min_po
+        self.freq = freq
+        # orçamento por solve do MILP (segundos / gap relativo); None = sem limite
+        self.tempo_limite_po = tempo_limite_po
+        self.gap_rel_po = gap_rel_po
+        # cache de solves (src.cache.CacheSolve); None desliga
+        self.cache_solve = cache_solve
+        # reaproveita a última solução PO enquanto os dados ficam nas faixas de validade:
+        # True = só quando o limite da relaxação LP prova que ela segue ótima;
+        # "heuristico" = sempre que passa nas faixas (gap frente ao limite LP registrado)
+        if reutilizar_po not in (False, True, "heuristico"):
+            raise ValueError(f"reutilizar_po inválido: {reutilizar_po!r} (use False, True ou 'heuristico')")
+        self.reutilizar_po = reutilizar_po
+        self._ultimo_po = None
+        self.reusos_po = 0
+        # coluna p/ decomposição hierárquica do PO (ex.: "Classe", "Subclasses"); None = modelo plano
+        self.decompor_po = decompor_po
+        # captura opcional das instâncias do PO em disco (diretório ou src.corpus.CorpusProblemas)
+        if corpus_po is not None and not isinstance(corpus_po, CorpusProblemas):
+            corpus_po = CorpusProblemas(corpus_po)
+        self.corpus_po = corpus_po
+        # PO sem MILP: relaxação LP + arredondamento (ver solver.resolver)
+        self.aproximado_po = aproximado_po
+        # corrida de solvers em processos (True ou src.corrida.CorridaSolvers); None = solve único
+        if corrida_po is True:
+            corrida_po = CorridaSolvers()
+        self.corrida_po = corrida_po or None
+        # séries de mercado já coletadas (ex.: snapshot de src.fila); None = baixa da rede
+        self.dados_mercado = dados_mercado
+        # memória: metadados categóricos e histórico de aportes em blocos compactos
+        # (percentuais em float32); limite_memoria (bytes) despeja o histórico em `dir_spill`
+        self.memoria_reduzida = memoria_reduzida
+        self.limite_memoria = limite_memoria
+        self.dir_spill = dir_spill
+        self.memoria = MonitorMemoria(limite_memoria) if (monitorar_memoria or limite_memoria) else None
+        if memoria_reduzida:
+            self.df_original = compactar(self.df_original)
+        # resultados de `simular` endereçados por conteúdo (diretório ou src.resultados.ArmazemResultados)
+        if armazem_resultados is not None and not isinstance(armazem_resultados, ArmazemResultados):
+            armazem_resultados = ArmazemResultados(armazem_resultados)
+        self.armazem_resultados = armazem_resultados
+        # cadastro indexado (ids, categorias, máscaras de lote/caixa e fonte de dados)
+        self.ativos = CadastroAtivos(self.df_original)
         # ← lista de classes p/ cálculo de drift
-        self.classes = sorted(self.df_original["Classe"].unique())
+        self.classes = list(self.ativos.classe.categories)
+        self.cambio = pd.DataFrame()        # painel de câmbio da última coleta
         logger.debug(f"Available asset classes: {self.classes}")
+
+        # matriz ativo × classe usada no drift vetorizado
+        self._mat_classes = self.ativos.matriz("Classe")
+        # colunas do histórico de aportes fixas por linha, extraídas uma vez (ver _registrar_aportes)
+        self._alvo = self.df_original["% Ideal - Ref."].to_numpy(dtype=float)
+        self._meta_aportes = {
+            nome: (self.df_original[col].to_numpy(dtype=object) if col in self.df_original
+                   else np.full(self.ativos.n, "", dtype=object))
+            for nome, col in APORTES_META.items()
+        }
         
         # Nova estrutura para armazenar aportes detalhados
-        self.aportes_detalhados = []
+        self.aportes_detalhados = self._novo_livro()
+        self._estado = None                 # estado da simulação corrente (checkpoint)
 
         logger.info(f"PortfolioSimulator initialized with capital: R$ {valor_aporte_mensal:,.2f}")
         logger.debug(f"Minimum portfolio optimization assets: {k_min_po}")
+        logger.debug(f"Simulation frequency: {freq}")
 
     # ------------- mapeamento de tickers -----------------
     def mapear_tickers(self):
         """Apenas ativos negociados via Yahoo; RF especial fica com próprio nome."""
         logger.info('Mapping portfolio tickers...')
-        mapa = {}
-        fixed_income_count = 0
-        br_stocks_count = 0
-        us_stocks_count = 0
-        
-        for _, row in self.df_original.iterrows():
-            tk, geo = row["Ticker"], row["Geo."]
-            if tk in {"SELIC", "FDI", "FRFH", "LC", "CDB",
-                    "IPCA", "CDBI", "PRE", "PGBL"}:
-                mapa[tk] = None          # marcador especial
-                fixed_income_count += 1
-            elif geo == "BR":
-                mapa[tk] = f"{tk}.SA"
-                br_stocks_count += 1
-            elif geo == "US":
-                mapa[tk] = tk
-                us_stocks_count += 1
-        
-        logger.info(f"Ticker mapping completed: {fixed_income_count} fixed income, {br_stocks_count} BR stocks, {us_stocks_count} US stocks")
+        cad = self.ativos
+        com_fonte = ~cad.mascara_fonte("nenhuma")
+        yahoo = cad.mascara_fonte("yahoo")
+        # símbolo do Yahoo; None marca RF com série própria
+        simbolo = cad.simbolo.astype(object).where(cad.simbolo.notna(), None)
+        mapa = simbolo[com_fonte].to_dict()
+
+        fixed_income_count = int((com_fonte & ~yahoo).sum())
+        foreign_stocks_count = int((yahoo & cad.moeda.notna().to_numpy()).sum())
+        br_stocks_count = int(yahoo.sum()) - foreign_stocks_count
+
+        logger.info(f"Ticker mapping completed: {fixed_income_count} fixed income, {br_stocks_count} BR stocks, {foreign_stocks_count} foreign stocks")
         logger.debug(f"Ticker mapping: {mapa}")
         return mapa
     
     @staticmethod
-    def _selic_fator_mensal(start, end):
-        """SGS 4390 Selic diária → fator acumulado em datas 'M' (últ. dia útil do mês)."""
+    def _selic_fator_diario(start, end):
+        """SGS 4390 Selic diária → fator acumulado por dia útil (base 1)."""
         logger.info(f'Getting SELIC Index from {start.strftime("%Y-%m-%d")} to {end.strftime("%Y-%m-%d")}')
         try:
             url = ("https://api.bcb.gov.br/dados/serie/bcdata.sgs.4390/dados"
@@ -73,13 +178,31 @@ class PortfolioSimulator:
             df["data"]  = pd.to_datetime(df["data"], format="%d/%m/%Y")
             df["valor"] = df["valor"].astype(float) / 100        # diário (fração)
             df["fator"] = (1 + df["valor"]).cumprod()
-            fator_m = df.set_index("data").resample("M").last()["fator"]
-            logger.info(f"SELIC data processed successfully: {len(fator_m)} monthly factors")
-            return fator_m
+            fator_d = df.set_index("data")["fator"]
+            logger.info(f"SELIC data processed successfully: {len(fator_d)} daily factors")
+            return fator_d
         except Exception as e:
             logger.error(f"Error fetching SELIC data: {str(e)}")
             raise
 
+    @staticmethod
+    def _cdi_fator_diario(start, end):
+        """SGS 12 CDI diário → fator acumulado por dia útil (base 1)."""
+        logger.info(f'Getting CDI Index from {start.strftime("%Y-%m-%d")} to {end.strftime("%Y-%m-%d")}')
+        try:
+            url = ("https://api.bcb.gov.br/dados/serie/bcdata.sgs.12/dados"
+                f"?formato=json&dataInicial={start:%d/%m/%Y}&dataFinal={end:%d/%m/%Y}")
+            logger.debug(f"CDI API URL: {url}")
+            js  = requests.get(url, timeout=10).json()
+            df  = pd.DataFrame(js)
+            df["data"]  = pd.to_datetime(df["data"], format="%d/%m/%Y")
+            df["fator"] = (1 + df["valor"].astype(float) / 100).cumprod()
+            logger.info(f"CDI data processed successfully: {len(df)} daily factors")
+            return df.set_index("data")["fator"]
+        except Exception as e:
+            logger.error(f"Error fetching CDI data: {str(e)}")
+            raise
+
     @staticmethod
     def _ipca_fator_mensal(start, end):
         logger.info(f'Getting IPCA Index from {start.strftime("%Y-%m-%d")} to {end.strftime("%Y-%m-%d")}')
@@ -101,41 +224,63 @@ class PortfolioSimulator:
             raise
 
     @staticmethod
-    def _fator_mensal_fixo(start, end, taxa_anual):
-        """Retorna série mensal de fator acumulado (base 1.0) para uma taxa 'anual' constante."""
-        logger.debug(f"Calculating fixed monthly factor for annual rate {taxa_anual:.2%}")
-        idx = pd.date_range(start, end, freq="M")
-        taxa_mensal = (1 + taxa_anual) ** (1/12) - 1          # ⇐ conversão
-        result = pd.Series((1 + taxa_mensal) ** np.arange(1, len(idx)+1), index=idx)
-        logger.debug(f"Fixed factor series created with {len(result)} months")
-        return result
+    def _painel_cambio(moedas, start, end):
+        """Painel diário de câmbio (datas × moedas), cotação em BRL; baixado uma vez por execução."""
+        series = {}
+        for moeda in sorted(set(moedas)):
+            logger.info(f"Fetching {moeda}/BRL exchange rate")
+            try:
+                fx = _download_with_retry(f"{moeda}BRL=X", start, end)["Adj Close"]
+                if isinstance(fx, pd.DataFrame):
+                    fx = fx.iloc[:, 0]
+                if fx.empty:
+                    raise RuntimeError(f"Falha {moeda}/BRL")
+                logger.info(f"{moeda}/BRL data collected: {len(fx)} records")
+            except Exception as e:
+                logger.error(f"Error fetching {moeda}/BRL: {str(e)}")
+                raise
+            series[moeda] = fx
+        if not series:
+            return pd.DataFrame()
+        return pd.concat(series, axis=1).sort_index().ffill()
 
-    # ------------- históricos ----------------------------
-    def obter_dados_historicos(self, meses, data_fim_str=None):
-        logger.info(f'Getting Historical Ticker Prices for {meses} months')
-        
+    @staticmethod
+    def converter_moedas(precos, moedas, cambio):
+        """
+        Converte para BRL todas as colunas de `precos` (datas × tickers) de uma vez.
+        `moedas` traz a moeda de cada coluna; o câmbio é alinhado por data (último valor conhecido).
+        """
+        fx = cambio.reindex(precos.index, method="ffill")[list(moedas)]
+        return precos * fx.to_numpy()
+
+    @staticmethod
+    def _periodo(meses, data_fim_str=None):
+        """Datas (início, fim) da janela de simulação."""
         if data_fim_str:
             end_date = datetime.strptime(data_fim_str, '%Y-%m-%d')
             logger.info(f"Using custom end date: {end_date.strftime('%Y-%m-%d')}")
         else:
             end_date = datetime.now()
             logger.info(f"Using current date as end: {end_date.strftime('%Y-%m-%d')}")
-       
-        start_date = end_date - timedelta(days=meses*30)
+        return end_date - timedelta(days=meses*30), end_date
+
+    # ------------- históricos ----------------------------
+    def obter_dados_historicos(self, meses, data_fim_str=None):
+        """Coleta as séries diárias (preços, Selic e fatores de RF) da janela de simulação."""
+        logger.info(f'Getting Historical Ticker Prices for {meses} months')
+
+        start_date, end_date = self._periodo(meses, data_fim_str)
         logger.info(f"Data collection period: {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
+        if self.dados_mercado is not None:
+            logger.info(f"Using preloaded market data: {len(self.dados_mercado)} series")
+            return dict(self.dados_mercado)
 
         dados, mapa = {}, self.mapear_tickers()
 
-        # Get USD/BRL exchange rate
-        logger.info("Fetching USD/BRL exchange rate")
-        try:
-            usd = _download_with_retry("USDBRL=X", start_date, end_date)["Adj Close"]
-            if usd.empty:
-                raise RuntimeError("Falha USD/BRL")
-            logger.info(f"USD/BRL data collected: {len(usd)} records")
-        except Exception as e:
-            logger.error(f"Error fetching USD/BRL: {str(e)}")
-            raise
+        # moeda de cada ativo estrangeiro, pela coluna Geo.
+        moeda_tk = self.ativos.moeda.dropna()
+        self.cambio = self._painel_cambio(moeda_tk.unique(), start_date, end_date)
+        estrangeiros = {}
 
         print("Coletando séries…")
         logger.info(f"Starting data collection for {len(mapa)} tickers")
@@ -143,35 +288,8 @@ class PortfolioSimulator:
         for i, (tk, sym) in enumerate(mapa.items(), 1):
             logger.debug(f"Processing ticker {i}/{len(mapa)}: {tk} ({sym})")
             
-            # ─── Renda-fixa e índices ────────────────────────────────
-            if tk in {"SELIC", "FDI", "FRFH", "LC", "CDB"}:
-                logger.debug(f"Processing {tk} as SELIC-based fixed income")
-                try:
-                    dados[tk] = self._selic_fator_mensal(start_date, end_date)
-                    logger.debug(f"Successfully processed {tk}: {len(dados[tk])} records")
-                except Exception as e:
-                    logger.error(f"Error processing {tk}: {str(e)}")
-                continue
-                
-            if tk in {"IPCA", "CDBI"}:
-                logger.debug(f"Processing {tk} as IPCA-based fixed income")
-                try:
-                    dados[tk] = self._ipca_fator_mensal(start_date, end_date)
-                    logger.debug(f"Successfully processed {tk}: {len(dados[tk])} records")
-                except Exception as e:
-                    logger.error(f"Error processing {tk}: {str(e)}")
-                continue
-                
-            if tk == "PRE":
-                logger.debug(f"Processing {tk} as fixed rate (9% p.a.)")
-                dados[tk] = self._fator_mensal_fixo(start_date, end_date, 0.09)   # 9 % a.a.
-                logger.debug(f"Successfully processed {tk}: {len(dados[tk])} records")
-                continue
-                
-            if tk == "PGBL":
-                logger.debug(f"Processing {tk} as fixed rate (7% p.a.)")
-                dados[tk] = self._fator_mensal_fixo(start_date, end_date, 0.07)   # 7 % a.a.
-                logger.debug(f"Successfully processed {tk}: {len(dados[tk])} records")
+            # ─── Renda-fixa: calculada em lote pelo motor abaixo ─────
+            if sym is None:
                 continue
 
             # ─── Ações / ETFs ───────────────────────────────────────
@@ -183,369 +301,589 @@ class PortfolioSimulator:
                     print(f"Sem dados {tk}")
                     continue
                 
-                serie_m = dfp["Adj Close"].resample("M").last()
-                logger.debug(f"Retrieved {len(serie_m)} monthly prices for {tk}")
+                serie_d = dfp["Adj Close"]
+                if isinstance(serie_d, pd.DataFrame):
+                    serie_d = serie_d.iloc[:, 0]
+                logger.debug(f"Retrieved {len(serie_d)} daily prices for {tk}")
                 
-                # Convert US stocks to BRL
-                if self.df_original.loc[self.df_original["Ticker"] == tk, "Geo."].iat[0] == "US":
-                    logger.debug(f"Converting {tk} from USD to BRL")
-                    usd_m = usd.resample("M").last()
-                    serie_m.values[:] = serie_m.to_numpy()*usd_m.to_numpy()
-                    logger.debug(f"Currency conversion completed for {tk}")
-
-                dados[tk] = serie_m
-                logger.debug(f"Successfully processed {tk}: {len(dados[tk])} records")
+                # ativos estrangeiros são convertidos juntos, após a coleta
+                if tk in moeda_tk.index:
+                    estrangeiros[tk] = serie_d
+                else:
+                    dados[tk] = serie_d
+                logger.debug(f"Successfully processed {tk}: {len(serie_d)} records")
                 
             except Exception as e:
                 logger.error(f"Error processing {tk}: {str(e)}")
                 continue
 
+        dados.update(self._fatores_renda_fixa(start_date, end_date))
+
+        if estrangeiros:
+            logger.info(f"Converting {len(estrangeiros)} foreign assets to BRL")
+            precos_ext = pd.concat(estrangeiros, axis=1).sort_index()
+            precos_brl = self.converter_moedas(precos_ext, moeda_tk[precos_ext.columns], self.cambio)
+            dados.update({tk: precos_brl[tk].dropna() for tk in precos_brl.columns})
+
         logger.info(f"Historical data collection completed: {len(dados)} tickers processed")
         return dados
 
+    def _fatores_renda_fixa(self, start, end):
+        """Baixa cada índice usado pela RF uma única vez e calcula os fatores de
+        todos os títulos num passo vetorizado (ver src.renda_fixa)."""
+        rf = self.ativos.rf
+        if rf.empty:
+            return {}
+        coletores = {"SELIC": self._selic_fator_diario, "CDI": self._cdi_fator_diario,
+                     "IPCA": self._ipca_fator_mensal}
+        indices = {}
+        for nome in sorted(set(rf["indexador"]) & set(coletores)):
+            try:
+                indices[nome] = coletores[nome](start, end)
+            except Exception as e:
+                logger.error(f"Error processing {nome} index: {str(e)}")
+        return renda_fixa.fatores(rf, indices, start, end)
+
+    # ------------- painel de preços ---------------------
+    def montar_painel(self, dados, datas):
+        """Alinha as séries coletadas no calendário da simulação.
+
+        Retorna matriz (períodos × linhas da carteira) com o último valor
+        conhecido até cada data; NaN onde o ativo ainda não tem cotação.
+        """
+        logger.info(f"Building price panel: {len(datas)} periods x {len(self.df_original)} assets")
+        if dados:
+            painel = pd.concat(dados, axis=1).sort_index().ffill()
+            painel = painel.reindex(datas, method="ffill")
+        else:
+            painel = pd.DataFrame(index=datas)
+        painel = painel.reindex(columns=self.ativos.serie)
+        painel = painel.to_numpy(dtype=float)
+        logger.debug(f"Price panel coverage: {np.isfinite(painel).mean():.1%} ({painel.nbytes / 2**20:,.1f} MB)")
+        return painel
+
     # ------------- estratégia 1 -------------------------
-    def _aporte_deficit(self, df, valor_cart, aporte, mes, data):
-        logger.info(f'Strategy 1: Asset by Rebalancing Portfolio - Month {mes}')
-        logger.debug(f"Portfolio value: R$ {valor_cart:,.2f}, Monthly contribution: R$ {aporte:,.2f}")
-        
-        df = df.copy()
-        df["Valor Ideal"] = df["% Ideal - Ref."] * (valor_cart + aporte)
-        df["deficit"] = (df["Valor Ideal"] - df["Total"]).clip(lower=0)
-        
-        total_deficit = df["deficit"].sum()
+    def _deficits(self, tot, aporte):
+        """Quanto falta (R$) a cada ativo p/ o peso alvo na carteira após o aporte."""
+        return np.clip(self._alvo * (tot.sum() + aporte) - tot, 0, None)
+
+    def _aporte_deficit(self, qtd, cot, aporte, mes, data):
+        """Rateia o aporte pelos déficits; devolve (quantidades compradas, sobra)."""
+        logger.info(f'Strategy 1: Asset by Rebalancing Portfolio - Period {mes}')
+        tot = qtd * cot
+        logger.debug(f"Portfolio value: R$ {tot.sum():,.2f}, Contribution: R$ {aporte:,.2f}")
+
+        deficits = self._deficits(tot, aporte)
+        total_deficit = deficits.sum()
         logger.debug(f"Total deficit: R$ {total_deficit:,.2f}")
-        
+
         if total_deficit == 0:
             logger.info("No deficit found, no allocation needed")
-            return df, aporte
-            
-        df["aporte_sugerido"] = df["deficit"] / total_deficit * aporte
-        df["Qtd_comprar"], df["Custo_real"] = 0.0, 0.0
-        
-        total_cost = 0
-        assets_bought = 0
-        
-        for i, r in df.iterrows():
-            if r["aporte_sugerido"] > 0:
-                qtd = (r["aporte_sugerido"] / r["Cotação"]) if (r["Classe"] == "RF" and r["Ticker"] != "IMAB11") \
-                      else np.floor(r["aporte_sugerido"] / r["Cotação"])
-                df.at[i, "Qtd_comprar"] = qtd
-                df.at[i, "Custo_real"]  = qtd * r["Cotação"]
-                total_cost += qtd * r["Cotação"]
-                
-                if qtd > 0:
-                    assets_bought += 1
-                    logger.debug(f"Buying {qtd} shares of {r['Ticker']} at R$ {r['Cotação']:.2f} = R$ {qtd * r['Cotação']:.2f}")
-                    # Salvar detalhes do aporte se houve compra
-                    self._salvar_aporte_detalhado(r, qtd, qtd * r["Cotação"], "Deficit", mes, data, df)
+            return np.zeros_like(qtd), aporte
+
+        sug = deficits / total_deficit * aporte
+
+        # RF compra fracionado; RV (e IMAB11) apenas cotas inteiras
+        rf = ~self.ativos.inteiro
+        with np.errstate(divide="ignore", invalid="ignore"):
+            compra = np.where(rf, sug / cot, np.floor(sug / cot))
+        compra = np.where((sug > 0) & np.isfinite(compra), compra, 0.0)
+        custo = compra * cot
+        total_cost = custo.sum()
+        assets_bought = int((compra > 0).sum())
+
+        # Salvar detalhes do aporte dos ativos comprados
+        self._registrar_aportes(np.flatnonzero(compra > 0), qtd, cot, tot, compra, custo, "Deficit", mes, data)
 
         leftover = aporte - total_cost
         logger.info(f"Deficit strategy completed: {assets_bought} assets bought, R$ {total_cost:,.2f} invested, R$ {leftover:,.2f} leftover")
-        return df, leftover
+        return compra, leftover
 
     # ------------- estratégia 2 -------------------------
-    def _aporte_po(self, df, valor_cart, aporte, mes, data):
-        logger.info(f'Strategy 2: Asset by Linear Programming Portfolio optimization - Month {mes}')
-        logger.debug(f"Portfolio value: R$ {valor_cart:,.2f}, Monthly contribution: R$ {aporte:,.2f}")
-        
-        df = df.copy()
-        if df.empty:
-            logger.warning("Empty portfolio dataframe, falling back to deficit strategy")
-            return self._aporte_deficit(df, valor_cart, aporte, mes, data)
-
-        df["Valor Ideal"] = df["% Ideal - Ref."] * (valor_cart + aporte)
-        df["deficit"] = (df["Valor Ideal"] - df["Total"]).clip(lower=0)
-        
-        total_deficit = df["deficit"].sum()
-        logger.debug(f"Total deficit: R$ {total_deficit:,.2f}")
-        
-        logger.debug("Setting up linear programming problem")
-        prob, qt_rf, qt_rv, gap = pl.LpProblem("PO", pl.LpMinimize), {}, {}, {}
-        sel = {}                                    # só usado se houver limite
-
-        variables_created = 0
-        for idx, r in df.iterrows():
-            nome = str(r["Ativo"]).replace(" ", "_").replace(".", "_")
-
-            # ----- variável de seleção (se houver limite K) -------------
-            if self.k_min_po:                       # None/0 = não cria
-                sel[idx] = pl.LpVariable(f"SEL_{nome}", cat="Binary")
-                variables_created += 1
-
-            # ----- quantidade a comprar ---------------------------------
-            if r["Classe"] == "RF" and r["Ticker"] != "IMAB11":
-                qt_rf[idx] = pl.LpVariable(f"RF_{nome}", lowBound=0)
-                variables_created += 1
+    def _aporte_po(self, qtd, cot, aporte, mes, data):
+        """Aporte pelo MILP de mínimo déficit; devolve (quantidades compradas, sobra)."""
+        logger.info(f'Strategy 2: Asset by Linear Programming Portfolio optimization - Period {mes}')
+        tot = qtd * cot
+        logger.debug(f"Portfolio value: R$ {tot.sum():,.2f}, Contribution: R$ {aporte:,.2f}")
+
+        if not len(qtd):
+            logger.warning("Empty portfolio, falling back to deficit strategy")
+            return self._aporte_deficit(qtd, cot, aporte, mes, data)
+
+        deficits = self._deficits(tot, aporte)
+        logger.debug(f"Total deficit: R$ {deficits.sum():,.2f}")
+
+        # MILP com orçamento de tempo/gap e cascata de fallback (ver src.solver)
+        inteiro = self.ativos.inteiro
+        precos = cot
+
+        res = None
+        if (self.reutilizar_po and self._ultimo_po is not None
+                and solver.dentro_das_faixas(self._ultimo_po["faixas"], precos, deficits, aporte)):
+            reuso = solver.avaliar_reuso(self._ultimo_po["faixas"], precos, deficits, aporte, self.k_min_po)
+            if reuso["certificado"] or self.reutilizar_po == "heuristico":
+                logger.info(f"Inputs within validity ranges of previous solve, reusing allocation "
+                            f"({'proven optimal' if reuso['certificado'] else 'heuristic'}, gap {reuso['gap']:.2%})")
+                res = reuso
+                self.reusos_po += 1
             else:
-                qt_rv[idx] = pl.LpVariable(f"RV_{nome}", lowBound=0, cat="Integer")
-                variables_created += 1
-
-            gap[idx] = pl.LpVariable(f"GAP_{nome}", lowBound=0)
-            variables_created += 1
-
-        logger.debug(f"Created {variables_created} variables for optimization")
-
-        # -------- objetivo: minimizar gaps ------------------------------
-        prob += pl.lpSum(gap.values())
-        logger.debug("Objective function set: minimize gaps")
-        
-        # -------- restrição de orçamento --------------------------------
-        prob += (
-            pl.lpSum(df.loc[i, "Cotação"] * qt_rf[i] for i in qt_rf)
-          + pl.lpSum(df.loc[i, "Cotação"] * qt_rv[i] for i in qt_rv)
-        ) <= aporte
-        logger.debug("Budget constraint added")
-
-        # -------- cardinalidade (se houver K) ---------------------------
-        if self.k_min_po:
-            logger.debug(f"Adding cardinality constraint: minimum {self.k_min_po} assets")
-            prob += pl.lpSum(sel.values()) >= self.k_min_po
-            
-            constraints_added = 0
-            for idx in df.index:
-                preco = df.at[idx, "Cotação"]
-                max_qtd = aporte / preco
-                min_qtd = 1 if idx in qt_rv else (1/preco)
-                if idx in qt_rf:
-                    prob += qt_rf[idx] >= min_qtd * sel[idx]
-                    prob += qt_rf[idx] <= max_qtd * sel[idx]
-                else:
-                    prob += qt_rv[idx] >= min_qtd * sel[idx]
-                    prob += qt_rv[idx] <= max_qtd * sel[idx]
-                constraints_added += 2
-            logger.debug(f"Added {constraints_added} cardinality constraints")
-
-        # Gap constraints
-        gap_constraints = 0
-        for idx in df.index:
-            preco = df.at[idx, "Cotação"]
-            compra = preco * (qt_rf[idx] if idx in qt_rf else qt_rv[idx])
-            prob += gap[idx] >= df.at[idx,"deficit"] - compra
-            gap_constraints += 1
-        logger.debug(f"Added {gap_constraints} gap constraints")
-
-        # Solve optimization problem
-        logger.debug("Solving optimization problem")
-        try:
-            prob.solve(pl.PULP_CBC_CMD(msg=0))
-            logger.debug(f"Optimization status: {pl.LpStatus[prob.status]}")
-        except pl.PulpError as e:
-            logger.error(f"PulpError during optimization: {str(e)}")
-            logger.debug("Attempting to solve with default solver")
-            prob.solve()
-
-        if prob.status != pl.LpStatusOptimal:
-            logger.warning(f'LP optimization did not converge (status: {pl.LpStatus[prob.status]}), falling back to deficit strategy')
-            return self._aporte_deficit(df, valor_cart, aporte, mes, data)
-
-        logger.info("Optimization solved successfully")
-        df["Qtd_comprar"], df["Custo_real"] = 0.0, 0.0
-        
-        total_cost = 0
-        assets_bought = 0
-        
-        for idx, var in qt_rf.items():
-            qtd = var.varValue or 0
-            if qtd > 0:
-                df.at[idx,"Qtd_comprar"] = qtd
-                df.at[idx,"Custo_real"]  = qtd * df.at[idx,"Cotação"]
-                total_cost += qtd * df.at[idx,"Cotação"]
-                assets_bought += 1
-                logger.debug(f"Buying {qtd:.4f} units of {df.at[idx,'Ticker']} (RF) at R$ {df.at[idx,'Cotação']:.2f} = R$ {qtd * df.at[idx,'Cotação']:.2f}")
-                
-                # Salvar detalhes do aporte se houve compra
-                self._salvar_aporte_detalhado(df.loc[idx], qtd, qtd * df.at[idx,"Cotação"], "PO", mes, data, df)
-                
-        for idx, var in qt_rv.items():
-            qtd = int(var.varValue or 0)
-            if qtd > 0:
-                df.at[idx,"Qtd_comprar"] = qtd
-                df.at[idx,"Custo_real"]  = qtd * df.at[idx,"Cotação"]
-                total_cost += qtd * df.at[idx,"Cotação"]
-                assets_bought += 1
-                logger.debug(f"Buying {qtd} shares of {df.at[idx,'Ticker']} (RV) at R$ {df.at[idx,'Cotação']:.2f} = R$ {qtd * df.at[idx,'Cotação']:.2f}")
-                
-                # Salvar detalhes do aporte se houve compra
-                self._salvar_aporte_detalhado(df.loc[idx], qtd, qtd * df.at[idx,"Cotação"], "PO", mes, data, df)
+                logger.debug(f"Reuse candidate not certified by the LP bound (gap {reuso['gap']:.2%}), solving")
+
+        grupos = self.df_original[self.decompor_po].to_numpy() if self.decompor_po else None
+        if res is None:
+            if self.corrida_po is not None and not self.aproximado_po:
+                res = self.corrida_po.resolver(
+                    precos, deficits, inteiro, aporte, k_min=self.k_min_po,
+                    tempo_limite=self.tempo_limite_po, gap_rel=self.gap_rel_po,
+                    grupos=grupos, cache=self.cache_solve,
+                )
+            elif self.decompor_po:
+                res = solver.resolver_decomposto(
+                    precos, deficits, inteiro, aporte, grupos,
+                    k_min=self.k_min_po, tempo_limite=self.tempo_limite_po, gap_rel=self.gap_rel_po,
+                    cache=self.cache_solve,
+                )
+            else:
+                res = solver.resolver(
+                    precos, deficits, inteiro, aporte, k_min=self.k_min_po,
+                    tempo_limite=self.tempo_limite_po, gap_rel=self.gap_rel_po,
+                    cache=self.cache_solve, aproximado=self.aproximado_po,
+                )
+        if self.corpus_po is not None and res["nivel"] != "reuso":
+            self.corpus_po.registrar(precos, deficits, inteiro, aporte, self.k_min_po, res,
+                                     tempo_limite=self.tempo_limite_po, gap_rel=self.gap_rel_po,
+                                     grupos=grupos, mes=mes, data=pd.Timestamp(data).date(),
+                                     decompor=self.decompor_po, aproximado=self.aproximado_po or None,
+                                     vencedor=res.get("vencedor"))
+        if self.reutilizar_po and res["nivel"] != "reuso":
+            faixas = solver.faixas_validade(precos, deficits, inteiro, aporte, res["qtd"])
+            self._ultimo_po = {"res": res, "faixas": faixas}
+
+        logger.info(f"Optimization solved at tier '{res['nivel']}' (gap {res['gap']:.2%}, {res['tempo']:.3f}s"
+                    f"{', cached' if res['cache'] else ''})")
+
+        compra = np.asarray(res["qtd"], dtype=float)
+        custo = compra * cot
+        total_cost = custo.sum()
+        assets_bought = int((compra > 0).sum())
+
+        # Salvar detalhes do aporte dos ativos comprados
+        self._registrar_aportes(np.flatnonzero(compra > 0), qtd, cot, tot, compra, custo, "PO", mes, data,
+                                nivel=res["nivel"], gap=res["gap"])
 
         leftover = aporte - total_cost
         logger.info(f"PO strategy completed: {assets_bought} assets bought, R$ {total_cost:,.2f} invested, R$ {leftover:,.2f} leftover")
-        return df, leftover
-
-    # ------------- método para salvar aportes detalhados ---------------
-    def _salvar_aporte_detalhado(self, row, qtd_aportada, valor_aportado, estrategia, mes, data, df_cart):
-        """Salva os detalhes do aporte para um ativo específico"""
-        logger.debug(f"Saving detailed contribution for {row.get('Ticker', 'Unknown')}: {qtd_aportada} units, R$ {valor_aportado:.2f}")
-        
-        # Calcular % Atual e Variação
-        valor_total_carteira = df_cart["Total"].sum()
-        pct_atual = (row["Total"] / valor_total_carteira) * 100 if valor_total_carteira > 0 else 0
-        pct_ideal = row["% Ideal - Ref."] * 100
-        variacao = pct_atual - pct_ideal
-        
-        aporte_info = {
+        return compra, leftover
+
+    # ------------- histórico de aportes -----------------
+    def _registrar_aportes(self, ids, qtd, cot, tot, qtd_aportada, valor_aportado, estrategia, mes, data,
+                           nivel=None, gap=None, negociacao=True):
+        """Acrescenta ao histórico, como um bloco de colunas, os aportes nas linhas `ids`.
+
+        `qtd`, `cot` e `tot` descrevem a carteira (todas as linhas) vista pelo
+        aporte; `qtd_aportada`/`valor_aportado` são por linha da carteira.
+        `negociacao=False` (sobras varridas p/ o caixa) não emite eventos "trade".
+        """
+        if not len(ids):
+            return
+        valor_total_carteira = tot.sum()
+        pct_atual = tot[ids] / valor_total_carteira * 100 if valor_total_carteira > 0 else np.zeros(len(ids))
+        pct_ideal = self._alvo[ids] * 100
+        lote = {
             'Mes': mes,
             'Data': data,
             'Estrategia': estrategia,
-            'Geo': row.get("Geo.", ""),
-            'Classe': row.get("Classe", ""),
-            'Subclasses': row.get("Subclasses", ""),
-            'Setor': row.get("Setor", ""),
-            'Ativo': row.get("Ativo", ""),
-            'Ticker': row.get("Ticker", ""),
-            'Qnt_Total': row.get("Qnt.", 0),
-            'Cotacao': row.get("Cotação", 0),
-            'Total': row.get("Total", 0),
+            **{nome: col[ids] for nome, col in self._meta_aportes.items()},
+            'Qnt_Total': qtd[ids],
+            'Cotacao': cot[ids],
+            'Total': tot[ids],
             'Pct_Atual': pct_atual,
             'Pct_Ideal': pct_ideal,
-            'Variacao': variacao,
-            'Qnt_Aportado': qtd_aportada,
-            'Valor_Aportado': valor_aportado
+            'Variacao': pct_atual - pct_ideal,
+            'Qnt_Aportado': qtd_aportada[ids],
+            'Valor_Aportado': valor_aportado[ids],
+            'Nivel_Solver': nivel,
+            'Gap_Solver': gap,
         }
-        
-        self.aportes_detalhados.append(aporte_info)
+        logger.debug(f"Saving {len(ids)} detailed contributions ({estrategia})")
+        if negociacao and events_enabled():
+            for tk, q, v, c in zip(lote["Ticker"], lote["Qnt_Aportado"], lote["Valor_Aportado"], lote["Cotacao"]):
+                emit_event("trade", strategy=estrategia, ticker=tk, qty=q, value=v, price=c)
+        self.aportes_detalhados.anexar(lote)
 
     # ------------- método para obter dataframe de aportes --------------
     def obter_df_aportes(self):
         """Retorna DataFrame com todos os aportes detalhados"""
         logger.debug(f"Retrieving detailed contributions dataframe: {len(self.aportes_detalhados)} records")
         
-        if not self.aportes_detalhados:
+        if not len(self.aportes_detalhados):
             logger.warning("No detailed contributions found")
             return pd.DataFrame()
-        
-        df_aportes = pd.DataFrame(self.aportes_detalhados)
+
+        df_aportes = self.aportes_detalhados.para_frame()
         logger.info(f"Detailed contributions dataframe created with {len(df_aportes)} records")
         return df_aportes
 
+    # ------------- memória ------------------------------
+    def _novo_livro(self):
+        """Histórico de aportes em blocos de colunas; compactos/despejáveis quando há limite de memória."""
+        return LivroAportes(diretorio=self.dir_spill, compacto=bool(self.memoria_reduzida or self.limite_memoria),
+                            float32=APORTES_FLOAT32 if self.memoria_reduzida else ())
+
+    def _fase(self, nome):
+        return self.memoria.fase(nome) if self.memoria is not None else nullcontext()
+
+    def _checar_memoria(self):
+        if self.memoria is None or not self.memoria.excedeu():
+            return
+        if self.aportes_detalhados.despejar():
+            logger.warning(f"Memory budget exceeded ({self.memoria.atual() / 2**20:,.1f} MB traced), "
+                           f"contribution ledger spilled to {self.aportes_detalhados.diretorio}")
+
+    def relatorio_memoria(self):
+        """Consumo por fase da última execução (ver src.memoria.MonitorMemoria)."""
+        if self.memoria is None:
+            return pd.DataFrame()
+        return self.memoria.relatorio()
+
     # ------------- loop principal -----------------------
-    def simular(self, meses=24, data_fim_str=None):
-        logger.info(f"Starting portfolio simulation for {meses} months")
+    def _compras(self, compra, cot):
+        """Linhas efetivamente compradas num período (ticker, quantidade, custo)."""
+        ids = np.flatnonzero(compra > 0)
+        return pd.DataFrame({"Ticker": self.df_original["Ticker"].iloc[ids].reset_index(drop=True),
+                             "Qtd_comprar": compra[ids], "Custo_real": compra[ids] * cot[ids]})
+
+    def _carteira(self, qtd, cot, tot):
+        """Posição (DataFrame no formato de `df_original`) com quantidades, cotações e totais dados."""
+        cart = self.df_original.copy()
+        cart["Qnt."], cart["Cotação"], cart["Total"] = qtd, cot, tot
+        return cart
+
+    def iterar_simulacao(self, meses=24, data_fim_str=None, dados=None):
+        """Executa a simulação período a período, de forma preguiçosa.
+
+        A cada período gera um `PassoSimulacao` (dict somente leitura) com
+        `mes`, `data`, `metricas` (a linha que `simular` devolve),
+        `cart_def`/`cart_po` (carteiras ao fim do período), `compras_def`/
+        `compras_po` (ativos comprados) e `aportes` (registros do histórico
+        de aportes do período); os DataFrames só são montados quando lidos.
+        Interromper a iteração encerra a simulação naquele ponto.
+        `dados`: séries já coletadas (None = obter_dados_historicos).
+        """
+        logger.info(f"Starting portfolio simulation for {meses} months (freq={self.freq})")
         logger.debug(f"End date: {data_fim_str if data_fim_str else 'Current date'}")
         
         # Limpar aportes anteriores
-        self.aportes_detalhados = []
+        self.aportes_detalhados = self._novo_livro()
+        self._ultimo_po, self.reusos_po = None, 0
         logger.debug("Cleared previous detailed contributions")
-        
+        if self.memoria is not None:
+            self.memoria.iniciar()
+
         try:
-            dados = self.obter_dados_historicos(meses, data_fim_str)
+            with self._fase("dados"):
+                if dados is None:
+                    dados = self.obter_dados_historicos(meses, data_fim_str)
             logger.info(f"Historical data obtained for {len(dados)} tickers")
         except Exception as e:
             logger.error(f"Error obtaining historical data: {str(e)}")
+            if self.memoria is not None:
+                self.memoria.parar()
             raise
         
-        cart_d, cart_p = self.df_original.copy(), self.df_original.copy()
+        start_date, end_date = self._periodo(meses, data_fim_str)
+        dates = pd.date_range(start_date, end_date, freq=FREQUENCIAS[self.freq])
+        if len(dates) == 0:
+            raise ValueError(f"No simulation dates between {start_date:%Y-%m-%d} and {end_date:%Y-%m-%d}")
+
+        # estado corrente da simulação (ver salvar_checkpoint)
+        # posições como arrays por linha da carteira; DataFrames só na saída (ver _carteira)
+        qtd = self.df_original["Qnt."].to_numpy(dtype=float)
+        self._estado = {
+            "mes": 0, "data": None,
+            "qtd_def": qtd.copy(), "qtd_po": qtd.copy(),
+            "cotacao": self.df_original["Cotação"].to_numpy(dtype=float),
+            "aporte_acum": 0.0, "valor_inicial": self.df_original["Total"].sum(),
+            "historico": [], "dados": dados,
+        }
         logger.debug("Created deficit and portfolio optimization portfolios")
+        logger.info(f"Initial portfolio value: R$ {self._estado['valor_inicial']:,.2f}")
 
-        dates = pd.date_range(end=datetime.now(), periods=meses, freq="MS")
-        logger.debug(f"Simulation dates: {dates[0].strftime('%Y-%m-%d')} to {dates[-1].strftime('%Y-%m-%d')}")
-        
-        valor_inicial = cart_d["Total"].sum()
-        logger.info(f"Initial portfolio value: R$ {valor_inicial:,.2f}")
-
-        aporte_acum, out = 0.0, []
+        yield from self._executar(dates)
 
-        # --------------------------------------------------------------
-        # acumuladores de aportes por classe e por estratégia
-        # --------------------------------------------------------------
-        aportado_def = {cls: 0.0 for cls in self.classes}
-        aportado_po  = {cls: 0.0 for cls in self.classes}
-        logger.debug(f"Initialized contribution trackers for classes: {self.classes}")
+    def _executar(self, dates):
+        """Loop de simulação a partir de `self._estado`, atualizado a cada período."""
+        logger.debug(f"Simulation dates: {dates[0].strftime('%Y-%m-%d')} to {dates[-1].strftime('%Y-%m-%d')} ({len(dates)} periods)")
 
-        logger.info("Starting monthly simulation loop")
-        for imes, dt in enumerate(dates, 1):
-            logger.info(f"Processing month {imes}/{meses}: {dt.strftime('%Y-%m-%d')}")
-            
-            # Update prices
-            price_updates = 0
-            missing_data = 0
-            
-            for cart in (cart_d, cart_p):
-                for idx, r in cart.iterrows():
-                    tk = r["Ticker"]
-                    if tk not in dados: 
-                        missing_data += 1
-                        continue
-                    s = dados[tk][dados[tk].index <= dt]
-                    
-                    if s.empty:
-                        missing_data += 1
-                        continue
-                    v_raw = s.iloc[-1]                     # pode ser escalar ou Series
-                    # extrai o primeiro elemento se for iterável
-                    v = float(np.asarray(v_raw).flatten()[0])
-                    cart.at[idx, "Cotação"] = v
-                    price_updates += 1
-                    
-                cart["Total"] = cart["Qnt."] * cart["Cotação"]
-            
-            logger.debug(f"Price updates: {price_updates}, Missing data: {missing_data}")
+        try:
+            yield from self._executar_periodos(dates)
+        finally:
+            set_event_context(month=None, date=None, strategy=None)
+            if self.memoria is not None:
+                self.memoria.parar()
+                self.memoria.resumir()
+
+    def _executar_periodos(self, dates):
+        estado = self._estado
+        valor_inicial = estado["valor_inicial"]
+
+        with self._fase("painel"):
+            precos = self.montar_painel(estado["dados"], dates)
+
+        alvo = self._alvo
+        peso_alvo = alvo @ self._mat_classes
+        selic = self.ativos.ids[self.ativos.caixa]
+
+        logger.info("Starting simulation loop")
+        for ip, dt in enumerate(dates):
+            imes = estado["mes"] + 1
+            logger.info(f"Processing period {imes} ({ip + 1}/{len(dates)}): {dt.strftime('%Y-%m-%d')}")
+            set_event_context(month=imes, date=dt, strategy=None)
+            emit_event("month_start", contribution=self.aporte_mensal)
+
+            # Update prices (último valor conhecido; mantém cotação anterior se faltar dado)
+            linha = precos[ip]
+            ok = np.isfinite(linha)
+            cot = np.where(ok, linha, estado["cotacao"])
+            qtd_d, qtd_p = estado["qtd_def"], estado["qtd_po"]
+
+            logger.debug(f"Price updates: {2*ok.sum()}, Missing data: {2*(~ok).sum()}")
+            emit_event("price_update", updated=int(ok.sum()), missing=int((~ok).sum()))
+            n_aportes = len(self.aportes_detalhados)
+
+            # Periodic contributions
+            estado["aporte_acum"] += self.aporte_mensal
+            logger.debug(f"Accumulated contributions: R$ {estado['aporte_acum']:,.2f}")
 
-            # Monthly contributions
-            aporte_acum += self.aporte_mensal
-            logger.debug(f"Accumulated contributions: R$ {aporte_acum:,.2f}")
-            
             # Apply strategies
             try:
-                res_d, sobra_d = self._aporte_deficit(cart_d, cart_d["Total"].sum(), self.aporte_mensal, imes, dt)
-                res_p, sobra_p = self._aporte_po(cart_p, cart_p["Total"].sum(), self.aporte_mensal, imes, dt)
-                
+                with self._fase("estrategia_def"):
+                    set_event_context(strategy="Deficit")
+                    compra_d, sobra_d = self._aporte_deficit(qtd_d, cot, self.aporte_mensal, imes, dt)
+                with self._fase("estrategia_po"):
+                    set_event_context(strategy="PO")
+                    compra_p, sobra_p = self._aporte_po(qtd_p, cot, self.aporte_mensal, imes, dt)
+                set_event_context(strategy=None)
+
                 logger.debug(f"Strategy results - Deficit leftover: R$ {sobra_d:.2f}, PO leftover: R$ {sobra_p:.2f}")
             except Exception as e:
-                logger.error(f"Error applying strategies in month {imes}: {str(e)}")
+                logger.error(f"Error applying strategies in period {imes}: {str(e)}")
                 raise
 
-            # Update quantities
-            cart_d["Qnt."] += res_d["Qtd_comprar"]
-            cart_p["Qnt."] += res_p["Qtd_comprar"]
-            cart_d["Total"] = cart_d["Qnt."] * cart_d["Cotação"]
-            cart_p["Total"] = cart_p["Qnt."] * cart_p["Cotação"]
+            # Update quantities (arrays novos: os passos já entregues não mudam)
+            qtd_d, qtd_p = qtd_d + compra_d, qtd_p + compra_p
+            tot_d, tot_p = qtd_d * cot, qtd_p * cot
 
             # Handle leftovers → SELIC
-            for cart, sobra, estrategia in ((cart_d,sobra_d,"Deficit"),(cart_p,sobra_p,"PO")):
-                if sobra>0 and (cart["Ticker"]=="SELIC").any():
-                    idx = cart[cart["Ticker"]=="SELIC"].index[0]
-                    cart.at[idx,"Qnt."]  += sobra
-                    cart.at[idx,"Total"] += sobra
+            for qtd, tot, sobra, estrategia in ((qtd_d, tot_d, sobra_d, "Deficit"), (qtd_p, tot_p, sobra_p, "PO")):
+                if sobra>0 and len(selic):
+                    i = selic[0]
+                    qtd[i] += sobra
+                    tot[i] += sobra
                     logger.debug(f"Added R$ {sobra:.2f} leftover to SELIC ({estrategia})")
-                    
+                    emit_event("leftover_sweep", strategy=estrategia, ticker=self._meta_aportes["Ticker"][i], value=sobra)
+
                     # Registrar sobra como aporte na SELIC
-                    if sobra > 0:
-                        self._salvar_aporte_detalhado(cart.loc[idx], sobra, sobra, estrategia, imes, dt, cart)
+                    aportado = np.full(len(qtd), sobra)
+                    self._registrar_aportes(selic[:1], qtd, cot, tot, aportado, aportado, estrategia, imes, dt,
+                                            negociacao=False)
 
             # Calculate performance metrics
-            investido = valor_inicial + aporte_acum
-            vt_d, vt_p = cart_d["Total"].sum(), cart_p["Total"].sum()
+            investido = valor_inicial + estado["aporte_acum"]
+            vt_d, vt_p = tot_d.sum(), tot_p.sum()
             rent_def_corr = (vt_d/investido -1)*100
             rent_po_corr = (vt_p/investido -1)*100
-            
-            logger.debug(f"Month {imes} performance - Deficit: {rent_def_corr:.2f}%, PO: {rent_po_corr:.2f}%")
-            
-            # ---- drift por classe (usar carteira déficit para referência) ---
-            drift = {}
-            for cls in self.classes:
-                # pesos alvo são os mesmos p/ as duas carteiras
-                peso_alvo = cart_d[cart_d["Classe"] == cls]["% Ideal - Ref."].sum()
 
-                peso_def  = cart_d[cart_d["Classe"] == cls]["Total"].sum() / vt_d
-                peso_po   = cart_p[cart_p["Classe"] == cls]["Total"].sum() / vt_p
+            logger.debug(f"Period {imes} performance - Deficit: {rent_def_corr:.2f}%, PO: {rent_po_corr:.2f}%")
 
-                drift[f"drift_{cls}_def"] = (peso_def - peso_alvo) * 100   # p.p.
-                drift[f"drift_{cls}_po"]  = (peso_po  - peso_alvo) * 100
+            # ---- drift por classe (pesos alvo são os mesmos p/ as duas carteiras) ---
+            drift_def = ((tot_d @ self._mat_classes) / vt_d - peso_alvo) * 100   # p.p.
+            drift_po  = ((tot_p @ self._mat_classes) / vt_p - peso_alvo) * 100
+            drift = {}
+            for j, cls in enumerate(self.classes):
+                drift[f"drift_{cls}_def"] = drift_def[j]
+                drift[f"drift_{cls}_po"]  = drift_po[j]
 
-            out.append({
+            metricas = {
                 "mes": imes, "data": dt,
                 "investido": investido,
                 "valor_def": vt_d, "valor_po": vt_p,
-                "deficit_def": (cart_d["% Ideal - Ref."]*vt_d - cart_d["Total"]).clip(lower=0).sum(),
-                "deficit_po":  (cart_p["% Ideal - Ref."]*vt_p - cart_p["Total"]).clip(lower=0).sum(),
+                "deficit_def": np.clip(alvo*vt_d - tot_d, 0, None).sum(),
+                "deficit_po":  np.clip(alvo*vt_p - tot_p, 0, None).sum(),
                 "rent_def_corr": rent_def_corr,
                 "rent_po_corr":  rent_po_corr,
-                # "rent_def_rf"  : rent_def_rf,
-                # "rent_po_rf"   : rent_po_rf,
-                # "rent_def_rv"  : rent_def_rv,
-                # "rent_po_rv"   : rent_po_rv,
                 **drift
-            })
+            }
+            estado.update(mes=imes, data=dt, qtd_def=qtd_d, qtd_po=qtd_p, cotacao=cot)
+            estado["historico"].append(metricas)
+            n_fim = len(self.aportes_detalhados)
+            yield PassoSimulacao(
+                {"mes": imes, "data": dt, "metricas": metricas},
+                cart_def=lambda q=qtd_d, t=tot_d, c=cot: self._carteira(q, c, t),
+                cart_po=lambda q=qtd_p, t=tot_p, c=cot: self._carteira(q, c, t),
+                compras_def=lambda q=compra_d, c=cot: self._compras(q, c),
+                compras_po=lambda q=compra_p, c=cot: self._compras(q, c),
+                aportes=lambda a=n_aportes, b=n_fim: self.aportes_detalhados.fatia(a, b),
+            )
+            self._checar_memoria()
+
+        if self.cache_solve is not None:
+            logger.info(f"Solve cache stats: {self.cache_solve.estatisticas()}")
+        if self.reutilizar_po:
+            logger.info(f"PO allocation reused in {self.reusos_po}/{len(dates)} periods")
+        if self.corrida_po is not None:
+            logger.info(f"Solver race wins: {self.corrida_po.estatisticas()['vitorias'].to_dict()}")
+
+    def simular(self, meses=24, data_fim_str=None, checkpoint=None):
+        """Roda todo o horizonte e devolve um DataFrame com uma linha por período.
+
+        Com `checkpoint` (caminho de arquivo), retoma do estado salvo quando o
+        arquivo existe, simulando só os períodos novos, e grava o estado final.
+        Com `armazem_resultados` e `dados_mercado`, uma simulação idêntica
+        (mesma posição, parâmetros, séries de mercado e código) é restaurada do
+        armazém. Sem `dados_mercado` o armazém não é usado: as séries da rede
+        mudam (ajustes de proventos, janela até hoje) e só se conheceriam
+        depois da coleta.
+        """
+        if checkpoint and Path(checkpoint).exists():
+            passos = self.retomar_simulacao(checkpoint, data_fim_str)
+        elif self.armazem_resultados is not None and self.dados_mercado is not None:
+            return self._simular_armazenado(meses, data_fim_str, checkpoint)
+        else:
+            if self.armazem_resultados is not None:
+                logger.warning("Result store needs preloaded market data (dados_mercado), simulating without it")
+            passos = self.iterar_simulacao(meses, data_fim_str)
+        for _ in passos:
+            pass
+        if checkpoint:
+            self.salvar_checkpoint(checkpoint)
+        return pd.DataFrame(self._estado["historico"])
+
+    def _params_resultado(self, meses, data_fim_str):
+        """Parâmetros que determinam o resultado de `simular` (entram na chave do armazém)."""
+        start_date, end_date = self._periodo(meses, data_fim_str)
+        return {
+            "aporte_mensal": self.aporte_mensal, "k_min_po": self.k_min_po, "freq": self.freq,
+            "tempo_limite_po": self.tempo_limite_po, "gap_rel_po": self.gap_rel_po,
+            "reutilizar_po": self.reutilizar_po, "decompor_po": self.decompor_po,
+            "aproximado_po": self.aproximado_po, "corrida_po": self.corrida_po is not None,
+            "memoria_reduzida": self.memoria_reduzida,
+            # um acerto do cache devolve a solução de um problema igual após quantização
+            "cache_solve": None if self.cache_solve is None else
+                           (self.cache_solve.decimais_preco, self.cache_solve.decimais_valor),
+            "inicio": f"{start_date:%Y-%m-%d}", "fim": f"{end_date:%Y-%m-%d}",
+        }
+
+    def _simular_armazenado(self, meses, data_fim_str, checkpoint=None):
+        """`simular` via armazém: restaura o checkpoint guardado ou simula e guarda."""
+        armazem = self.armazem_resultados
+        chave = armazem.chave(self.df_original, self._params_resultado(meses, data_fim_str),
+                              hash_mercado(self.dados_mercado))
+
+        arq = armazem.obter(chave)
+        if arq is not None:
+            try:
+                self.carregar_checkpoint(arq)
+                logger.info(f"Backtest result restored from store ({chave[:12]}), skipping simulation")
+            except Exception as e:
+                logger.warning(f"Discarding unreadable stored result {chave[:12]}: {e}")
+                armazem.descartar(chave)
+                arq = None
+        if arq is None:
+            for _ in self.iterar_simulacao(meses, data_fim_str):
+                pass
+            armazem.guardar(chave, self.salvar_checkpoint)
+
+        if checkpoint:
+            self.salvar_checkpoint(checkpoint)
+        return pd.DataFrame(self._estado["historico"])
+
+    # ------------- checkpoint / retomada ----------------
+    def salvar_checkpoint(self, caminho):
+        """Grava o estado da simulação (quantidades e cotações das carteiras,
+        aportes acumulados, histórico de métricas, registros de aportes e a
+        janela final de preços).
+
+        A compressão segue a extensão do arquivo (ex.: ".pkl.gz").
+        """
+        if self._estado is None:
+            raise ValueError("Nenhuma simulação em andamento para salvar")
+        if self._estado["data"] is None:
+            raise ValueError("Nenhum período simulado ainda: não há estado para salvar")
+        estado = dict(self._estado)
+        # basta a cauda das séries p/ ffill e encadeamento com a próxima coleta
+        corte = estado["data"] - timedelta(days=JANELA_CHECKPOINT_DIAS)
+        estado["dados"] = {tk: serie[serie.index >= corte] for tk, serie in estado["dados"].items()}
+        estado.update({
+            "versao": VERSAO_CHECKPOINT, "freq": self.freq, "aporte_mensal": self.aporte_mensal,
+            "tickers": self.df_original["Ticker"].tolist(),
+            "offset_aportes": len(self.aportes_detalhados), "aportes": self.aportes_detalhados.para_frame(),
+        })
+        Path(caminho).parent.mkdir(parents=True, exist_ok=True)
+        pd.to_pickle(estado, caminho)
+        logger.info(f"Checkpoint saved at period {estado['mes']} ({estado['data']:%Y-%m-%d}): {caminho}")
+
+    def carregar_checkpoint(self, caminho):
+        """Restaura o estado gravado por `salvar_checkpoint`."""
+        estado = pd.read_pickle(caminho)
+        if estado.get("versao") != VERSAO_CHECKPOINT:
+            raise ValueError(f"Checkpoint incompatível: versão {estado.get('versao')!r}")
+        if estado["tickers"] != self.df_original["Ticker"].tolist() or estado["freq"] != self.freq:
+            raise ValueError("Checkpoint não corresponde à carteira/frequência deste simulador")
+
+        self.aportes_detalhados = self._novo_livro()
+        aportes = estado.pop("aportes")
+        if len(aportes):
+            self.aportes_detalhados.anexar({col: aportes[col].to_numpy() for col in aportes.columns})
+        offset = estado.pop("offset_aportes")
+        if offset != len(self.aportes_detalhados):
+            raise ValueError(f"Checkpoint corrompido: {len(self.aportes_detalhados)} aportes, offset {offset}")
+        for chave in ("versao", "freq", "aporte_mensal", "tickers"):
+            estado.pop(chave)
+        self._estado = estado
+        self._ultimo_po, self.reusos_po = None, 0
+        logger.info(f"Checkpoint loaded: period {estado['mes']} ({estado['data']:%Y-%m-%d}), {offset} ledger records")
+
+    @staticmethod
+    def _encadear(antigos, novos):
+        """Emenda as séries novas nas antigas, reescalando as novas na última data
+        em comum (fatores de RF recomeçam em 1 a cada coleta)."""
+        dados = dict(antigos)
+        for tk, nova in novos.items():
+            velha = antigos.get(tk)
+            if velha is None or velha.empty:
+                dados[tk] = nova
+                continue
+            comuns = velha.index.intersection(nova.index)
+            if len(comuns):
+                t = comuns[-1]
+                fator = velha[t] / nova[t]
+            else:
+                logger.warning(f"No overlap to chain {tk}, appending new data unscaled")
+                t, fator = velha.index[-1], 1.0
+            dados[tk] = pd.concat([velha[velha.index <= t], nova[nova.index > t] * fator])
+        return dados
 
-        return pd.DataFrame(out)
\ No newline at end of file
+    def retomar_simulacao(self, caminho=None, data_fim_str=None):
+        """Continua a simulação a partir de um checkpoint (ou do estado em
+        memória, se `caminho` for None), gerando só os períodos novos até
+        `data_fim_str`; baixa apenas a janela de dados necessária."""
+        if caminho is not None:
+            self.carregar_checkpoint(caminho)
+        estado = self._estado
+        _, end_date = self._periodo(0, data_fim_str)
+        dates = pd.date_range(estado["data"] + timedelta(days=1), end_date, freq=FREQUENCIAS[self.freq])
+        if len(dates) == 0:
+            logger.info(f"Checkpoint already up to date ({estado['data']:%Y-%m-%d})")
+            return
+
+        # janela nova com sobreposição p/ encadear as séries
+        meses_novos = int(np.ceil((end_date - estado["data"]).days / 30)) + 1
+        logger.info(f"Resuming simulation: {len(dates)} new periods, fetching {meses_novos} months of data")
+        if self.memoria is not None:
+            self.memoria.iniciar()
+        with self._fase("dados"):
+            novos = self.obter_dados_historicos(meses_novos, data_fim_str)
+            estado["dados"] = self._encadear(estado["dados"], novos)
+
+        yield from self._executar(dates)
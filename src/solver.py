@@ -0,0 +1,607 @@
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pulp as pl
+
+from src import presolve
+from src.cache import CacheSolve
+from src.logger import emit_event
+
+logger = logging.getLogger(__name__)
+
+# Cache em memória compartilhado por allocate e simulator (None desliga)
+CACHE_PADRAO = CacheSolve()
+
+# Níveis da cascata de solução, do mais preciso ao mais barato. "milp" = ótimo
+# provado a menos de GAP_ABS (o CBC para com objetivo - melhor limite <= GAP_ABS)
+NIVEIS = ("milp", "milp_incumbente", "lp_arredondado", "deficit")
+
+# Objetivo em reais: diferenças abaixo de 1 centavo não justificam continuar o branch-and-bound
+GAP_ABS = 0.01
+
+# Solver do PuLP usado no MILP e na relaxação (ver pl.listSolvers(onlyAvailable=True))
+BACKEND_PADRAO = "PULP_CBC_CMD"
+
+
+def montar_problema(precos, deficits, inteiro, orcamento, k_min=None, relaxado=False, teto=None):
+    '''
+    Monta o MILP de aporte a partir de arrays (um elemento por ativo).
+
+    - precos, deficits: valores em R$;
+    - inteiro: máscara booleana dos ativos negociados em cotas inteiras (RV);
+    - relaxado: se True, monta a relaxação contínua (sem inteiros/binários);
+    - teto: quantidade máxima por ativo (ver src.presolve); None = orcamento/preco.
+    '''
+    n = len(precos)
+    prob = pl.LpProblem("PO", pl.LpMinimize)
+    if teto is None:
+        teto = [None] * n
+
+    qtd, gap, sel = [], [], []
+    for i in range(n):
+        ub = None if teto[i] is None else float(teto[i])
+        if inteiro[i]:
+            cat = "Continuous" if relaxado else "Integer"
+            qtd.append(pl.LpVariable(f"RV_{i}", lowBound=0, upBound=ub, cat=cat))
+        else:
+            qtd.append(pl.LpVariable(f"RF_{i}", lowBound=0, upBound=ub))
+        gap.append(pl.LpVariable(f"GAP_{i}", lowBound=0))
+        if k_min:
+            cat = "Continuous" if relaxado else "Binary"
+            sel.append(pl.LpVariable(f"SEL_{i}", lowBound=0, upBound=1, cat=cat))
+
+    # -------- objetivo: minimizar gaps ------------------------------
+    prob += pl.lpSum(gap)
+
+    # -------- restrição de orçamento --------------------------------
+    prob += pl.lpSum(float(precos[i]) * qtd[i] for i in range(n)) <= orcamento
+
+    # -------- cardinalidade (se houver K) ---------------------------
+    if k_min:
+        prob += pl.lpSum(sel) >= k_min
+        for i in range(n):
+            preco = float(precos[i])
+            max_qtd = orcamento / preco if teto[i] is None else float(teto[i])   # Big-M
+            min_qtd = 1 if inteiro[i] else (1/preco)
+            prob += qtd[i] >= min_qtd * sel[i]
+            prob += qtd[i] <= max_qtd * sel[i]
+
+    # -------- gaps residuais ----------------------------------------
+    for i in range(n):
+        prob += gap[i] >= float(deficits[i]) - float(precos[i]) * qtd[i]
+
+    return prob, qtd, gap, sel
+
+
+def _motor(tempo_limite=None, gap_rel=None, warm=False, backend=None):
+    return pl.getSolver(backend or BACKEND_PADRAO, msg=False, timeLimit=tempo_limite,
+                        gapRel=gap_rel, gapAbs=GAP_ABS, warmStart=warm)
+
+
+def gap_residual(precos, deficits, qtd):
+    '''Valor da função objetivo (soma dos gaps) para uma solução qualquer.'''
+    return float(np.clip(deficits - precos * qtd, 0, None).sum())
+
+
+def resolver_relaxacao(precos, deficits, inteiro, orcamento, k_min=None, teto=None, backend=None):
+    '''
+    Resolve a relaxação LP. Retorna (qtd, objetivo) ou None se inviável.
+    O objetivo é um limite inferior para o MILP.
+    '''
+    prob, qtd, _, _ = montar_problema(precos, deficits, inteiro, orcamento, k_min, relaxado=True, teto=teto)
+    prob.solve(_motor(backend=backend))
+    if prob.status != pl.LpStatusOptimal:
+        logger.debug(f"LP relaxation status: {pl.LpStatus[prob.status]}")
+        return None
+    valores = np.array([v.varValue or 0.0 for v in qtd], dtype=float)
+    return np.clip(valores, 0, None), float(prob.objective.value() or 0.0)
+
+
+def arredondar_lp(precos, deficits, inteiro, orcamento, qtd_lp, k_min=None):
+    '''
+    Heurística de arredondamento: trunca as cotas inteiras da solução LP,
+    garante a cardinalidade mínima e redistribui a sobra de forma gulosa.
+    Retorna o vetor de quantidades ou None se não conseguir respeitar k_min.
+    '''
+    qtd = np.where(inteiro, np.floor(qtd_lp + 1e-9), qtd_lp)
+    sobra = orcamento - float(precos @ qtd)
+
+    if k_min:
+        completo = _completar_k_min(precos, deficits, inteiro, qtd, sobra, k_min)
+        if completo is None:
+            return None
+        qtd, sobra = completo
+
+    return _preencher_guloso(precos, deficits, inteiro, qtd, sobra)[0]
+
+
+def _completar_k_min(precos, deficits, inteiro, qtd, sobra, k_min):
+    '''
+    Cardinalidade: compra mínima (1 cota RV ou R$ 1 de RF) nos ativos ainda
+    não comprados, primeiro os com déficit e os mais baratos, até `k_min`.
+    Retorna (qtd, sobra) ou None se faltarem ativos ou a sobra não cobrir.
+    '''
+    faltam = int(k_min - (qtd > 0).sum())
+    if faltam <= 0:
+        return qtd, sobra
+    qtd = qtd.copy()
+    custo_min = np.where(inteiro, precos, 1.0)
+    livres = np.flatnonzero(qtd <= 0)
+    livres = livres[np.lexsort((custo_min[livres], deficits[livres] <= 0))][:faltam]
+    if len(livres) < faltam or custo_min[livres].sum() > sobra + 1e-6:
+        return None
+    qtd[livres] = custo_min[livres] / precos[livres]
+    return qtd, sobra - float(custo_min[livres].sum())
+
+
+def _preencher_guloso(precos, deficits, inteiro, qtd, sobra):
+    '''Distribui `sobra` sobre os gaps residuais de `qtd`. Retorna (qtd, sobra).'''
+    qtd = qtd.copy()
+
+    # cotas inteiras que cabem no gap (eficiência 1), maior gap primeiro
+    resto = np.clip(deficits - precos * qtd, 0, None)
+    for i in np.argsort(-resto):
+        if not inteiro[i] or resto[i] <= 0:
+            continue
+        n = min(np.floor(resto[i] / precos[i]), np.floor((sobra + 1e-9) / precos[i]))
+        if n > 0:
+            qtd[i] += n
+            sobra -= n * precos[i]
+
+    # renda fixa absorve o restante dos gaps de forma contínua
+    resto = np.clip(deficits - precos * qtd, 0, None)
+    for i in np.argsort(-resto):
+        if inteiro[i] or resto[i] <= 0 or sobra <= 0:
+            continue
+        valor = min(resto[i], sobra)
+        qtd[i] += valor / precos[i]
+        sobra -= valor
+
+    # cota fracionária: melhor redução de gap por R$ enquanto couber
+    while True:
+        resto = np.clip(deficits - precos * qtd, 0, None)
+        cabe = inteiro & (resto > 0) & (precos <= sobra + 1e-9)
+        if not cabe.any():
+            break
+        i = int(np.argmax(np.where(cabe, resto / precos, -np.inf)))
+        qtd[i] += 1
+        sobra -= precos[i]
+
+    return qtd, sobra
+
+
+def alocar_deficit(precos, deficits, inteiro, orcamento):
+    '''Rateio proporcional ao déficit (cotas inteiras truncadas para RV).'''
+    total = deficits.sum()
+    if total <= 0:
+        return np.zeros_like(precos, dtype=float)
+    valor = deficits / total * orcamento
+    with np.errstate(divide="ignore", invalid="ignore"):
+        qtd = np.where(inteiro, np.floor(valor / precos), valor / precos)
+    return np.where((valor > 0) & np.isfinite(qtd), qtd, 0.0)
+
+
+def _preencher_rf(precos, deficits, inteiro, orcamento, qtd_rv):
+    '''
+    Parte contínua do problema com as cotas de RV fixadas: o saldo do
+    orçamento vai para os gaps de RF, proporcional a cada gap. Qualquer
+    preenchimento até min(saldo, soma dos gaps) é ótimo para esse LP.
+    Retorna (qtd, saldo para RF, soma dos gaps de RF, sobra final).
+    '''
+    saldo = orcamento - float(precos @ qtd_rv)
+    gaps_rf = np.where(inteiro, 0.0, np.clip(deficits, 0, None))
+    total_rf = gaps_rf.sum()
+    usado = min(max(saldo, 0.0), total_rf)
+    valor_rf = gaps_rf * (usado / total_rf) if total_rf > 0 else gaps_rf
+    with np.errstate(divide="ignore", invalid="ignore"):
+        qtd = np.where(inteiro, qtd_rv, np.where(valor_rf > 0, valor_rf / precos, 0.0))
+    return qtd, saldo, total_rf, saldo - usado
+
+
+def faixas_validade(precos, deficits, inteiro, orcamento, qtd, tol=0.01):
+    '''
+    Faixas de validade de uma solução com as cotas de RV fixadas (a RF,
+    contínua, é reabastecida por valor). São derivadas da estrutura desse
+    problema (não são ranging/custos reduzidos de um solver): enquanto preços,
+    déficits e orçamento ficam dentro delas, os gaps de RV seguem
+    abertos/fechados, a RF segue coberta (ou não) pelo saldo, o orçamento
+    comporta as cotas escolhidas e nenhuma cota de RV com gap aberto cabe na sobra.
+
+    Servem de triagem barata: não provam que a solução segue ótima, o que é
+    conferido por `avaliar_reuso` contra o limite da relaxação LP.
+    As faixas por ativo valem variando um ativo de cada vez (`tol` em R$);
+    `dentro_das_faixas` refaz as condições de forma conjunta.
+    '''
+    precos = np.asarray(precos, dtype=float)
+    deficits = np.asarray(deficits, dtype=float)
+    inteiro = np.asarray(inteiro, dtype=bool)
+    qtd_rv = np.where(inteiro, np.asarray(qtd, dtype=float), 0.0)
+
+    qtd_ref, saldo, total_rf, sobra = _preencher_rf(precos, deficits, inteiro, orcamento, qtd_rv)
+    valor = precos * qtd_rv
+    aberto = inteiro & (deficits - valor > tol)
+    comprado = qtd_rv > 0
+    coberta = total_rf <= saldo            # saldo cobre todos os gaps de RF
+    menor_aberto = precos[aberto].min() if aberto.any() else np.inf
+
+    # saldo p/ RF (orçamento - RV) que mantém a base: RF descoberta ou coberta sem cota de RV cabendo
+    saldo_min, saldo_max = (total_rf, total_rf + menor_aberto) if coberta else (0.0, total_rf)
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        preco_max = np.where(comprado, precos + (saldo - saldo_min) / qtd_rv, np.inf)
+        preco_max = np.where(comprado & aberto, np.minimum(preco_max, deficits / qtd_rv), preco_max)
+        preco_min = np.where(comprado, precos - (saldo_max - saldo) / qtd_rv, 0.0)
+        preco_min = np.where(comprado & ~aberto, np.maximum(preco_min, deficits / qtd_rv), preco_min)
+    preco_min = np.where(aberto, np.maximum(preco_min, sobra), np.clip(preco_min, 0, None))
+
+    deficit_min = np.where(aberto, valor, 0.0)
+    deficit_max = np.where(inteiro & ~aberto, valor, np.inf)
+    if coberta:
+        deficit_min = np.where(inteiro, deficit_min, deficits - (menor_aberto - sobra))
+        deficit_max = np.where(inteiro, deficit_max, deficits + sobra)
+    else:
+        deficit_min = np.where(inteiro, deficit_min, deficits - (total_rf - saldo))
+
+    return {
+        "qtd": qtd_ref, "qtd_rv": qtd_rv, "inteiro": inteiro, "aberto": aberto, "coberta": coberta,
+        "n_ativos": int((np.asarray(qtd) > 0).sum()), "tol": tol,
+        "preco_min": preco_min, "preco_max": preco_max,
+        "deficit_min": np.clip(deficit_min, 0, None), "deficit_max": deficit_max,
+        "orcamento_min": orcamento - (saldo - saldo_min), "orcamento_max": orcamento + (saldo_max - saldo),
+        # perda aceita no solve original frente ao limite inferior sum(d) - A
+        "perda": gap_residual(precos, deficits, qtd_ref) - max(deficits.sum() - orcamento, 0.0),
+    }
+
+
+def dentro_das_faixas(faixas, precos, deficits, orcamento):
+    '''
+    True se a solução descrita por `faixas` continua válida para os novos dados:
+    faixas por ativo respeitadas, mesma base (gaps de RV, cobertura da RF e
+    sobra), cardinalidade mantida e perda frente ao limite inferior não maior
+    que a do solve original. É só triagem: a otimalidade nos dados novos é
+    conferida por `avaliar_reuso`.
+    '''
+    precos = np.asarray(precos, dtype=float)
+    deficits = np.asarray(deficits, dtype=float)
+    tol = faixas["tol"]
+    if precos.shape != faixas["qtd"].shape:
+        return False
+
+    if not ((precos >= faixas["preco_min"] - 1e-9).all() and (precos <= faixas["preco_max"] + 1e-9).all()
+            and (deficits >= faixas["deficit_min"] - tol).all() and (deficits <= faixas["deficit_max"] + tol).all()
+            and faixas["orcamento_min"] - tol <= orcamento <= faixas["orcamento_max"] + tol):
+        return False
+
+    inteiro = faixas["inteiro"]
+    qtd, saldo, total_rf, sobra = _preencher_rf(precos, deficits, inteiro, orcamento, faixas["qtd_rv"])
+    aberto = inteiro & (deficits - precos * faixas["qtd_rv"] > tol)
+    if saldo < -tol or (aberto != faixas["aberto"]).any():
+        return False
+    if faixas["coberta"] != (total_rf <= saldo) and abs(total_rf - saldo) > tol:
+        return False
+    if (aberto & (precos <= sobra)).any() or (qtd > 0).sum() < faixas["n_ativos"]:
+        return False
+
+    perda = gap_residual(precos, deficits, qtd) - max(deficits.sum() - orcamento, 0.0)
+    return perda <= faixas["perda"] + tol
+
+
+def reaplicar_solucao(faixas, precos, deficits, orcamento):
+    '''Solução anterior nos novos dados: mesmas cotas de RV, RF reabastecida por valor.'''
+    return _preencher_rf(np.asarray(precos, dtype=float), np.asarray(deficits, dtype=float),
+                         faixas["inteiro"], orcamento, faixas["qtd_rv"])[0]
+
+
+def avaliar_reuso(faixas, precos, deficits, orcamento, k_min=None, backend=None):
+    '''
+    Reaplica a solução de `faixas` nos novos dados e a compara com o limite
+    inferior da relaxação LP do problema novo. Retorna dict no formato de
+    `resolver` (nivel="reuso") com `certificado`: True se objetivo - limite
+    <= GAP_ABS, ou seja, a solução reaproveitada é ótima também nos dados novos.
+    '''
+    t0 = time.perf_counter()
+    precos = np.asarray(precos, dtype=float)
+    deficits = np.asarray(deficits, dtype=float)
+    qtd = reaplicar_solucao(faixas, precos, deficits, orcamento)
+    objetivo = gap_residual(precos, deficits, qtd)
+    relax = resolver_relaxacao(precos, deficits, faixas["inteiro"], orcamento, k_min, backend=backend)
+    limite = relax[1] if relax else max(deficits.sum() - orcamento, 0.0)
+    gap = (objetivo - limite) / objetivo if objetivo > 1e-9 else 0.0
+    return {"qtd": qtd, "nivel": "reuso", "objetivo": objetivo, "limite_inferior": limite,
+            "gap": max(gap, 0.0), "certificado": objetivo - limite <= GAP_ABS,
+            "tempo": time.perf_counter() - t0, "cache": False}
+
+
+def resolver(precos, deficits, inteiro, orcamento, k_min=None,
+             tempo_limite=None, gap_rel=None, cache=CACHE_PADRAO, backend=None, usar_presolve=True,
+             aproximado=False):
+    '''
+    Resolve o aporte com orçamento de latência e cascata de fallback:
+
+    1. MILP (ótimo provado, ou melhor incumbente dentro de `tempo_limite`);
+    2. relaxação LP + arredondamento guloso;
+    3. rateio proporcional ao déficit.
+
+    Problemas idênticos após quantização (ver src.cache) são servidos pelo
+    `cache` sem chamar o solver; passe cache=None para desligar.
+    `backend` troca o solver do PuLP (padrão BACKEND_PADRAO) e
+    usar_presolve=False monta o MILP sem a redução de src.presolve.
+
+    Com aproximado=True o MILP é pulado: relaxação LP, cotas de RV truncadas e
+    reparo guloso da sobra (nivel "lp_arredondado"). `limite_inferior` traz o
+    objetivo da relaxação, então `objetivo - limite_inferior` mede a perda máxima.
+
+    Retorna dict com `qtd`, `nivel` (ver NIVEIS), `objetivo`, `limite_inferior`,
+    `gap` (relativo ao limite da relaxação LP quando não provado; no nível
+    "milp", à tolerância GAP_ABS do CBC), `tempo` e `cache` (True se veio do cache).
+    '''
+    precos = np.asarray(precos, dtype=float)
+    deficits = np.asarray(deficits, dtype=float)
+    inteiro = np.asarray(inteiro, dtype=bool)
+
+    emit_event("solve_start", n_assets=len(precos), budget=float(orcamento), k_min=k_min)
+    opcoes = {"backend": backend, "usar_presolve": usar_presolve, "aproximado": aproximado}
+    if cache is None:
+        res = _resolver_cascata(precos, deficits, inteiro, orcamento, k_min, tempo_limite, gap_rel, **opcoes)
+    else:
+        # só opções fora do padrão entram na chave (mantém as chaves já gravadas em disco)
+        padrao = {"backend": None, "usar_presolve": True, "aproximado": False}
+        extras = {k: v for k, v in opcoes.items() if v != padrao[k]}
+        chave = cache.chave(precos, deficits, inteiro, orcamento, k_min,
+                            tempo_limite=tempo_limite, gap_rel=gap_rel, **extras)
+        res, do_cache = cache.obter_ou_calcular(chave, lambda: _resolver_cascata(
+            precos, deficits, inteiro, orcamento, k_min, tempo_limite, gap_rel, **opcoes))
+        res["cache"] = do_cache
+    emitir_fim_solve(res)
+    return res
+
+
+def emitir_fim_solve(res, **campos):
+    """Evento `solve_end` (ver src.logger) a partir do dict de resultado."""
+    emit_event("solve_end", tier=res["nivel"], objective=res["objetivo"], gap=res["gap"],
+               seconds=res["tempo"], cached=bool(res.get("cache", False)), **campos)
+
+
+def _resolver_cascata(precos, deficits, inteiro, orcamento, k_min, tempo_limite, gap_rel, inicial=None,
+                      backend=None, usar_presolve=True, aproximado=False):
+    t0 = time.perf_counter()
+    logger.debug(f"Solving allocation: {len(precos)} assets, budget R$ {orcamento:,.2f}, "
+                 f"k_min={k_min}, time limit={tempo_limite}, gap={gap_rel}")
+
+    if usar_presolve:
+        red = presolve.reduzir(precos, deficits, inteiro, orcamento, k_min)
+    else:
+        red = presolve.identidade(precos, deficits, inteiro)
+    p_r, d_r, i_r, teto = red["precos"], red["deficits"], red["inteiro"], red["teto"]
+    if len(p_r) == 0 and not k_min:
+        # nada a comprar: nenhum ativo com déficit cabe no aporte
+        objetivo = gap_residual(precos, deficits, np.zeros(len(precos)))
+        return {"qtd": np.zeros(len(precos)), "nivel": "milp", "objetivo": objetivo,
+                "limite_inferior": objetivo, "gap": 0.0,
+                "tempo": time.perf_counter() - t0, "cache": False}
+
+    qtd, nivel = None, None
+    if not aproximado:
+        prob, qtd_var, gap_var, sel_var = montar_problema(p_r, d_r, i_r, orcamento, k_min, teto=teto)
+        warm = inicial is not None and _ponto_inicial(red, inicial, qtd_var, gap_var, sel_var)
+        try:
+            prob.solve(_motor(tempo_limite, gap_rel, warm, backend))
+        except pl.PulpError as e:
+            logger.error(f"PulpError during optimization: {str(e)}")
+        logger.debug(f"MILP status: {pl.LpStatus[prob.status]}, solution: {pl.LpSolution[prob.sol_status]}")
+
+        if prob.sol_status in (pl.LpSolutionOptimal, pl.LpSolutionIntegerFeasible):
+            qtd_r = np.array([v.varValue or 0.0 for v in qtd_var], dtype=float)
+            qtd = presolve.expandir(red, np.where(i_r, np.round(qtd_r), np.clip(qtd_r, 0, None)))
+            # com gap_rel o CBC também declara "ótimo" ao atingir o gap: vale como incumbente
+            provado = prob.sol_status == pl.LpSolutionOptimal and not gap_rel
+            nivel = "milp" if provado else "milp_incumbente"
+            if provado:
+                objetivo = gap_residual(precos, deficits, qtd)
+                # limite provado pelo CBC: objetivo - GAP_ABS (ou o limite trivial, se maior)
+                limite = max(objetivo - GAP_ABS, deficits.sum() - orcamento, 0.0)
+                gap = (objetivo - limite) / objetivo if objetivo > 1e-9 else 0.0
+                logger.debug(f"Solved at tier milp in {time.perf_counter() - t0:.3f}s")
+                return {"qtd": qtd, "nivel": nivel, "objetivo": objetivo,
+                        "limite_inferior": limite, "gap": gap,
+                        "tempo": time.perf_counter() - t0, "cache": False}
+
+    relax = resolver_relaxacao(p_r, d_r, i_r, orcamento, k_min, teto=teto, backend=backend)
+    limite = relax[1] + red["constante"] if relax else np.nan
+
+    if qtd is None and relax is not None:
+        if not aproximado:
+            logger.warning("MILP returned no incumbent, trying LP rounding heuristic")
+        qtd_r = arredondar_lp(p_r, d_r, i_r, orcamento, relax[0], k_min)
+        qtd = presolve.expandir(red, qtd_r) if qtd_r is not None else None
+        nivel = "lp_arredondado" if qtd is not None else None
+
+    if qtd is None:
+        logger.warning("LP rounding failed, falling back to deficit strategy")
+        qtd, nivel = alocar_deficit(precos, deficits, inteiro, orcamento), "deficit"
+
+    objetivo = gap_residual(precos, deficits, qtd)
+    gap = (objetivo - limite) / objetivo if objetivo > 1e-9 else 0.0
+    tempo = time.perf_counter() - t0
+    logger.info(f"Solved at tier {nivel} in {tempo:.3f}s (gap {gap:.2%})")
+    return {"qtd": qtd, "nivel": nivel, "objetivo": objetivo,
+            "limite_inferior": limite, "gap": max(gap, 0.0), "tempo": tempo,
+            "cache": False}
+
+
+def _ponto_inicial(red, inicial, qtd_var, gap_var, sel_var):
+    '''Carrega `inicial` (quantidades no problema original) como MIP start do
+    problema reduzido. Retorna False se a solução usa ativos fora dele.'''
+    inicial = np.asarray(inicial, dtype=float)
+    fora = np.ones(len(inicial), dtype=bool)
+    fora[red["mantidos"]] = False
+    if len(red["rf_agregada"]) or (inicial[fora] > 0).any():
+        return False
+    q = inicial[red["mantidos"]]
+    gaps = np.clip(red["deficits"] - red["precos"] * q, 0, None)
+    for i, v in enumerate(qtd_var):
+        v.setInitialValue(float(q[i]))
+        gap_var[i].setInitialValue(float(gaps[i]))
+        if sel_var:
+            sel_var[i].setInitialValue(1.0 if q[i] > 0 else 0.0)
+    return True
+
+
+def _herdar_solucao(precos, deficits, inteiro, orcamento, qtd, k):
+    '''
+    Adapta a solução ótima para k-1 ativos a k ativos: compra mínima nos ativos
+    livres mais baratos (com déficit primeiro), liberando valor da RF comprada
+    se faltar orçamento, e preenchimento guloso da sobra. None se não couber.
+    '''
+    qtd = np.asarray(qtd, dtype=float).copy()
+    faltam = int(k - (qtd > 0).sum())
+    if faltam > 0:
+        custo_min = np.where(inteiro, precos, 1.0)
+        livres = np.flatnonzero(qtd <= 0)
+        livres = livres[np.lexsort((custo_min[livres], deficits[livres] <= 0))][:faltam]
+        falta_caixa = custo_min[livres].sum() - (orcamento - float(precos @ qtd))
+        if falta_caixa > 0:
+            excesso = np.where(~inteiro & (qtd > 0), np.clip(precos * qtd - 1.0, 0, None), 0.0)
+            if excesso.sum() < falta_caixa + 1e-6:
+                return None
+            qtd -= np.where(excesso > 0, excesso * (falta_caixa / excesso.sum()) / precos, 0.0)
+    return arredondar_lp(precos, deficits, inteiro, orcamento, qtd, k)
+
+
+def fronteira_k_min(precos, deficits, inteiro, orcamento, k_max, k_inicial=1,
+                    tempo_limite=None, gap_rel=None):
+    '''
+    Curva gap residual × diversificação para k_min = k_inicial..k_max.
+
+    Cada k parte da solução de k-1 (o ótimo de k-1 é limite inferior de k, pois
+    a região viável só encolhe): se a solução herdada já empata com esse limite,
+    ela é ótima e o solver nem é chamado ("herdado"); senão vira MIP start do CBC.
+
+    Retorna lista de dicts (um por k) com `k_min`, `qtd`, `objetivo`, `n_ativos`,
+    `nivel`, `gap` e `tempo`.
+    '''
+    precos = np.asarray(precos, dtype=float)
+    deficits = np.asarray(deficits, dtype=float)
+    inteiro = np.asarray(inteiro, dtype=bool)
+    t0 = time.perf_counter()
+
+    curva, anterior = [], None
+    for k in range(k_inicial, k_max + 1):
+        tk = time.perf_counter()
+        inicial = None
+        if anterior is not None:
+            inicial = _herdar_solucao(precos, deficits, inteiro, orcamento, anterior["qtd"], k)
+
+        provado = anterior is not None and anterior["nivel"] in ("milp", "herdado") and not gap_rel
+        # ótimo de k-1 (a menos de GAP_ABS) limita por baixo o de k, que é mais restrito
+        limite = anterior["limite_inferior"] if provado else None
+        if inicial is not None and limite is not None and gap_residual(precos, deficits, inicial) <= limite + GAP_ABS:
+            objetivo = gap_residual(precos, deficits, inicial)
+            res = {"qtd": inicial, "nivel": "herdado", "objetivo": objetivo, "limite_inferior": limite,
+                   "gap": (objetivo - limite) / objetivo if objetivo > 1e-9 else 0.0}
+        else:
+            res = _resolver_cascata(precos, deficits, inteiro, orcamento, k, tempo_limite, gap_rel, inicial=inicial)
+
+        n_ativos = int((res["qtd"] > 0).sum())
+        ponto = {"k_min": k, "qtd": res["qtd"], "objetivo": res["objetivo"], "n_ativos": n_ativos,
+                 "nivel": res["nivel"], "gap": res["gap"], "tempo": time.perf_counter() - tk}
+        logger.debug(f"Frontier k_min={k}: objective {ponto['objetivo']:,.2f}, {n_ativos} assets, "
+                     f"tier {ponto['nivel']} ({ponto['tempo']:.3f}s)")
+        curva.append(ponto)
+        if n_ativos < k:
+            logger.warning(f"k_min={k} infeasible for this budget, stopping frontier")
+            break
+        anterior = ponto
+
+    herdados = sum(p["nivel"] == "herdado" for p in curva)
+    logger.info(f"k_min frontier: {len(curva)} points in {time.perf_counter() - t0:.3f}s "
+                f"({herdados} inherited without solving)")
+    return curva
+
+
+def _repartir_k_min(k_min, orcamentos, tamanhos):
+    '''Cardinalidade mínima por grupo, proporcional ao orçamento do grupo.'''
+    k = np.zeros(len(orcamentos), dtype=int)
+    if not k_min or orcamentos.sum() <= 0:
+        return k
+    k = np.minimum(np.ceil(k_min * orcamentos / orcamentos.sum()).astype(int), tamanhos)
+    k[orcamentos <= 0] = 0
+    for g in np.argsort(-orcamentos):          # completa onde ainda há ativos livres
+        if k.sum() >= k_min:
+            break
+        k[g] = min(tamanhos[g], k[g] + (k_min - k.sum()))
+    return k
+
+
+def resolver_decomposto(precos, deficits, inteiro, orcamento, grupos, k_min=None,
+                        tempo_limite=None, gap_rel=None, cache=CACHE_PADRAO, max_workers=None):
+    '''
+    Decomposição hierárquica para universos grandes:
+
+    1. reparte o aporte entre os grupos (ex.: Classe ou Subclasses)
+       proporcionalmente ao déficit de cada grupo;
+    2. resolve um subproblema independente por grupo, em paralelo
+       (cada um com a cascata de `resolver`);
+    3. redistribui as sobras dos grupos de forma gulosa nos gaps restantes.
+
+    Retorna o mesmo dict de `resolver` (nivel="decomposto"), onde `limite_inferior`
+    é o limite max(soma(d) - A, 0) do modelo plano e `perda_max` limita a perda
+    frente ao ótimo plano: objetivo - ótimo_plano <= perda_max. A solução sempre
+    respeita `k_min`: se as compras mínimas não cabem na sobra, o resultado vem
+    do modelo plano (nivel da cascata de `resolver`).
+    '''
+    t0 = time.perf_counter()
+    precos = np.asarray(precos, dtype=float)
+    deficits = np.asarray(deficits, dtype=float)
+    inteiro = np.asarray(inteiro, dtype=bool)
+    rotulos, codigo = np.unique(np.asarray(grupos).astype(str), return_inverse=True)
+
+    deficit_g = np.bincount(codigo, weights=deficits, minlength=len(rotulos))
+    tamanho_g = np.bincount(codigo, minlength=len(rotulos))
+    total = deficit_g.sum()
+    orcamento_g = deficit_g / total * min(orcamento, total) if total > 0 else np.zeros(len(rotulos))
+    k_g = _repartir_k_min(k_min, orcamento_g, tamanho_g)
+    logger.info(f"Decomposed solve: {len(precos)} assets in {len(rotulos)} groups")
+
+    qtd = np.zeros(len(precos))
+    niveis = {}
+    tarefas = [g for g in range(len(rotulos)) if orcamento_g[g] > 0]
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        futuros = {
+            g: ex.submit(resolver, precos[codigo == g], deficits[codigo == g], inteiro[codigo == g],
+                         orcamento_g[g], int(k_g[g]) or None, tempo_limite, gap_rel, cache)
+            for g in tarefas
+        }
+        for g, fut in futuros.items():
+            res_g = fut.result()
+            qtd[codigo == g] = res_g["qtd"]
+            niveis[rotulos[g]] = res_g["nivel"]
+            logger.debug(f"Group {rotulos[g]}: budget R$ {orcamento_g[g]:,.2f}, k={k_g[g]}, tier {res_g['nivel']}")
+
+    sobra = orcamento - float(precos @ qtd)
+    qtd, sobra = _preencher_guloso(precos, deficits, inteiro, qtd, sobra)
+
+    # grupos sem déficit ou pequenos demais deixam a soma dos k por grupo abaixo de k_min:
+    # completa com compras mínimas na sobra ou, se não couber, resolve o modelo plano
+    if k_min and (qtd > 0).sum() < k_min:
+        completo = _completar_k_min(precos, deficits, inteiro, qtd, sobra, k_min)
+        if completo is None:
+            logger.warning(f"Decomposed solution buys {(qtd > 0).sum()} assets, below k_min={k_min}; "
+                           f"falling back to the flat model")
+            res = resolver(precos, deficits, inteiro, orcamento, k_min, tempo_limite, gap_rel, cache)
+            return {**res, "tempo": time.perf_counter() - t0}
+        qtd, sobra = completo
+        logger.debug(f"Decomposed solution completed to k_min={k_min} with minimum purchases")
+
+    objetivo = gap_residual(precos, deficits, qtd)
+    limite = max(deficits.sum() - orcamento, 0.0)
+    tempo = time.perf_counter() - t0
+    perda = max(objetivo - limite, 0.0)
+    gap = perda / objetivo if objetivo > 1e-9 else 0.0
+    logger.info(f"Decomposed solve finished in {tempo:.3f}s, loss bound vs flat model R$ {perda:,.2f} ({gap:.2%})")
+    return {"qtd": qtd, "nivel": "decomposto", "objetivo": objetivo, "limite_inferior": limite,
+            "gap": gap, "perda_max": perda, "niveis_grupos": niveis,
+            "tempo": tempo, "cache": False}
+
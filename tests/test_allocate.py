@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import allocate
+from src.ativos import mascara_inteiro
+
+
+def _carteira(semente, n=12):
+    """Posição sintética: 1/3 RF (com IMAB11 em cotas inteiras), resto RV; déficits sem empates."""
+    rng = np.random.default_rng(semente)
+    classe = np.where(np.arange(n) < n // 3, "RF", "RV")
+    ticker = [f"T{i:02d}" for i in range(n)]
+    ticker[0] = "IMAB11"
+    cot = np.where(classe == "RF", 1.0, rng.uniform(8, 120, n))
+    cot[0] = rng.uniform(80, 100)
+    qtd = rng.integers(0, 40, n) * np.where(classe == "RF", 100, 1)
+    pesos = rng.dirichlet(np.ones(n))
+    return pd.DataFrame({
+        "Geo.": "BR", "Classe": classe, "Subclasses": classe, "Ativo": ticker, "Ticker": ticker,
+        "Qnt.": qtd.astype(float), "Cotação": cot, "Total": qtd * cot, "% Ideal - Ref.": pesos,
+    })
+
+
+def test_lote_igual_a_otimiza_aporte_por_cenario():
+    cenarios = [_carteira(s) for s in range(5)]
+    aportes = np.array([500.0, 2500.0, 2500.0, 7000.0, 120.0])
+
+    lote = allocate.otimiza_aporte_lote(
+        np.stack([c["Qnt."] for c in cenarios]), np.stack([c["Cotação"] for c in cenarios]),
+        np.stack([c["% Ideal - Ref."] for c in cenarios]), aportes,
+        np.stack([mascara_inteiro(c["Classe"], c["Ticker"]) for c in cenarios]),
+        elegivel=np.stack([c["Classe"] != "RF" for c in cenarios]),
+    )
+
+    for b, (df, aporte) in enumerate(zip(cenarios, aportes)):
+        base, sobra = allocate.otimiza_aporte(df, valor_aporte=aporte)
+        base = base.set_index("Ticker").loc[df["Ticker"]]
+        np.testing.assert_allclose(lote["qtd_comprar"][b], base["Qtd_nec"], atol=1e-9)
+        np.testing.assert_allclose(lote["custo_real"][b], base["Custo_real"], atol=1e-6)
+        assert lote["sobra"][b] == pytest.approx(sobra, abs=1e-6)
+
+
+def test_lote_aceita_ativos_comuns_e_aporte_escalar():
+    df = _carteira(7)
+    inteiro = mascara_inteiro(df["Classe"], df["Ticker"])
+    qtd = np.stack([df["Qnt."], df["Qnt."] * 2])
+
+    res = allocate.otimiza_aporte_lote(qtd, df["Cotação"], df["% Ideal - Ref."], 3000.0, inteiro)
+
+    assert res["qtd_comprar"].shape == qtd.shape
+    np.testing.assert_allclose(res["custo_real"].sum(axis=1) + res["sobra"], 3000.0)
+    assert (res["qtd_comprar"][:, inteiro] == np.floor(res["qtd_comprar"][:, inteiro])).all()
+
+
+def test_projecao_segue_o_rateio_do_lote():
+    df = _carteira(3)
+    aportes = [0.0, 1000.0, 50000.0]
+    proj = allocate.projetar_convergencia(df, aportes, tolerancia_pp=[10.0, 50.0], meses=60, nivel=None)
+    conv, drift = proj["convergencia"], proj["drift"]
+
+    # mês 1 = um aporte fracionado de otimiza_aporte_lote sobre os valores (preço 1)
+    lote = allocate.otimiza_aporte_lote(np.tile(df["Total"], (3, 1)), 1.0, df["% Ideal - Ref."], np.array(aportes), False)
+    valores = df["Total"].to_numpy() + lote["custo_real"]
+    pesos = df["% Ideal - Ref."].to_numpy()
+    esperado = np.abs(valores / valores.sum(axis=1, keepdims=True) - pesos).max(axis=1) * 100
+    np.testing.assert_allclose(drift.loc[1], esperado)
+
+    assert drift.shape == (61, 3)
+    np.testing.assert_allclose(drift.loc[0], conv["drift_inicial_pp"])
+    np.testing.assert_allclose(drift[0.0], drift.loc[0, 0.0])             # sem aporte nem retorno, parado
+    assert drift[50000.0].iloc[-1] < drift[1000.0].iloc[-1] < drift[0.0].iloc[-1]
+    assert conv["meses_50pp"].notna().sum() == 1                          # só o maior aporte converge
+    for tol in (10.0, 50.0):
+        dentro = drift.le(tol)
+        esperado = [dentro.index[dentro[a]].min() if dentro[a].any() else np.nan for a in aportes]
+        np.testing.assert_array_equal(conv[f"meses_{tol:g}pp"], esperado)
+
+
+def test_projecao_retornos_por_classe():
+    df = _carteira(4)
+    proj = allocate.projetar_convergencia(df, 0.0, meses=12, retornos={"RF": 0.10, "RV": 0.0})
+    valores = df["Total"].to_numpy() * np.where(df["Classe"] == "RF", 1.10, 1.0)
+    rf = valores[df["Classe"] == "RF"].sum() / valores.sum()
+    alvo_rf = df.loc[df["Classe"] == "RF", "% Ideal - Ref."].sum()
+    assert proj["drift"].iloc[-1, 0] == pytest.approx(abs(rf - alvo_rf) * 100)
+
+    with pytest.raises(ValueError, match="Sem retorno"):
+        allocate.projetar_convergencia(df, 100.0, retornos={"RF": 0.1})
+    with pytest.raises(ValueError, match="não negativos"):
+        allocate.projetar_convergencia(df, [-1.0])
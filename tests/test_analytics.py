@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import analytics
+
+
+def _backtest(periodos=24, aporte=1000.0, crescimento=(0.01, 0.02), semente=0):
+    """Resultado sintético no formato de PortfolioSimulator.simular (2 estratégias, 2 classes)."""
+    rng = np.random.default_rng(semente)
+    datas = pd.date_range("2023-01-31", periods=periodos, freq="ME")
+    linhas, valor = [], np.array([10000.0, 10000.0])
+    deficit = np.array([5000.0, 5000.0])
+    for i, dt in enumerate(datas):
+        g = np.asarray(crescimento) if semente is None else np.asarray(crescimento) + rng.normal(0, 0.01, 2)
+        valor = valor * (1 + g) + aporte
+        deficit = deficit - rng.uniform(-50, 300, 2)
+        linha = {"mes": i + 1, "data": dt, "investido": 10000.0 + aporte * (i + 1)}
+        for s, v, d in zip(("def", "po"), valor, deficit):
+            drift = rng.normal(0, 2)
+            linha.update({f"valor_{s}": v, f"deficit_{s}": d, f"rent_{s}_corr": v / linha["investido"] * 100 - 100,
+                          f"drift_RF_{s}": drift, f"drift_RV_{s}": -drift})
+        linhas.append(linha)
+    return pd.DataFrame(linhas)
+
+
+def test_cagr_ignora_o_primeiro_periodo():
+    df = _backtest(crescimento=(0.01, 0.02), semente=None)
+    res = analytics.resumo(df, aporte=1000.0)
+
+    assert res.loc[("base", "def"), "cagr"] == pytest.approx(1.01 ** 12 - 1)
+    assert res.loc[("base", "po"), "cagr"] == pytest.approx(1.02 ** 12 - 1)
+    assert res["volatilidade"].abs().max() < 1e-9
+    assert (res["periodos"] == 24).all()
+
+
+@pytest.mark.parametrize("aporte", [None, 1000.0])
+def test_incremental_igual_ao_resumo(aporte):
+    df = _backtest()
+    esperado = analytics.resumo(df, aporte=aporte)
+
+    inc = analytics.DesempenhoIncremental(aporte=aporte)
+    for linha in df.to_dict("records"):
+        inc.atualizar(linha)
+
+    pd.testing.assert_frame_equal(inc.resumo(), esperado, rtol=1e-9)
+
+
+def test_resumo_varios_cenarios():
+    res = analytics.resumo({"a": _backtest(semente=1), "b": _backtest(periodos=12, semente=2)})
+    assert res.loc[("b", "po"), "periodos"] == 12
+    assert res.loc[("a", "po"), "cagr"] == pytest.approx(analytics.resumo(_backtest(semente=1)).loc[("base", "po"), "cagr"])
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from src.ativos import CadastroAtivos
+
+
+def _posicao():
+    return pd.DataFrame({
+        "Geo.":       ["BR",    "BR",     "BR",     "BR",    "US",   "BR",    "EU"],
+        "Classe":     ["RF",    "RF",     "RF",     "RV",    "RV",   "RV",    "RV"],
+        "Subclasses": ["Pos",   "Infl",   "Pos",    "Acoes", "ETF",  "Acoes", "Acoes"],
+        "Ativo":      ["Selic", "IMA-B",  "CDB X",  "Petro", "SPY",  "Petro", "Bund"],
+        "Ticker":     ["SELIC", "IMAB11", "CDBX",   "PETR4", "SPY",  "PETR4", "BUND"],
+        "Indexador":  [None,    None,     "cdi",    None,    None,   None,    None],
+    })
+
+
+def test_mascaras_por_linha():
+    cad = CadastroAtivos(_posicao())
+    np.testing.assert_array_equal(cad.ids, np.arange(7))
+    # RF fracionada, exceto IMAB11 (cotas inteiras como a RV)
+    np.testing.assert_array_equal(cad.inteiro, [False, True, False, True, True, True, True])
+    np.testing.assert_array_equal(cad.caixa, [True, False, False, False, False, False, False])
+    np.testing.assert_array_equal(cad.linhas("PETR4"), [3, 5])
+
+
+def test_fonte_simbolo_e_moeda_por_ticker():
+    cad = CadastroAtivos(_posicao())
+    fonte = pd.Series(np.asarray(cad.fonte), index=cad.tickers)
+    assert fonte.to_dict() == {"BUND": "nenhuma", "CDBX": "cdi", "IMAB11": "yahoo", "PETR4": "yahoo",
+                               "SELIC": "selic", "SPY": "yahoo"}
+    np.testing.assert_array_equal(cad.mascara_fonte("yahoo"), (fonte == "yahoo").to_numpy())
+    assert cad.simbolo.dropna().to_dict() == {"IMAB11": "IMAB11.SA", "PETR4": "PETR4.SA", "SPY": "SPY"}
+    assert cad.moeda.dropna().to_dict() == {"SPY": "USD"}
+    # RF calculada pelo motor: só as linhas com fonte de índice, série = ticker
+    assert cad.rf["indexador"].to_dict() == {0: "SELIC", 2: "CDI"}
+    np.testing.assert_array_equal(cad.serie, ["SELIC", "IMAB11", "CDBX", "PETR4", "SPY", "PETR4", "BUND"])
+
+
+def test_codigos_e_matriz_de_categorias():
+    df = _posicao()
+    cad = CadastroAtivos(df)
+    m = cad.matriz("Classe")
+    assert m.shape == (7, 2) and (m.sum(axis=1) == 1).all()
+    np.testing.assert_array_equal(np.asarray(cad.classe.categories)[cad.codigos("Classe")], df["Classe"])
+    assert cad.id_ticker("SPY") == list(cad.tickers).index("SPY")
@@ -0,0 +1,97 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from src import solver
+from src.cache import CacheSolve
+
+
+def _problema():
+    rng = np.random.default_rng(2)
+    precos = rng.uniform(5, 80, 20)
+    deficits = rng.uniform(0, 400, 20)
+    inteiro = rng.random(20) < 0.7
+    return precos, deficits, inteiro, 2500.0
+
+
+def test_acerto_equivale_ao_solve(tmp_path):
+    precos, deficits, inteiro, orcamento = _problema()
+    direto = solver.resolver(precos, deficits, inteiro, orcamento, k_min=5, cache=None)
+
+    cache = CacheSolve(diretorio=tmp_path)
+    primeiro = solver.resolver(precos, deficits, inteiro, orcamento, k_min=5, cache=cache)
+    memoria = solver.resolver(precos, deficits, inteiro, orcamento, k_min=5, cache=cache)
+    disco = solver.resolver(precos, deficits, inteiro, orcamento, k_min=5, cache=CacheSolve(diretorio=tmp_path))
+
+    assert not primeiro["cache"] and memoria["cache"] and disco["cache"]
+    for res in (primeiro, memoria, disco):
+        np.testing.assert_array_equal(res["qtd"], direto["qtd"])
+        assert res["nivel"] == direto["nivel"]
+        assert abs(res["objetivo"] - direto["objetivo"]) <= solver.GAP_ABS
+
+
+def test_misses_concorrentes_resolvem_uma_vez(monkeypatch):
+    precos, deficits, inteiro, orcamento = _problema()
+    cascata = solver._resolver_cascata
+    chamadas = []
+
+    def lento(*args, **kwargs):
+        chamadas.append(1)
+        time.sleep(0.2)
+        return cascata(*args, **kwargs)
+
+    monkeypatch.setattr(solver, "_resolver_cascata", lento)
+    cache = CacheSolve()
+    resultados = [None] * 4
+
+    def rodar(i):
+        resultados[i] = solver.resolver(precos, deficits, inteiro, orcamento, cache=cache)
+
+    threads = [threading.Thread(target=rodar, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(chamadas) == 1
+    assert sum(not r["cache"] for r in resultados) == 1
+    stats = cache.estatisticas()
+    assert (stats["misses"], stats["hits_memoria"], stats["esperas"]) == (1, 3, 3)
+    for r in resultados:
+        np.testing.assert_array_equal(r["qtd"], resultados[0]["qtd"])
+
+
+def test_falha_no_solve_libera_a_chave():
+    cache = CacheSolve()
+
+    def falha():
+        raise RuntimeError("solver caiu")
+
+    with pytest.raises(RuntimeError):
+        cache.obter_ou_calcular("k", falha)
+    res, do_cache = cache.obter_ou_calcular("k", lambda: {"qtd": np.zeros(2)})
+    assert not do_cache
+    assert cache.obter_ou_calcular("k", falha)[1]
+
+
+def test_gravacoes_concorrentes_no_disco(tmp_path):
+    cache = CacheSolve(diretorio=tmp_path, max_bytes_disco=4000)
+    res = {"qtd": np.arange(50, dtype=float), "nivel": "milp", "objetivo": 1.0}
+
+    def gravar(i):
+        for j in range(20):
+            cache.guardar(f"k{(i + j) % 8}", res)
+
+    threads = [threading.Thread(target=gravar, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not list(tmp_path.glob(".*"))                # nenhum temporário sobrando
+    assert sum(a.stat().st_size for a in tmp_path.glob("*.npz")) <= 4000
+    cache.limpar()
+    assert cache.estatisticas()["itens_memoria"] == 0
+    assert cache.obter("k0") is None
@@ -0,0 +1,44 @@
+import numpy as np
+
+from src import solver
+from src.corpus import CorpusProblemas, reexecutar
+
+
+def _problema():
+    rng = np.random.default_rng(4)
+    precos = rng.uniform(5, 80, 24)
+    deficits = rng.uniform(0, 600, 24)
+    inteiro = rng.random(24) < 0.7
+    grupos = np.where(inteiro, np.where(rng.random(24) < 0.5, "RV1", "RV2"), "RF")
+    return precos, deficits, inteiro, grupos, 3000.0
+
+
+def test_replay_usa_o_algoritmo_capturado(tmp_path):
+    precos, deficits, inteiro, grupos, orcamento = _problema()
+    corpus = CorpusProblemas(tmp_path)
+    plano = solver.resolver(precos, deficits, inteiro, orcamento, k_min=3, cache=None)
+    decomposto = solver.resolver_decomposto(precos, deficits, inteiro, orcamento, grupos, k_min=3, cache=None)
+    corpus.registrar(precos, deficits, inteiro, orcamento, 3, plano, mes=1)
+    corpus.registrar(precos, deficits, inteiro, orcamento, 3, decomposto, grupos=grupos, mes=2, decompor="Classe")
+    # vencido por uma configuração plana na corrida: replay plano
+    corpus.registrar(precos, deficits, inteiro, orcamento, 3, plano, grupos=grupos, mes=3, decompor="Classe",
+                     vencedor="cbc_presolve")
+
+    df = reexecutar(corpus)
+
+    assert df["algoritmo"].tolist() == ["plano", "decomposto", "plano"]
+    assert df["nivel"].tolist() == [plano["nivel"], decomposto["nivel"], plano["nivel"]]
+    assert (df["dif_objetivo"].abs() <= solver.GAP_ABS).all()
+    assert not df["pulado"].any()
+
+
+def test_replay_pula_decomposto_sem_grupos(tmp_path):
+    precos, deficits, inteiro, grupos, orcamento = _problema()
+    corpus = CorpusProblemas(tmp_path)
+    res = solver.resolver_decomposto(precos, deficits, inteiro, orcamento, grupos, cache=None)
+    corpus.registrar(precos, deficits, inteiro, orcamento, None, res, decompor="Classe")
+
+    df = reexecutar(corpus)
+
+    assert df["pulado"].tolist() == [True]
+    assert df["objetivo"].isna().all()
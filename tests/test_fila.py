@@ -0,0 +1,50 @@
+import numpy as np
+
+from src import fila
+from src.fila import CONCLUIDO, EXECUTANDO, FALHOU, PENDENTE, FilaJobs
+
+
+def test_deduplica_jobs_numericamente_iguais(tmp_path):
+    f = FilaJobs(tmp_path / "fila.db")
+    jid, novo = f.enfileirar({"valor_aporte_mensal": 5000, "k_min_po": 4}, "snap")
+    jid2, novo2 = f.enfileirar({"valor_aporte_mensal": 5000.0, "k_min_po": np.int64(4)}, "snap")
+    assert novo and not novo2 and jid == jid2
+    assert f.enfileirar({"valor_aporte_mensal": 5000.5}, "snap")[1]
+
+
+def test_reserva_exclusiva_e_conclusao(tmp_path):
+    f = FilaJobs(tmp_path / "fila.db")
+    jid, _ = f.enfileirar({"k_min_po": 3}, "snap")
+    job = f.reservar("w1")
+    assert job["id"] == jid and job["tentativa"] == 1
+    assert f.reservar("w2") is None
+    assert not f.concluir(jid, "x", "w2")          # não detém a reserva
+    assert f.concluir(jid, "ok", "w1")
+    assert f.estatisticas()[CONCLUIDO] == 1
+
+
+def test_falha_repete_ate_max_tentativas(tmp_path):
+    f = FilaJobs(tmp_path / "fila.db")
+    jid, _ = f.enfileirar({"k_min_po": 3}, "snap", max_tentativas=2)
+    assert f.falhar(f.reservar("w1")["id"], "erro", "w1") == PENDENTE
+    assert f.falhar(f.reservar("w1")["id"], "erro", "w1") == FALHOU
+    assert f.reservar("w1") is None
+    assert f.reenfileirar_falhas() == 1
+    assert f.reservar("w1")["tentativa"] == 1
+
+
+def test_lease_vencido_reclama_e_respeita_tentativas(tmp_path):
+    f = FilaJobs(tmp_path / "fila.db", lease=0.0)
+    jid, _ = f.enfileirar({"k_min_po": 3}, "snap", max_tentativas=2)
+    assert f.reservar("w1")["tentativa"] == 1
+    job = f.reservar("w2")                         # w1 "morreu": lease vencido
+    assert job["id"] == jid and job["tentativa"] == 2
+    assert not f.concluir(jid, "velho", "w1")      # reserva perdida não sobrescreve
+    assert f.falhar(jid, "erro", "w1") is None
+    # w2 também morre: sem tentativas restantes o job não volta mais
+    assert f.reservar("w3") is None
+    assert f.estatisticas() == {PENDENTE: 0, EXECUTANDO: 0, CONCLUIDO: 0, FALHOU: 1}
+
+
+def test_id_job_canonico():
+    assert fila.id_job({"a": 1, "b": 2}, "s") == fila.id_job({"b": 2, "a": 1}, "s")
@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+
+from src import logger as eventos
+
+
+@pytest.fixture
+def sink(tmp_path):
+    arq = tmp_path / "eventos_teste.jsonl"
+    yield eventos.start_events(arq, run_id="r1", origem="teste")
+    eventos.stop_events()
+
+
+def test_eventos_ida_e_volta(sink, tmp_path):
+    eventos.set_event_context(month=3, date="2025-01-31")
+    eventos.emit_event("solve_end", tier="milp", objective=12.5, gap=0.0, seconds=0.1, cached=False)
+    eventos.set_event_context(month=None)
+    eventos.emit_event("leftover_sweep", month=4, strategy="PO", ticker="SELIC", value=10.0)
+    eventos.stop_events()
+
+    df = eventos.read_events(tmp_path)
+    assert df["event"].tolist() == ["run_start", "solve_end", "leftover_sweep", "run_end"]
+    assert (df["run"] == "r1").all()
+    assert df.loc[0, "origem"] == "teste"
+    solve = eventos.read_events(sink.path, event="solve_end").iloc[0]
+    assert solve["tier"] == "milp" and solve["month"] == 3 and solve["objective"] == 12.5
+    assert df.loc[2, "month"] == 4 and df.loc[2, "date"] == pd.Timestamp("2025-01-31")
+
+
+def test_evento_sem_campo_obrigatorio(sink):
+    with pytest.raises(ValueError):
+        eventos.emit_event("trade", month=1, strategy="PO")
+    with pytest.raises(ValueError):
+        eventos.emit_event("desconhecido")
+
+
+def test_sem_sink_nao_grava(tmp_path):
+    assert not eventos.events_enabled()
+    eventos.emit_event("run_start")
+    assert eventos.read_events(tmp_path).empty
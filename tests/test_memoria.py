@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.memoria import LivroAportes
+from src.simulator import PortfolioSimulator
+from src.utils import load_position
+
+
+def _lote(i, n=3):
+    return {"Mes": i, "Ticker": np.array([f"T{j}" for j in range(n)], dtype=object),
+            "Valor": np.arange(n) + 10.0 * i, "Nivel": None if i % 2 else "milp"}
+
+
+def test_livro_fatias_entre_blocos_e_disco(tmp_path):
+    livro = LivroAportes(tamanho_bloco=4, diretorio=tmp_path, float32=("Valor",))
+    for i in range(5):
+        livro.anexar(_lote(i))
+    assert len(livro) == 15
+    assert livro.despejar() == 3 and len(list(tmp_path.glob("*.pkl"))) == 3
+
+    livro.anexar(_lote(5))
+    df = livro.para_frame()
+    assert len(df) == 18 and df["Valor"].dtype == np.float32
+    assert isinstance(df["Ticker"].dtype, pd.CategoricalDtype)
+    np.testing.assert_array_equal(df["Mes"], np.repeat(np.arange(6), 3))
+    fatia = livro.fatia(5, 16)                           # cruza blocos em disco e pendentes
+    pd.testing.assert_frame_equal(fatia.astype({"Ticker": str, "Nivel": object}),
+                                  df.iloc[5:16].reset_index(drop=True).astype({"Ticker": str, "Nivel": object}))
+
+
+@pytest.fixture(scope="module")
+def posicao_dados():
+    posicao = load_position()
+    rng = np.random.default_rng(5)
+    idx = pd.bdate_range("2024-06-01", "2025-05-01")
+    dados = {tk: pd.Series(np.cumprod(1 + rng.normal(3e-4, 0.01, len(idx))) * (1 if sym is None else 40), index=idx)
+             for tk, sym in PortfolioSimulator(posicao).mapear_tickers().items()}
+    return posicao, dados
+
+
+def test_memoria_reduzida_mesmo_resultado(posicao_dados, tmp_path):
+    posicao, dados = posicao_dados
+    normal = PortfolioSimulator(posicao, 5000, dados_mercado=dados, cache_solve=None)
+    esperado = normal.simular(meses=4, data_fim_str="2025-04-01")
+
+    reduzido = PortfolioSimulator(posicao, 5000, dados_mercado=dados, cache_solve=None, memoria_reduzida=True,
+                                  limite_memoria=1, dir_spill=tmp_path)
+    obtido = reduzido.simular(meses=4, data_fim_str="2025-04-01")
+
+    pd.testing.assert_frame_equal(obtido, esperado)
+    assert list(tmp_path.glob("aportes_*.pkl"))           # limite estourado: histórico despejado
+    a, b = reduzido.obter_df_aportes(), normal.obter_df_aportes()
+    assert a["Pct_Atual"].dtype == np.float32 and isinstance(a["Ticker"].dtype, pd.CategoricalDtype)
+    pd.testing.assert_frame_equal(a, b, check_dtype=False, check_categorical=False, rtol=1e-6)
+    assert set(reduzido.relatorio_memoria()["fase"]) >= {"dados", "painel", "estrategia_def", "estrategia_po"}
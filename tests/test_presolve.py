@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from src import presolve, solver
+
+
+def _problema(semente, n=25):
+    rng = np.random.default_rng(semente)
+    precos = rng.uniform(5, 300, n)
+    deficits = np.where(rng.random(n) < 0.3, 0.0, rng.uniform(0, 2000, n))
+    inteiro = rng.random(n) < 0.7
+    return precos, deficits, inteiro
+
+
+@pytest.mark.parametrize("semente", range(4))
+@pytest.mark.parametrize("orcamento", [150.0, 3000.0, 20000.0])
+@pytest.mark.parametrize("k_min", [None, 6])
+def test_presolve_mantem_objetivo(semente, orcamento, k_min):
+    precos, deficits, inteiro = _problema(semente)
+    plano = solver.resolver(precos, deficits, inteiro, orcamento, k_min=k_min, cache=None, usar_presolve=False)
+    reduzido = solver.resolver(precos, deficits, inteiro, orcamento, k_min=k_min, cache=None)
+
+    assert reduzido["objetivo"] == pytest.approx(plano["objetivo"], abs=solver.GAP_ABS)
+    assert precos @ reduzido["qtd"] <= orcamento + 1e-6
+    if k_min and plano["nivel"] == "milp":
+        assert (reduzido["qtd"] > 0).sum() >= k_min
+
+
+def test_expandir_volta_ao_tamanho_original():
+    precos, deficits, inteiro = _problema(0)
+    red = presolve.reduzir(precos, deficits, inteiro, 3000.0)
+    assert len(red["precos"]) < len(precos)
+
+    qtd = presolve.expandir(red, np.ones(len(red["precos"])))
+    assert qtd.shape == precos.shape
+    assert (qtd[deficits <= 0] == 0).all()
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import renda_fixa
+from src.ativos import CadastroAtivos
+
+INICIO, FIM = pd.Timestamp("2024-01-01"), pd.Timestamp("2024-06-30")
+
+
+def _indices():
+    rng = np.random.default_rng(3)
+    uteis = pd.bdate_range(INICIO, FIM)
+    meses = pd.date_range(INICIO, FIM, freq="ME")
+    return {"SELIC": pd.Series(np.cumprod(1 + rng.uniform(3e-4, 5e-4, len(uteis))), index=uteis),
+            "CDI": pd.Series(np.cumprod(1 + rng.uniform(3e-4, 5e-4, len(uteis))), index=uteis),
+            "IPCA": pd.Series(np.cumprod(1 + rng.uniform(0, 8e-3, len(meses))), index=meses)}
+
+
+def _posicao(**extra):
+    df = pd.DataFrame({"Geo.": "BR", "Classe": "RF", "Subclasses": "RF",
+                       "Ativo": ["Selic", "CDB IPCA", "CDB Pre", "Previdencia"],
+                       "Ticker": ["SELIC", "CDBI", "PRE", "PGBL"]})
+    return df.assign(**extra)
+
+
+def _fator_fixo_antigo(taxa):
+    """Caminho anterior, por ticker: (1 + taxa)^(k/252) nos dias úteis da janela."""
+    idx = pd.bdate_range(INICIO, FIM)
+    return pd.Series((1 + taxa) ** (np.arange(1, len(idx) + 1) / 252), index=idx)
+
+
+def test_fatores_iguais_ao_caminho_por_ticker():
+    indices = _indices()
+    fatores = renda_fixa.fatores(CadastroAtivos(_posicao()).rf, indices, INICIO, FIM)
+
+    antigos = {"SELIC": indices["SELIC"], "CDBI": indices["IPCA"],
+               "PRE": _fator_fixo_antigo(0.09), "PGBL": _fator_fixo_antigo(0.07)}
+    assert set(fatores) == set(antigos)
+    for tk, antigo in antigos.items():
+        np.testing.assert_allclose(fatores[tk].reindex(antigo.index), antigo, rtol=1e-12, err_msg=tk)
+
+
+def test_parametros_informados_por_titulo():
+    indices = _indices()
+    df = _posicao(Indexador=["CDI", None, None, None], **{"% Indexador": [110, None, None, None],
+                                                          "Taxa a.a.": [None, 6.0, 12.0, None]})
+    fatores = renda_fixa.fatores(CadastroAtivos(df).rf, indices, INICIO, FIM)
+
+    cdi = indices["CDI"]
+    np.testing.assert_allclose(fatores["SELIC"][cdi.index], np.cumprod(1 + 1.1 * cdi.pct_change().fillna(cdi.iloc[0] - 1)))
+    ipca = indices["IPCA"]
+    du = np.array([len(pd.bdate_range(INICIO, d)) for d in ipca.index])
+    np.testing.assert_allclose(fatores["CDBI"][ipca.index], ipca * 1.06 ** (du / 252))
+    assert fatores["PRE"].iloc[-1] == pytest.approx(1.12 ** (len(pd.bdate_range(INICIO, FIM)) / 252))
+
+
+def test_indice_ausente_fica_de_fora():
+    indices = _indices()
+    del indices["IPCA"]
+    fatores = renda_fixa.fatores(CadastroAtivos(_posicao()).rf, indices, INICIO, FIM)
+    assert "CDBI" not in fatores and {"SELIC", "PRE", "PGBL"} <= set(fatores)
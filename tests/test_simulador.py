@@ -0,0 +1,222 @@
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.simulator import PortfolioSimulator
+from src.utils import load_position
+
+
+@pytest.fixture(scope="module")
+def posicao():
+    return load_position()
+
+
+@pytest.fixture(scope="module")
+def dados(posicao):
+    """Séries sintéticas p/ todos os tickers da posição (RF como fator acumulado)."""
+    rng = np.random.default_rng(0)
+    idx = pd.bdate_range("2023-01-01", "2025-05-01")
+    dados = {}
+    for tk, sym in PortfolioSimulator(posicao).mapear_tickers().items():
+        if sym is None:
+            dados[tk] = pd.Series(np.cumprod(np.full(len(idx), 1.0004)), index=idx)
+        else:
+            dados[tk] = pd.Series(rng.uniform(10, 100) * np.cumprod(1 + rng.normal(3e-4, 0.01, len(idx))), index=idx)
+    return dados
+
+
+def test_armazem_acerto_nao_coleta(posicao, dados, tmp_path, monkeypatch):
+    sim = PortfolioSimulator(posicao, 5000, dados_mercado=dados, cache_solve=None, armazem_resultados=tmp_path)
+    esperado = sim.simular(meses=4, data_fim_str="2025-04-01")
+
+    def coletar(*args, **kwargs):
+        raise AssertionError("acerto do armazém não deve coletar séries")
+
+    sim = PortfolioSimulator(posicao, 5000, dados_mercado=dados, cache_solve=None, armazem_resultados=tmp_path)
+    monkeypatch.setattr(sim, "obter_dados_historicos", coletar)
+    obtido = sim.simular(meses=4, data_fim_str="2025-04-01")
+
+    assert sim.armazem_resultados.hits == 1
+    pd.testing.assert_frame_equal(obtido, esperado)
+
+
+def test_armazem_chave_inclui_memoria_reduzida(posicao, dados, tmp_path):
+    sim = PortfolioSimulator(posicao, 5000, dados_mercado=dados, cache_solve=None, armazem_resultados=tmp_path)
+    sim.simular(meses=2, data_fim_str="2025-04-01")
+
+    sim = PortfolioSimulator(posicao, 5000, dados_mercado=dados, cache_solve=None, armazem_resultados=tmp_path,
+                             memoria_reduzida=True)
+    sim.simular(meses=2, data_fim_str="2025-04-01")
+
+    assert sim.armazem_resultados.hits == 0
+    assert sim.armazem_resultados.estatisticas()["entradas"] == 2
+
+
+def test_checkpoint_retomado_igual_a_execucao_completa(posicao, dados, tmp_path):
+    completo = PortfolioSimulator(posicao, 5000, dados_mercado=dados, cache_solve=None)
+    esperado = completo.simular(meses=6, data_fim_str="2025-04-01")
+
+    # mesma data inicial (fim - meses * 30 dias), parando três meses antes
+    arq = tmp_path / "ck.pkl.gz"
+    parcial = PortfolioSimulator(posicao, 5000, dados_mercado=dados, cache_solve=None)
+    parcial.simular(meses=3, data_fim_str="2025-01-01", checkpoint=arq)
+
+    retomado = PortfolioSimulator(posicao, 5000, dados_mercado=dados, cache_solve=None)
+    obtido = retomado.simular(meses=6, data_fim_str="2025-04-01", checkpoint=arq)
+
+    pd.testing.assert_frame_equal(obtido, esperado)
+    pd.testing.assert_frame_equal(retomado.obter_df_aportes(), completo.obter_df_aportes())
+
+
+def test_checkpoint_sem_periodo_simulado(posicao, dados, tmp_path, monkeypatch):
+    sim = PortfolioSimulator(posicao, 5000, dados_mercado=dados, cache_solve=None)
+
+    def falha(*args, **kwargs):
+        raise RuntimeError("solver indisponível")
+
+    monkeypatch.setattr(sim, "_aporte_po", falha)
+    with pytest.raises(RuntimeError):
+        sim.simular(meses=2, data_fim_str="2025-04-01")
+    with pytest.raises(ValueError, match="Nenhum período"):
+        sim.salvar_checkpoint(tmp_path / "ck.pkl.gz")
+
+
+def test_armazem_exige_dados_mercado(posicao, dados, tmp_path, monkeypatch):
+    monkeypatch.setattr(PortfolioSimulator, "obter_dados_historicos", lambda self, *a, **k: dict(dados))
+    for _ in range(2):
+        sim = PortfolioSimulator(posicao, 5000, cache_solve=None, armazem_resultados=tmp_path)
+        sim.simular(meses=2, data_fim_str="2025-04-01")
+        assert sim.armazem_resultados.hits == 0
+    assert sim.armazem_resultados.estatisticas()["entradas"] == 0
+
+
+def test_armazem_chave_muda_com_revisao_das_series(posicao, dados, tmp_path):
+    sim = PortfolioSimulator(posicao, 5000, dados_mercado=dados, cache_solve=None, armazem_resultados=tmp_path)
+    sim.simular(meses=2, data_fim_str="2025-04-01")
+
+    revisado = dict(dados)
+    tk = next(tk for tk in revisado if revisado[tk].iloc[0] != 1.0)
+    revisado[tk] = revisado[tk] * 0.99                  # ex.: Adj Close reajustado por provento
+    sim = PortfolioSimulator(posicao, 5000, dados_mercado=revisado, cache_solve=None, armazem_resultados=tmp_path)
+    sim.simular(meses=2, data_fim_str="2025-04-01")
+
+    assert sim.armazem_resultados.hits == 0
+
+
+@pytest.mark.parametrize("freq, dia", [("D", None), ("W", 4), ("M", None)])
+def test_calendario_e_aporte_por_periodo(posicao, dados, freq, dia):
+    sim = PortfolioSimulator(posicao, 1000, dados_mercado=dados, cache_solve=None, freq=freq)
+    hist = sim.simular(meses=3, data_fim_str="2025-04-01")
+
+    inicio, fim = sim._periodo(3, "2025-04-01")
+    datas = pd.DatetimeIndex(hist["data"])
+    assert (datas >= inicio).all() and (datas <= fim).all()
+    if freq == "D":
+        assert (datas.dayofweek < 5).all() and len(datas) == len(pd.bdate_range(inicio, fim))
+    elif freq == "W":
+        assert (datas.dayofweek == dia).all()
+    else:
+        assert datas.is_month_end.all() and len(datas) == 3
+    # o aporte é cobrado em todo período da frequência, sem rateio do valor mensal
+    np.testing.assert_allclose(hist["investido"], posicao["Total"].sum() + 1000 * np.arange(1, len(hist) + 1))
+
+
+def test_painel_usa_ultimo_valor_conhecido(posicao):
+    sim = PortfolioSimulator(posicao)
+    a, b = sim.ativos.serie[sim.ativos.inteiro][:2]
+    dias = pd.to_datetime(["2024-01-02", "2024-01-03", "2024-01-05"])
+    dados = {a: pd.Series([10.0, 11.0, 12.0], index=dias),
+             b: pd.Series([5.0], index=dias[2:])}             # começa a cotar depois
+    datas = pd.to_datetime(["2024-01-01", "2024-01-04", "2024-01-31"])
+
+    painel = sim.montar_painel(dados, datas)
+    ia, ib = (np.flatnonzero(sim.ativos.serie == tk)[0] for tk in (a, b))
+    assert painel.shape == (3, len(posicao))
+    np.testing.assert_array_equal(painel[:, ia], [np.nan, 11.0, 12.0])
+    np.testing.assert_array_equal(painel[:, ib], [np.nan, np.nan, 5.0])
+    sem_serie = ~np.isin(sim.ativos.serie, [a, b])
+    assert np.isnan(painel[:, sem_serie]).all()
+
+
+def test_passos_entregues_nao_mudam(posicao, dados):
+    sim = PortfolioSimulator(posicao, 5000, dados_mercado=dados, cache_solve=None)
+    passos = list(sim.iterar_simulacao(meses=3, data_fim_str="2025-04-01"))
+
+    for passo in passos:
+        assert passo["cart_def"]["Total"].sum() == pytest.approx(passo["metricas"]["valor_def"])
+        assert passo["cart_po"]["Total"].sum() == pytest.approx(passo["metricas"]["valor_po"])
+        assert (passo["aportes"]["Mes"] == passo["mes"]).all()
+        compras = passo["compras_po"]
+        po = passo["aportes"].query("Estrategia == 'PO' and Nivel_Solver.notna()")
+        np.testing.assert_allclose(compras["Custo_real"].sum(), po["Valor_Aportado"].sum())
+    assert sum(len(p["aportes"]) for p in passos) == len(sim.obter_df_aportes())
+
+
+def test_dez_anos_diarios_em_segundos(posicao, monkeypatch):
+    """Motor vetorizado: ~2600 pregões × 63 ativos sem o MILP (PO trocado pelo déficit)."""
+    rng = np.random.default_rng(1)
+    idx = pd.bdate_range("2014-06-01", "2025-04-01")
+    dados = {tk: pd.Series(np.cumprod(1 + rng.normal(3e-4, 0.01, len(idx))) * (1 if sym is None else 50), index=idx)
+             for tk, sym in PortfolioSimulator(posicao).mapear_tickers().items()}
+    sim = PortfolioSimulator(posicao, 100, freq="D", dados_mercado=dados, cache_solve=None)
+    monkeypatch.setattr(sim, "_aporte_po", sim._aporte_deficit)
+
+    t0 = time.perf_counter()
+    hist = sim.simular(meses=120, data_fim_str="2025-04-01")
+    assert len(hist) > 2500
+    assert time.perf_counter() - t0 < 10
+    pd.testing.assert_series_equal(hist["valor_po"], hist["valor_def"], check_names=False)
+
+
+def test_converter_moedas_alinha_cambio_por_data():
+    dias = pd.to_datetime(["2024-03-01", "2024-03-04", "2024-03-05", "2024-03-06"])
+    precos = pd.DataFrame({"AAA": [10.0, 10.0, 10.0, 10.0], "BBB": [1.0, 2.0, 3.0, 4.0]}, index=dias)
+    # câmbio sem cotação em 04/03 (feriado) e começando antes das ações
+    cambio = pd.DataFrame({"USD": [5.0, 5.1, 5.3], "EUR": [6.0, 6.2, 6.4]},
+                          index=pd.to_datetime(["2024-02-29", "2024-03-01", "2024-03-05"]))
+
+    brl = PortfolioSimulator.converter_moedas(precos, pd.Series(["USD", "EUR"], index=["AAA", "BBB"]), cambio)
+
+    np.testing.assert_allclose(brl["AAA"], [51.0, 51.0, 53.0, 53.0])
+    np.testing.assert_allclose(brl["BBB"], [6.2, 12.4, 19.2, 25.6])
+
+
+def test_painel_cambio_baixa_cada_moeda_uma_vez(monkeypatch):
+    baixados = []
+
+    def baixar(sym, start, end):
+        baixados.append(sym)
+        dias = pd.to_datetime(["2024-03-01", "2024-03-04"] if sym == "USDBRL=X" else ["2024-03-04", "2024-03-05"])
+        return pd.DataFrame({"Adj Close": [5.0, 5.1] if sym == "USDBRL=X" else [6.0, 6.1]}, index=dias)
+
+    monkeypatch.setattr("src.simulator._download_with_retry", baixar)
+    painel = PortfolioSimulator._painel_cambio(["USD", "EUR", "USD"], None, None)
+
+    assert sorted(baixados) == ["EURBRL=X", "USDBRL=X"]
+    assert painel.loc["2024-03-05", "USD"] == 5.1                 # último valor conhecido
+    assert np.isnan(painel.loc["2024-03-01", "EUR"])
+
+
+def test_interromper_iteracao_e_retomar(posicao, dados):
+    completo = PortfolioSimulator(posicao, 5000, dados_mercado=dados, cache_solve=None)
+    esperado = completo.simular(meses=4, data_fim_str="2025-04-01")
+
+    sim = PortfolioSimulator(posicao, 5000, dados_mercado=dados, cache_solve=None, monitorar_memoria=True)
+    passos = sim.iterar_simulacao(meses=4, data_fim_str="2025-04-01")
+    for passo in passos:
+        if passo["mes"] == 2:
+            break
+    passos.close()
+
+    assert not tracemalloc.is_tracing()                 # monitor encerrado junto com o gerador
+    assert [m["mes"] for m in sim._estado["historico"]] == [1, 2]
+    assert sim.obter_df_aportes()["Mes"].max() == 2
+
+    # o estado interrompido continua de onde parou
+    for _ in sim.retomar_simulacao(data_fim_str="2025-04-01"):
+        pass
+    pd.testing.assert_frame_equal(pd.DataFrame(sim._estado["historico"]), esperado)
+    pd.testing.assert_frame_equal(sim.obter_df_aportes(), completo.obter_df_aportes())
@@ -0,0 +1,233 @@
+import numpy as np
+import pytest
+
+from src import solver
+
+
+@pytest.mark.parametrize("orcamento", [634.52, 800.0, 1000.0])
+def test_decomposto_respeita_k_min(orcamento):
+    # grupo X sem déficit recebe orçamento e k zero; RV tem só 2 ativos
+    precos = np.array([100.0, 100.0, 50.0, 50.0, 1.0, 1.0])
+    deficits = np.array([500.0, 500.0, 0.0, 0.0, 0.0, 0.0])
+    inteiro = np.array([True, True, True, True, False, False])
+    grupos = ["RV", "RV", "X", "X", "RF", "RF"]
+
+    res = solver.resolver_decomposto(precos, deficits, inteiro, orcamento, grupos, k_min=4, cache=None)
+    plano = solver.resolver(precos, deficits, inteiro, orcamento, k_min=4, cache=None)
+
+    assert (res["qtd"] > 0).sum() >= 4
+    assert precos @ res["qtd"] <= orcamento + 1e-6
+    assert res["objetivo"] >= plano["objetivo"] - solver.GAP_ABS
+
+
+def test_decomposto_sem_k_min_limite_valido():
+    rng = np.random.default_rng(0)
+    precos = rng.uniform(5, 80, 30)
+    deficits = rng.uniform(0, 400, 30)
+    inteiro = rng.random(30) < 0.7
+    grupos = np.where(inteiro, "RV", "RF")
+
+    res = solver.resolver_decomposto(precos, deficits, inteiro, 3000.0, grupos, cache=None)
+    plano = solver.resolver(precos, deficits, inteiro, 3000.0, cache=None)
+
+    assert res["limite_inferior"] <= plano["objetivo"] + solver.GAP_ABS
+    assert res["objetivo"] - plano["objetivo"] <= res["perda_max"] + solver.GAP_ABS
+
+
+def test_corrida_descarta_resultado_inviavel():
+    from src.corrida import provado, viavel
+
+    precos = np.array([100.0, 100.0, 50.0, 50.0])
+    res = {"qtd": np.array([5.0, 5.0, 0.0, 0.0]), "nivel": "decomposto", "objetivo": 0.0, "limite_inferior": 0.0}
+    assert not viavel(res, precos, 1000.0, k_min=4)
+    assert viavel(res, precos, 1000.0, k_min=2)
+    assert not provado(res)
+    assert provado({**res, "nivel": "milp"})
+    # excesso na tolerância do solver (CBC sem presolve) não desclassifica
+    assert viavel({**res, "qtd": np.array([5.0, 5.0, 0.0, 0.0]) + 3e-8}, precos, 1000.0)
+    assert not viavel({**res, "qtd": np.array([5.0, 5.0, 0.1, 0.0])}, precos, 1000.0)
+
+
+def test_corrida_respeita_k_min():
+    from src.corrida import CorridaSolvers
+
+    precos = np.array([100.0, 100.0, 50.0, 50.0])
+    deficits = np.array([500.0, 500.0, 0.0, 0.0])
+    inteiro = np.ones(4, dtype=bool)
+    corrida = CorridaSolvers()
+    res = corrida.resolver(precos, deficits, inteiro, 1000.0, k_min=4, grupos=["RV", "RV", "X", "X"], cache=None)
+    plano = solver.resolver(precos, deficits, inteiro, 1000.0, k_min=4, cache=None)
+    assert (res["qtd"] > 0).sum() >= 4
+    assert res["objetivo"] == pytest.approx(plano["objetivo"], abs=solver.GAP_ABS)
+
+
+def test_reuso_certificado_pelo_limite_lp():
+    rng = np.random.default_rng(1)
+    precos = rng.uniform(5, 80, 12)
+    deficits = rng.uniform(0, 400, 12)
+    inteiro = rng.random(12) < 0.6
+    res = solver.resolver(precos, deficits, inteiro, 1000.0, cache=None)
+    faixas = solver.faixas_validade(precos, deficits, inteiro, 1000.0, res["qtd"])
+
+    novos = deficits + 0.5
+    assert solver.dentro_das_faixas(faixas, precos, novos, 1000.0)
+    reuso = solver.avaliar_reuso(faixas, precos, novos, 1000.0)
+    plano = solver.resolver(precos, novos, inteiro, 1000.0, cache=None)
+
+    assert reuso["certificado"]
+    assert reuso["nivel"] == "reuso"
+    assert abs(reuso["objetivo"] - plano["objetivo"]) <= solver.GAP_ABS
+
+
+def test_reuso_nao_certificado_registra_gap():
+    # só RV cara: a sobra de R$ 50 deixa o inteiro longe do limite LP
+    precos = np.array([100.0, 100.0, 100.0])
+    deficits = np.array([150.0, 150.0, 150.0])
+    inteiro = np.ones(3, dtype=bool)
+    res = solver.resolver(precos, deficits, inteiro, 250.0, cache=None)
+    faixas = solver.faixas_validade(precos, deficits, inteiro, 250.0, res["qtd"])
+
+    novos = deficits + [1.0, 0.0, 0.0]
+    assert solver.dentro_das_faixas(faixas, precos, novos, 250.0)
+    reuso = solver.avaliar_reuso(faixas, precos, novos, 250.0)
+
+    assert not reuso["certificado"]
+    assert reuso["limite_inferior"] == pytest.approx(201.0, abs=1e-4)
+    assert reuso["gap"] == pytest.approx((reuso["objetivo"] - 201.0) / reuso["objetivo"], abs=1e-6)
+
+
+def test_corrida_sem_tempo_limite_cancela_competidor_travado(monkeypatch):
+    import time
+    from src.corrida import CorridaSolvers
+
+    def resolver_falso(precos, deficits, inteiro, orcamento, usar_presolve=True, **kwargs):
+        if not usar_presolve:
+            time.sleep(60)                          # competidor travado
+        return {"qtd": np.zeros(len(precos)), "nivel": "milp_incumbente", "objetivo": 1.0,
+                "limite_inferior": 0.0, "gap": 1.0, "tempo": 0.0, "cache": False}
+
+    monkeypatch.setattr(solver, "resolver", resolver_falso)
+    corrida = CorridaSolvers({"rapido": {"usar_presolve": True}, "travado": {"usar_presolve": False}},
+                             folga=0.0, prazo_padrao=1.0)
+    t0 = time.perf_counter()
+    res = corrida.resolver(np.ones(3), np.ones(3), np.ones(3, dtype=bool), 2.0, cache=None)
+
+    assert time.perf_counter() - t0 < 10
+    assert res["vencedor"] == "rapido"
+
+
+def _instancia_cascata():
+    rng = np.random.default_rng(7)
+    precos = rng.uniform(5, 80, 15)
+    deficits = rng.uniform(0, 400, 15)
+    inteiro = rng.random(15) < 0.7
+    return precos, deficits, inteiro, 1500.0
+
+
+def _forcar_status_milp(monkeypatch, sol_status):
+    """Troca o status do MILP (a relaxação LP segue intacta)."""
+    import pulp as pl
+
+    original = pl.LpProblem.solve
+
+    def solve(self, *args, **kwargs):
+        status = original(self, *args, **kwargs)
+        if self.isMIP():
+            self.sol_status = sol_status
+        return status
+
+    monkeypatch.setattr(pl.LpProblem, "solve", solve)
+
+
+def test_cascata_milp_registra_gap_da_tolerancia():
+    from src.corrida import provado
+
+    precos, deficits, inteiro, orcamento = _instancia_cascata()
+    res = solver.resolver(precos, deficits, inteiro, orcamento, cache=None)
+
+    assert res["nivel"] == "milp"
+    assert res["objetivo"] - solver.GAP_ABS <= res["limite_inferior"] <= res["objetivo"]
+    assert 0 <= res["gap"] < 1e-4
+    assert provado(res)
+
+    # RV cara: sobra no orçamento, o limite vem da tolerância do CBC
+    res = solver.resolver(np.full(3, 100.0), np.full(3, 150.0), np.ones(3, dtype=bool), 250.0, cache=None)
+    assert res["nivel"] == "milp"
+    assert res["limite_inferior"] == pytest.approx(res["objetivo"] - solver.GAP_ABS)
+    assert res["gap"] > 0
+
+
+def test_cascata_incumbente(monkeypatch):
+    import pulp as pl
+
+    precos, deficits, inteiro, orcamento = _instancia_cascata()
+    _forcar_status_milp(monkeypatch, pl.LpSolutionIntegerFeasible)
+    res = solver.resolver(precos, deficits, inteiro, orcamento, cache=None)
+
+    assert res["nivel"] == "milp_incumbente"
+    assert res["limite_inferior"] <= res["objetivo"] + 1e-4         # tolerância do LP
+    assert precos @ res["qtd"] <= orcamento + 1e-6
+
+
+def test_cascata_gap_rel_nao_e_milp():
+    precos, deficits, inteiro, orcamento = _instancia_cascata()
+    res = solver.resolver(precos, deficits, inteiro, orcamento, gap_rel=0.5, cache=None)
+    assert res["nivel"] == "milp_incumbente"
+
+
+def test_cascata_lp_arredondado(monkeypatch):
+    import pulp as pl
+
+    precos, deficits, inteiro, orcamento = _instancia_cascata()
+    _forcar_status_milp(monkeypatch, pl.LpSolutionNoSolutionFound)
+    res = solver.resolver(precos, deficits, inteiro, orcamento, k_min=5, cache=None)
+
+    assert res["nivel"] == "lp_arredondado"
+    assert (res["qtd"][inteiro] == np.round(res["qtd"][inteiro])).all()
+    assert (res["qtd"] > 0).sum() >= 5
+    assert precos @ res["qtd"] <= orcamento + 1e-6
+    assert res["objetivo"] >= res["limite_inferior"] - 1e-4
+
+
+def test_cascata_deficit(monkeypatch):
+    import pulp as pl
+
+    precos, deficits, inteiro, orcamento = _instancia_cascata()
+    _forcar_status_milp(monkeypatch, pl.LpSolutionNoSolutionFound)
+    monkeypatch.setattr(solver, "resolver_relaxacao", lambda *a, **k: None)
+    res = solver.resolver(precos, deficits, inteiro, orcamento, cache=None)
+
+    assert res["nivel"] == "deficit"
+    np.testing.assert_allclose(res["qtd"], solver.alocar_deficit(precos, deficits, inteiro, orcamento))
+    assert np.isnan(res["gap"]) or res["gap"] >= 0
+
+
+@pytest.mark.parametrize("semente", range(4))
+@pytest.mark.parametrize("k_min", [None, 4])
+def test_aproximado_limitado_pela_relaxacao(semente, k_min, monkeypatch):
+    rng = np.random.default_rng(semente)
+    precos = rng.uniform(5, 200, 30)
+    deficits = np.where(rng.random(30) < 0.3, 0.0, rng.uniform(0, 1500, 30))
+    inteiro = rng.random(30) < 0.7
+    orcamento = 4000.0
+    exato = solver.resolver(precos, deficits, inteiro, orcamento, k_min=k_min, cache=None)
+
+    montar = solver.montar_problema
+
+    def so_relaxacao(*args, relaxado=False, **kwargs):
+        assert relaxado, "modo aproximado não deve montar o MILP"
+        return montar(*args, relaxado=relaxado, **kwargs)
+
+    monkeypatch.setattr(solver, "montar_problema", so_relaxacao)
+    aprox = solver.resolver(precos, deficits, inteiro, orcamento, k_min=k_min, cache=None, aproximado=True)
+
+    assert aprox["nivel"] == "lp_arredondado"
+    assert precos @ aprox["qtd"] <= orcamento * (1 + 1e-9)
+    np.testing.assert_array_equal(aprox["qtd"][inteiro], np.round(aprox["qtd"][inteiro]))
+    if k_min:
+        assert (aprox["qtd"] > 0).sum() >= k_min
+    # limite da relaxação ≤ ótimo do MILP ≤ objetivo aproximado (tolerância numérica do CBC)
+    assert aprox["limite_inferior"] <= exato["objetivo"] * (1 + 1e-6)
+    assert exato["objetivo"] <= aprox["objetivo"] + solver.GAP_ABS
+    perda = max(aprox["objetivo"] - aprox["limite_inferior"], 0.0)
+    assert aprox["gap"] == pytest.approx(perda / aprox["objetivo"], abs=1e-9)